@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Asyncio client for the Massive (Polygon.io) REST API
+One shared connection pool, retries with exponential backoff on 429/5xx,
+and coalescing of identical in-flight requests. MassiveClient wraps it in a
+synchronous facade with the RESTClient method names the engines use.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Any, Tuple
+from urllib.parse import urlencode
+
+BASE_URL = "https://api.massive.com"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Requests per second by plan tier; None means no client-side limit
+PLAN_RATE_LIMITS = {
+    'basic': 5 / 60,
+    'starter': None,
+    'developer': None,
+    'advanced': None,
+}
+
+class MassiveAPIError(Exception):
+    """Non-retryable API error (or a retryable one that ran out of attempts)"""
+
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+# ----------------------------------------------------------------------
+# Response models (attribute names match the massive client's models)
+# ----------------------------------------------------------------------
+
+@dataclass
+class Agg:
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
+    close: Optional[float] = None
+    volume: Optional[float] = None
+    vwap: Optional[float] = None
+    timestamp: Optional[int] = None
+    transactions: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'Agg':
+        return cls(d.get('o'), d.get('h'), d.get('l'), d.get('c'), d.get('v'),
+                   d.get('vw'), d.get('t'), d.get('n'))
+
+@dataclass
+class DailyOpenClose:
+    symbol: Optional[str] = None
+    from_: Optional[str] = None
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
+    close: Optional[float] = None
+    volume: Optional[float] = None
+    after_hours: Optional[float] = None
+    pre_market: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'DailyOpenClose':
+        return cls(d.get('symbol'), d.get('from'), d.get('open'), d.get('high'), d.get('low'),
+                   d.get('close'), d.get('volume'), d.get('afterHours'), d.get('preMarket'))
+
+@dataclass
+class OptionsContract:
+    ticker: Optional[str] = None
+    underlying_ticker: Optional[str] = None
+    expiration_date: Optional[str] = None
+    strike_price: Optional[float] = None
+    contract_type: Optional[str] = None
+    exercise_style: Optional[str] = None
+    shares_per_contract: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'OptionsContract':
+        return cls(d.get('ticker'), d.get('underlying_ticker'), d.get('expiration_date'),
+                   d.get('strike_price'), d.get('contract_type'), d.get('exercise_style'),
+                   d.get('shares_per_contract'))
+
+# ----------------------------------------------------------------------
+# Transport and rate limiting
+# ----------------------------------------------------------------------
+
+class AiohttpTransport:
+    """HTTP transport over a single pooled aiohttp session"""
+
+    def __init__(self, api_key: str, max_connections: int = 100, timeout: float = 30.0):
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._session = None
+
+    async def _get_session(self):
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'Authorization': f'Bearer {self.api_key}'}
+            )
+        return self._session
+
+    async def get(self, url: str) -> Tuple[int, Any, Dict]:
+        """GET a URL, returning (status, parsed JSON or text, headers)"""
+        session = await self._get_session()
+        async with session.get(url) as resp:
+            if resp.content_type == 'application/json':
+                body = await resp.json()
+            else:
+                body = await resp.text()
+            return resp.status, body, dict(resp.headers)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+class AsyncRateLimiter:
+    """Token bucket allowing `rate` requests per second across all callers"""
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while self.rate:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# ----------------------------------------------------------------------
+# Async client
+# ----------------------------------------------------------------------
+
+class AsyncMassiveClient:
+    def __init__(self, api_key: str, base_url: str = BASE_URL, transport=None,
+                 max_connections: int = 100, max_retries: int = 5, backoff_base: float = 0.5,
+                 requests_per_second: Optional[float] = None):
+        self.base_url = base_url.rstrip('/')
+        self.transport = transport or AiohttpTransport(api_key, max_connections)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.limiter = AsyncRateLimiter(requests_per_second, burst=max(1, int(requests_per_second or 1)))
+        self._inflight = {}
+
+        # Request accounting
+        self.requests = 0
+        self.retries = 0
+        self.coalesced = 0
+
+    def url_for(self, path: str, params: Optional[Dict] = None) -> str:
+        """Absolute, canonical URL (sorted query) so identical requests share a key"""
+        url = path if path.startswith('http') else f"{self.base_url}{path}"
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        if params:
+            sep = '&' if '?' in url else '?'
+            url = f"{url}{sep}{urlencode(sorted((k, _param(v)) for k, v in params.items()))}"
+        return url
+
+    async def get_json(self, path: str, params: Optional[Dict] = None) -> Dict:
+        """GET with retries; concurrent callers asking for the same URL share one request"""
+        url = self.url_for(path, params)
+        pending = self._inflight.get(url)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.ensure_future(self._fetch(url))
+        self._inflight[url] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._inflight.pop(url, None)
+            else:
+                future.add_done_callback(lambda _: self._inflight.pop(url, None))
+
+    async def _fetch(self, url: str) -> Dict:
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            self.requests += 1
+            try:
+                status, body, headers = await self.transport.get(url)
+            except (asyncio.TimeoutError, OSError) as e:
+                status, body, headers = 0, str(e), {}
+
+            if status == 200:
+                return body
+            if status not in RETRY_STATUSES and status != 0:
+                message = body.get('message', body.get('error', '')) if isinstance(body, dict) else body
+                raise MassiveAPIError(status, str(message))
+            if attempt == self.max_retries:
+                raise MassiveAPIError(status, f"gave up after {attempt + 1} attempts")
+
+            self.retries += 1
+            retry_after = headers.get('Retry-After')
+            delay = float(retry_after) if retry_after else self.backoff_base * (2 ** attempt)
+            await asyncio.sleep(min(30.0, delay) * (1 + random.random() * 0.25))
+
+    # ------------------------------------------------------------------
+    # Endpoints
+    # ------------------------------------------------------------------
+
+    async def get_aggs(self, ticker: str, multiplier: int, timespan: str, from_, to,
+                       adjusted: bool = True, sort: str = 'asc', limit: int = 50000) -> List[Agg]:
+        path = f"/v2/aggs/ticker/{ticker}/range/{multiplier}/{timespan}/{_param(from_)}/{_param(to)}"
+        aggs = []
+        body = await self.get_json(path, {'adjusted': adjusted, 'sort': sort, 'limit': limit})
+        while True:
+            aggs.extend(Agg.from_dict(r) for r in body.get('results') or [])
+            if not body.get('next_url'):
+                return aggs
+            body = await self.get_json(body['next_url'])
+
+    async def get_daily_open_close_agg(self, ticker: str, date, adjusted: bool = True) -> DailyOpenClose:
+        body = await self.get_json(f"/v1/open-close/{ticker}/{_param(date)}", {'adjusted': adjusted})
+        return DailyOpenClose.from_dict(body)
+
+    async def list_options_contracts(self, limit: int = 1000, **filters) -> List[OptionsContract]:
+        """All pages of /v3/reference/options/contracts; filters use the RESTClient keyword names"""
+        params = {'limit': limit}
+        for key, value in filters.items():
+            # expiration_date_gte -> expiration_date.gte
+            for op in ('_gte', '_gt', '_lte', '_lt'):
+                if key.endswith(op):
+                    key = f"{key[:-len(op)]}.{op[1:]}"
+                    break
+            params[key] = value
+
+        contracts = []
+        body = await self.get_json("/v3/reference/options/contracts", params)
+        while True:
+            contracts.extend(OptionsContract.from_dict(r) for r in body.get('results') or [])
+            if not body.get('next_url'):
+                return contracts
+            body = await self.get_json(body['next_url'])
+
+    async def close(self):
+        await self.transport.close()
+
+def _param(value) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+# ----------------------------------------------------------------------
+# Synchronous facade
+# ----------------------------------------------------------------------
+
+class MassiveClient:
+    """
+    Synchronous facade over AsyncMassiveClient
+
+    Owns an event loop on a daemon thread. The RESTClient-style methods block
+    for one result; gather() runs many coroutines on the shared pool at once.
+    """
+
+    def __init__(self, api_key: str, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="massive-io", daemon=True)
+        self._thread.start()
+        self.aio = AsyncMassiveClient(api_key, **kwargs)
+
+    def run(self, coro):
+        """Run a coroutine on the client's loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def gather(self, coros, return_exceptions: bool = True) -> list:
+        """Run coroutines concurrently; failures come back as exception objects by default"""
+        async def _gather():
+            return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+        return self.run(_gather())
+
+    def set_rate_limit(self, requests_per_second: Optional[float]):
+        self.aio.limiter = AsyncRateLimiter(
+            requests_per_second, burst=max(1, int(requests_per_second or 1)))
+
+    def get_aggs(self, *args, **kwargs) -> List[Agg]:
+        return self.run(self.aio.get_aggs(*args, **kwargs))
+
+    def get_daily_open_close_agg(self, *args, **kwargs) -> DailyOpenClose:
+        return self.run(self.aio.get_daily_open_close_agg(*args, **kwargs))
+
+    def list_options_contracts(self, *args, **kwargs) -> List[OptionsContract]:
+        return self.run(self.aio.list_options_contracts(*args, **kwargs))
+
+    def flush(self):
+        """Persist anything the transport buffers (record mode archives)"""
+        flush = getattr(self.aio.transport, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def close(self):
+        self.run(self.aio.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+_shared_clients = {}
+_shared_lock = threading.Lock()
+
+def get_shared_client(api_key: str, **kwargs) -> MassiveClient:
+    """Process-wide client per API key, so engines and tabs share one connection pool"""
+    with _shared_lock:
+        client = _shared_clients.get(api_key)
+        if client is None:
+            client = MassiveClient(api_key, **kwargs)
+            _shared_clients[api_key] = client
+        return client
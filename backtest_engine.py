@@ -4,17 +4,37 @@ Options Backtesting Engine with Historical Data
 Uses Massive API (Polygon.io) for historical options chains and pricing
 """
 
-from massive import RESTClient
 from datetime import datetime, timedelta
+import heapq
 from zoneinfo import ZoneInfo
 from typing import List, Dict, Optional, Callable
-import pandas as pd
 import numpy as np
 from dataclasses import dataclass
+from market_data_store import MarketDataStore, DEFAULT_CACHE_DIR, DEFAULT_BUSY_TIMEOUT, NO_TRADE, NOT_LISTED, API_ERROR
+from async_client import MassiveAPIError
+from price_series import PriceSeries
+from options_index import build_index
+from batch_fetcher import BatchFetcher
+from options_chain import OptionsChain
+from position_book import PositionBook, exit_masks
+from trade_log import TradeLog
+from results_io import save_results, new_results_path, DEFAULT_RESULTS_DIR
+from trade_stats import StatsAccumulator, nav_series, nav_stats, STARTING_CAPITAL
+from pricing import fill_chain_greeks, parse_range, DAYS_PER_YEAR
+from ohlcv_cube import get_shared_cube
+from iv_history import build_iv_history
+from trading_calendar import get_calendar, session_datetimes
+from async_client import PLAN_RATE_LIMITS
+from replay_transport import client_for_config, isolated_cache_dir
 
 ET = ZoneInfo("America/New_York")
 
-@dataclass
+# Event kinds, in the order same-day events are handled
+EVENT_EXPIRATION = 0
+EVENT_EXIT = 1
+EVENT_ENTRY = 2
+
+@dataclass(slots=True)
 class OptionsPosition:
     """Represents an options position"""
     symbol: str
@@ -31,11 +51,13 @@ class OptionsPosition:
     underlying_entry_price: float = 0.0
     underlying_exit_price: Optional[float] = None
     days_held: int = 0
+    book_id: int = -1
 
 class OptionsBacktestEngine:
     def __init__(self, api_key: str, tickers: List[str], config: Dict, 
-                 progress_callback: Optional[Callable] = None):
-        self.client = RESTClient(api_key=api_key)
+                 progress_callback: Optional[Callable] = None,
+                 data_store: Optional[MarketDataStore] = None):
+        self.client = client_for_config(api_key, config)
         self.tickers = tickers
         self.config = config
         self.progress_callback = progress_callback
@@ -49,13 +71,41 @@ class OptionsBacktestEngine:
         self.max_positions = config['max_positions']
         self.risk_config = config['risk_management']
         self.params = config['parameters']
+        self.risk_free_rate = config.get('risk_free_rate', 0.04)
+        self.starting_capital = config.get('starting_capital', STARTING_CAPITAL)
+        self.iv_rank_range = self.parse_iv_rank_range(config)
         
         # Results
-        self.all_trades = []
-        self.open_positions = []
-        self.closed_positions = []
+        self.all_trades = TradeLog()
+        self.trade_stats = StatsAccumulator()
+        self.book = PositionBook()
         self.price_cache = {}
         self.options_cache = {}
+        self.price_series = {}
+        self.options_index = {}
+        self.iv_history = {}
+        
+        # Persistent cache shared across runs; record and replay runs get an
+        # empty one of their own so every request goes through the archive
+        self.isolated_cache = isolated_cache_dir(config)
+        cache_dir = self.isolated_cache.name if self.isolated_cache else config.get('cache_dir', DEFAULT_CACHE_DIR)
+        self.store = data_store or MarketDataStore(cache_dir,
+                                                   busy_timeout=config.get('store_busy_timeout', DEFAULT_BUSY_TIMEOUT))
+        
+        # Shared read-only OHLCV cube, when one has been built for the universe
+        # (not for record/replay runs, which must not depend on local data)
+        use_cube = config.get('ohlcv_cube') and self.isolated_cache is None
+        self.cube = get_shared_cube(config['ohlcv_cube']) if use_cube else None
+        
+        # Concurrent bar requests within the plan's rate budget
+        if 'api_requests_per_second' in config or 'api_plan' in config:
+            self.client.set_rate_limit(config.get(
+                'api_requests_per_second', PLAN_RATE_LIMITS.get(config.get('api_plan'))))
+        self.fetcher = BatchFetcher(self.client, max_concurrency=config.get('api_max_concurrency', 64))
+        
+        # Empty results are cached too; API errors only for negative_cache_ttl seconds
+        self.negative_ttl = config.get('negative_cache_ttl', 3600)
+        self.data_stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'api_errors': 0}
         
     def log(self, message: str):
         if self.progress_callback:
@@ -66,92 +116,293 @@ class OptionsBacktestEngine:
         self.log(f"Starting: {self.strategy} backtest")
         self.log(f"Period: {self.start_date.date()} to {self.end_date.date()}")
         
-        # Check weekly to reduce API calls
-        trading_days = self.generate_weekly_check_dates()
-        self.log(f"Checking {len(trading_days)} dates for signals")
+        self.prepare_data()
         
-        for idx, current_date in enumerate(trading_days):
-            if idx % 3 == 0:
-                self.log(f"{current_date.date()} ({idx+1}/{len(trading_days)}) - Pos:{len(self.open_positions)}, Trades:{len(self.all_trades)}")
-            
-            self.update_positions(current_date)
-            
-            if len(self.open_positions) < self.max_positions:
-                self.check_entry_signals(current_date)
+        # Event queue: only days with an entry check, an expiration or an exit trigger are visited
+        check_dates = self.generate_entry_check_dates()
+        self.check_days = np.array([d.date() for d in check_dates], dtype='datetime64[D]')
+        self.events = []
+        self.event_seq = 0
+        for date in check_dates:
+            self.push_event(date, EVENT_ENTRY)
+        self.log(f"Checking {len(check_dates)} dates for signals")
+        
+        checks = 0
+        while self.events:
+            date, kind, _, pos = heapq.heappop(self.events)
+            if kind == EVENT_ENTRY:
+                if checks % 3 == 0:
+                    self.log(f"{date.date()} ({checks+1}/{len(check_dates)}) - Pos:{self.book.open_count}, Trades:{len(self.all_trades)}")
+                checks += 1
+                if self.book.open_count < self.max_positions:
+                    self.check_entry_signals(date)
+            elif kind == EVENT_EXPIRATION:
+                self.close_position(pos, date, "Expiration")
+            else:
+                self.close_position(pos, date, pos.exit_reason)
         
         self.close_all_positions(self.end_date)
+        self.client.flush()
+        self.log("Data: {hits} hits, {misses} misses, {negative_hits} negative hits, "
+                 "{api_errors} API errors".format(**self.data_stats))
         results = self.calculate_results()
+        self.save_results(results)
         self.log(f"✓ Complete! {len(self.all_trades)} trades")
         return results
     
-    def generate_weekly_check_dates(self) -> List[datetime]:
-        days = []
-        current = self.start_date
-        while current <= self.end_date:
-            if current.weekday() == 0:  # Monday
-                days.append(current)
-            current += timedelta(days=1)
-        return days
+    def push_event(self, date: datetime, kind: int, pos: Optional[OptionsPosition] = None):
+        # Exits sort ahead of entry checks on the same day; seq keeps same-day order stable
+        heapq.heappush(self.events, (date, kind, self.event_seq, pos))
+        self.event_seq += 1
+    
+    def generate_entry_check_dates(self) -> List[datetime]:
+        """Entry-check sessions for config['trade_frequency'] (weekly unless Daily/Intraday/Monthly)"""
+        calendar = get_calendar()
+        frequency = self.config.get('trade_frequency', 'Weekly')
+        if frequency in ('Daily', 'Intraday (Multiple per day)'):
+            sessions = calendar.sessions_between(self.start_date, self.end_date)
+        elif frequency == 'Monthly':
+            sessions = calendar.first_sessions_of_months(self.start_date, self.end_date)
+        else:
+            # First session of each week, so a Monday holiday moves the check to Tuesday
+            sessions = calendar.first_sessions_of_weeks(self.start_date, self.end_date)
+        return session_datetimes(sessions, ET)
+    
+    def prepare_data(self, tickers: Optional[List[str]] = None):
+        """Preload prices, contract indexes and (for the IV Rank Filter) IV histories of tickers"""
+        tickers = self.tickers if tickers is None else tickers
+        self.preload_underlying_prices(tickers)
+        self.build_options_indexes(tickers)
+        if self.iv_rank_range is not None:
+            self.build_iv_histories(tickers)
+    
+    def preload_underlying_prices(self, tickers: List[str]):
+        """Load each ticker's full backtest window with one range request"""
+        start = self.start_date.strftime('%Y-%m-%d')
+        end = self.end_date.strftime('%Y-%m-%d')
+        
+        # Tickers in the cube are zero-copy views of it
+        if self.cube is not None and self.cube.covers(start, end):
+            for ticker in tickers:
+                if ticker in self.cube:
+                    self.price_series[ticker] = self.cube.price_series(ticker)
+            tickers = [t for t in tickers if t not in self.price_series]
+        
+        # Unadjusted bars so prices line up with historical strikes
+        missing = [t for t in tickers if not self.store.has_range(t, start, end)]
+        fetched = self.fetcher.fetch_daily_bars([(t, start, end) for t in missing], adjusted=False)
+        self.store.put_ranges([(t, start, end, fetched[t]) for t in missing if t in fetched])
+        
+        for ticker in tickers:
+            if ticker in self.fetcher.errors:
+                self.log(f"Could not preload {ticker}: {self.fetcher.errors[ticker]}")
+            self.price_series[ticker] = PriceSeries.from_rows(self.store.get_bars(ticker, start, end))
+    
+    def build_options_indexes(self, tickers: List[str]):
+        """Build each ticker's contract reference index once for the whole window"""
+        for ticker in tickers:
+            try:
+                self.options_index[ticker] = build_index(
+                    self.client, self.store, ticker,
+                    self.start_date, self.end_date, self.min_dte, self.max_dte
+                )
+            except Exception as e:
+                self.log(f"Could not index options for {ticker}: {e}")
+    
+    def build_iv_histories(self, tickers: List[str]):
+        """Load (building on first use) each ticker's ATM IV / IV rank series from the store"""
+        for ticker in tickers:
+            try:
+                self.iv_history[ticker] = build_iv_history(
+                    self.store, self.client, self.fetcher, ticker,
+                    self.start_date, self.end_date, self.risk_free_rate, self.log
+                )
+            except Exception as e:
+                self.log(f"Could not build IV history for {ticker}: {e}")
+    
+    @staticmethod
+    def parse_iv_rank_range(config: Dict) -> Optional[tuple]:
+        """(Min IV Rank, Max IV Rank) when the IV Rank Filter is enabled, else None"""
+        if not config.get('indicators', {}).get('IV Rank Filter'):
+            return None
+        params = dict(config.get('parameters', {}))
+        params.update(config.get('indicator_parameters', {}).get('IV Rank Filter', {}))
+        try:
+            return float(params.get('Min IV Rank', 0)), float(params.get('Max IV Rank', 100))
+        except (TypeError, ValueError):
+            return None
+    
+    def passes_iv_rank(self, ticker: str, date: datetime) -> bool:
+        history = self.iv_history.get(ticker)
+        rank = history.rank_on(date) if history is not None else None
+        # Like the greeks limits, a rank that can't be computed doesn't reject
+        if rank is None:
+            return True
+        low, high = self.iv_rank_range
+        return low <= rank <= high
     
     def get_underlying_price(self, ticker: str, date: datetime) -> Optional[float]:
+        series = self.price_series.get(ticker)
+        if series is not None and self.start_date.date() <= date.date() <= self.end_date.date():
+            price = series.price_on(date)
+            self.data_stats['hits' if price is not None else 'negative_hits'] += 1
+            return price
+        
         cache_key = f"{ticker}_{date.date()}"
         if cache_key in self.price_cache:
-            return self.price_cache[cache_key]
+            price = self.price_cache[cache_key]
+            self.data_stats['hits' if price is not None else 'negative_hits'] += 1
+            return price
         
-        try:
-            agg = self.client.get_daily_open_close_agg(ticker=ticker, date=date.strftime('%Y-%m-%d'))
-            price = getattr(agg, 'close', None) or getattr(agg, 'open', None)
+        date_str = date.strftime('%Y-%m-%d')
+        bar = self.store.get_bar(ticker, date_str)
+        if bar:
+            price = bar['close'] or bar['open']
             if price:
-                price = float(price)
+                self.data_stats['hits'] += 1
                 self.price_cache[cache_key] = price
                 return price
+        if self.store.get_negative(ticker, date_str):
+            self.data_stats['negative_hits'] += 1
+            self.price_cache[cache_key] = None
+            return None
+        
+        self.data_stats['misses'] += 1
+        price = None
+        try:
+            agg = self.client.get_daily_open_close_agg(ticker=ticker, date=date_str)
+            self.store.put_bars(ticker, [self.agg_to_row(agg, date_str)])
+            price = getattr(agg, 'close', None) or getattr(agg, 'open', None)
+            price = float(price) if price else None
+            if price is None:
+                self.store.put_negative(ticker, date_str, NO_TRADE)
+        except MassiveAPIError as e:
+            # 404 is the API's answer for a day with no bar
+            if e.status == 404:
+                self.store.put_negative(ticker, date_str, NO_TRADE)
+            else:
+                self.data_stats['api_errors'] += 1
+                self.store.put_negative(ticker, date_str, API_ERROR, self.negative_ttl)
         except:
-            pass
-        return None
+            self.data_stats['api_errors'] += 1
+            self.store.put_negative(ticker, date_str, API_ERROR, self.negative_ttl)
+        self.price_cache[cache_key] = price
+        return price
     
-    def get_options_for_expiration(self, ticker: str, date: datetime, expiration: str) -> List[Dict]:
+    @staticmethod
+    def agg_to_row(agg, date_str: str) -> tuple:
+        """Convert a daily open/close agg into a store row"""
+        return (date_str, getattr(agg, 'open', None), getattr(agg, 'high', None),
+                getattr(agg, 'low', None), getattr(agg, 'close', None), getattr(agg, 'volume', None))
+    
+    def get_options_for_expiration(self, ticker: str, date: datetime, expiration: str) -> Optional[OptionsChain]:
         cache_key = f"{ticker}_{date.date()}_{expiration}"
         if cache_key in self.options_cache:
-            return self.options_cache[cache_key]
+            chain = self.options_cache[cache_key]
+            self.data_stats['hits' if chain else 'negative_hits'] += 1
+            return chain
+        
+        date_str = date.strftime('%Y-%m-%d')
+        negative_key = f"{date_str}/{expiration}"
+        if self.store.get_negative(ticker, negative_key):
+            self.data_stats['negative_hits'] += 1
+            self.options_cache[cache_key] = None
+            return None
         
+        misses = self.data_stats['misses']
         try:
-            contracts = list(self.client.list_options_contracts(
-                underlying_ticker=ticker,
-                expiration_date=expiration,
-                limit=100
-            ))
+            index = self.options_index.get(ticker)
+            if index is not None:
+                contracts = index.contracts_for(expiration, date)
+            else:
+                contracts = self.store.get_contracts(ticker, expiration)
+            if contracts is None:
+                self.data_stats['misses'] += 1
+                contracts = [
+                    {'ticker': c.ticker, 'strike': float(c.strike_price), 'type': c.contract_type}
+                    for c in self.client.list_options_contracts(
+                        underlying_ticker=ticker,
+                        expiration_date=expiration,
+                        limit=100
+                    )
+                ]
+                self.store.put_contracts(ticker, expiration, contracts)
+            if not contracts:
+                self.store.put_negative(ticker, negative_key, NOT_LISTED)
+                self.options_cache[cache_key] = None
+                return None
             
-            options_data = []
-            date_str = date.strftime('%Y-%m-%d')
+            failed = self.fetch_contract_bars(contracts, date_str, expiration)
+            if self.data_stats['misses'] == misses:
+                self.data_stats['hits'] += 1
             
-            for contract in contracts[:50]:  # Limit API calls
-                try:
-                    opt_agg = self.client.get_daily_open_close_agg(
-                        ticker=contract.ticker, 
-                        date=date_str
-                    )
-                    
-                    close = getattr(opt_agg, 'close', None)
-                    if not close:
-                        continue
-                    
-                    spread = max(0.05, float(close) * 0.02)
-                    options_data.append({
-                        'strike': float(contract.strike_price),
-                        'bid': max(0.01, float(close) - spread/2),
-                        'ask': max(0.02, float(close) + spread/2),
-                        'type': contract.contract_type,
-                        'mid': float(close)
-                    })
-                except:
-                    continue
+            bars = self.store.get_bars_on([c['ticker'] for c in contracts], date_str)
+            quoted = [c for c in contracts if c['ticker'] in bars and bars[c['ticker']][3]]
+            if not quoted:
+                # Nothing printed; only a definite answer if every request went through
+                if failed:
+                    self.data_stats['api_errors'] += 1
+                    self.store.put_negative(ticker, negative_key, API_ERROR, self.negative_ttl)
+                else:
+                    self.store.put_negative(ticker, negative_key, NO_TRADE)
+            
+            close = np.array([bars[c['ticker']][3] for c in quoted], dtype=np.float64)
+            spread = np.maximum(0.05, close * 0.02)
+            chain = OptionsChain.from_arrays(
+                np.array([c['type'] == 'put' for c in quoted], dtype=bool),
+                {
+                    'strike': np.array([c['strike'] for c in quoted], dtype=np.float64),
+                    'bid': np.maximum(0.01, close - spread/2),
+                    'ask': np.maximum(0.02, close + spread/2),
+                    'mid': close,
+                    'volume': np.array([bars[c['ticker']][4] or np.nan for c in quoted], dtype=np.float64),
+                },
+                np.array([c['ticker'] for c in quoted], dtype=object),
+                underlying_price=self.get_underlying_price(ticker, date),
+                expiration=expiration
+            )
             
-            self.options_cache[cache_key] = options_data
-            return options_data
+            # Implied vol and greeks for the whole chain in one vectorized call
+            years = max((datetime.fromisoformat(expiration).date() - date.date()).days, 0) / DAYS_PER_YEAR
+            fill_chain_greeks(chain, years, self.risk_free_rate)
+            
+            self.options_cache[cache_key] = chain
+            return chain
         except:
-            return []
+            self.data_stats['api_errors'] += 1
+            self.store.put_negative(ticker, negative_key, API_ERROR, self.negative_ttl)
+            return None
+    
+    def fetch_contract_bars(self, contracts: List[Dict], date_str: str, expiration: str) -> int:
+        """
+        Batch-fetch bars, from date through expiration, for contracts the store hasn't covered
+
+        Returns the number of requests that failed.
+        """
+        # Days after the last completed session may still gain bars, so they are
+        # left to a later fetch rather than marked as fetched
+        complete = str(get_calendar().last_completed_session())
+        last = max(date_str, min(expiration, self.end_date.strftime('%Y-%m-%d'), complete))
+        missing = [
+            (c['ticker'], date_str, last) for c in contracts
+            if not self.store.has_range(c['ticker'], date_str, date_str)
+        ]
+        if not missing:
+            return 0
+        
+        self.data_stats['misses'] += 1
+        fetched = self.fetcher.fetch_daily_bars(missing)
+        self.store.put_ranges([
+            (contract, start, end, fetched[contract])
+            for contract, start, end in missing if contract in fetched
+        ])
+        return len(missing) - len(fetched)
     
     def find_expirations(self, ticker: str, date: datetime) -> List[str]:
+        index = self.options_index.get(ticker)
+        if index is not None:
+            return index.expirations_between(date, self.min_dte, self.max_dte)[:2]
+        
         min_date = date + timedelta(days=self.min_dte)
         max_date = date + timedelta(days=self.max_dte)
         
@@ -168,66 +419,81 @@ class OptionsBacktestEngine:
         except:
             return []
     
+    def entry_ticker(self, date: datetime) -> str:
+        """The one ticker checked on date (tickers take turns by calendar day)"""
+        return self.tickers[(date - self.start_date).days % len(self.tickers)]
+    
     def check_entry_signals(self, date: datetime):
-        ticker_idx = (date - self.start_date).days % len(self.tickers)
-        ticker = self.tickers[ticker_idx]
-        
-        pos = self.check_ticker_entry(ticker, date)
+        pos = self.check_ticker_entry(self.entry_ticker(date), date)
         if pos:
-            self.open_positions.append(pos)
+            self.book.add(pos)
+            self.schedule_exit(pos)
             self.log(f"Opened {pos.strategy} on {pos.symbol}")
     
     def check_ticker_entry(self, ticker: str, date: datetime) -> Optional[OptionsPosition]:
-        if any(p.symbol == ticker for p in self.open_positions):
+        if self.book.has_open(ticker):
             return None
-        
+        return self.find_entry(ticker, date)
+    
+    def find_entry(self, ticker: str, date: datetime) -> Optional[OptionsPosition]:
+        """The position the strategy would open on ticker at date, ignoring what is already held"""
         price = self.get_underlying_price(ticker, date)
         if not price:
             return None
         
+        if self.iv_rank_range is not None and not self.passes_iv_rank(ticker, date):
+            return None
+        
         exps = self.find_expirations(ticker, date)
         if not exps:
             return None
         
         for exp in exps[:1]:
-            options = self.get_options_for_expiration(ticker, date, exp)
-            if not options:
+            chain = self.get_options_for_expiration(ticker, date, exp)
+            if not chain:
                 continue
             
-            calls = [o for o in options if o['type'] == 'call']
-            puts = [o for o in options if o['type'] == 'put']
-            
-            if len(calls) >= 2 and len(puts) >= 2:
-                pos = self.construct_iron_condor(ticker, date, price, calls, puts, exp)
+            if len(chain.calls) >= 2 and len(chain.puts) >= 2:
+                pos = self.construct_iron_condor(ticker, date, price, chain, exp)
                 if pos:
                     return pos
         
         return None
     
     def construct_iron_condor(self, ticker: str, date: datetime, price: float,
-                             calls: List[Dict], puts: List[Dict], exp: str) -> Optional[OptionsPosition]:
+                             chain: OptionsChain, exp: str) -> Optional[OptionsPosition]:
         try:
-            calls = sorted(calls, key=lambda x: x['strike'])
-            puts = sorted(puts, key=lambda x: x['strike'])
+            calls, puts = chain.calls, chain.puts
             
-            otm_calls = [c for c in calls if c['strike'] > price * 1.02]
-            otm_puts = [p for p in puts if p['strike'] < price * 0.98]
+            if self.uses_delta_targets(chain):
+                legs = self.select_delta_legs(chain)
+                if legs is None:
+                    return None
+                c_idx, p_idx = legs
+            else:
+                # No usable deltas: first two calls above +2%, last two puts below -2%
+                c_sell = calls.first_above(price * 1.02)
+                p_sell = puts.count_below(price * 0.98) - 1
+                
+                if c_sell + 2 > len(calls) or p_sell < 1:
+                    return None
+                
+                c_idx = np.array([c_sell, c_sell + 1])
+                p_idx = np.array([p_sell, p_sell - 1])
             
-            if len(otm_calls) < 2 or len(otm_puts) < 2:
+            if not self.passes_greeks_limits(calls, puts, c_idx, p_idx):
                 return None
             
-            c_sell = otm_calls[0]
-            c_buy = otm_calls[min(1, len(otm_calls)-1)]
-            p_sell = otm_puts[-1]
-            p_buy = otm_puts[max(-2, -len(otm_puts))]
-            
-            credit = (c_sell['bid'] + c_sell['ask'])/2 - (c_buy['bid'] + c_buy['ask'])/2 + \
-                    (p_sell['bid'] + p_sell['ask'])/2 - (p_buy['bid'] + p_buy['ask'])/2
+            c_mid = (calls.bid[c_idx] + calls.ask[c_idx]) / 2
+            p_mid = (puts.bid[p_idx] + puts.ask[p_idx]) / 2
+            credit = float(c_mid[0] - c_mid[1] + p_mid[0] - p_mid[1])
             
             if credit <= 0:
                 return None
             
-            width = max(c_buy['strike'] - c_sell['strike'], p_sell['strike'] - p_buy['strike'])
+            c_strikes = calls.strike[c_idx]
+            p_strikes = puts.strike[p_idx]
+            width = float(max(c_strikes[1] - c_strikes[0], p_strikes[0] - p_strikes[1]))
             max_loss = width - credit
             
             if max_loss <= 0:
@@ -239,10 +505,10 @@ class OptionsBacktestEngine:
                 entry_date=date,
                 expiration_date=datetime.fromisoformat(exp).replace(tzinfo=ET),
                 legs=[
-                    {'type': 'call', 'action': 'sell', 'strike': c_sell['strike']},
-                    {'type': 'call', 'action': 'buy', 'strike': c_buy['strike']},
-                    {'type': 'put', 'action': 'sell', 'strike': p_sell['strike']},
-                    {'type': 'put', 'action': 'buy', 'strike': p_buy['strike']},
+                    {'type': 'call', 'action': 'sell', 'strike': float(c_strikes[0])},
+                    {'type': 'call', 'action': 'buy', 'strike': float(c_strikes[1])},
+                    {'type': 'put', 'action': 'sell', 'strike': float(p_strikes[0])},
+                    {'type': 'put', 'action': 'buy', 'strike': float(p_strikes[1])},
                 ],
                 entry_cost=credit,
                 max_profit=credit,
@@ -252,39 +518,117 @@ class OptionsBacktestEngine:
         except:
             return None
     
-    def update_positions(self, date: datetime):
-        to_close = []
+    def uses_delta_targets(self, chain: OptionsChain) -> bool:
+        """Delta ranges are configured and the chain has deltas on both sides"""
+        if parse_range(self.params.get('Delta Range (Short Leg)')) is None:
+            return False
+        if parse_range(self.params.get('Delta Range (Long Leg)')) is None:
+            return False
+        return not (np.all(np.isnan(chain.calls.delta)) or np.all(np.isnan(chain.puts.delta)))
+    
+    def select_delta_legs(self, chain: OptionsChain) -> Optional[tuple]:
+        """
+        [short, long] call and put indices from the config's delta ranges
         
-        for pos in self.open_positions:
-            if date.date() >= pos.expiration_date.date():
-                to_close.append((pos, "Expiration"))
-                continue
-            
-            price = self.get_underlying_price(pos.symbol, date)
-            if not price:
-                continue
-            
-            # Simplified P&L
-            c_sell = [l['strike'] for l in pos.legs if l['type']=='call' and l['action']=='sell'][0]
-            p_sell = [l['strike'] for l in pos.legs if l['type']=='put' and l['action']=='sell'][0]
-            
-            if p_sell <= price <= c_sell:
-                pos.current_pnl = pos.max_profit * 0.8
-            else:
-                pos.current_pnl = -pos.max_loss * 0.5
-            
-            pos.days_held = (date - pos.entry_date).days
-            
-            if self.risk_config['stop_loss_enabled']:
-                if pos.current_pnl <= -pos.max_loss * (self.risk_config['stop_loss_pct']/100):
-                    to_close.append((pos, "Stop Loss"))
-            
-            if self.risk_config['profit_target_enabled']:
-                if pos.current_pnl >= pos.max_profit * (self.risk_config['profit_target_pct']/100):
-                    to_close.append((pos, "Profit Target"))
+        Each short leg is the OTM contract whose |delta| is nearest the middle
+        of 'Delta Range (Short Leg)'; its wing is the further-OTM contract
+        nearest the middle of 'Delta Range (Long Leg)'. None if either side
+        has no contract in range.
+        """
+        short_range = parse_range(self.params.get('Delta Range (Short Leg)'))
+        long_range = parse_range(self.params.get('Delta Range (Long Leg)'))
+        
+        legs = []
+        for side in (chain.calls, chain.puts):
+            abs_delta = np.abs(side.delta)
+            short = np.flatnonzero(side.delta_mask(*short_range) & side.otm_mask(chain.underlying_price))
+            if len(short) == 0:
+                return None
+            s = short[np.argmin(np.abs(abs_delta[short] - sum(short_range) / 2))]
+            beyond = side.strike > side.strike[s] if side.contract_type == 'call' else side.strike < side.strike[s]
+            wing = np.flatnonzero(side.delta_mask(*long_range) & beyond)
+            if len(wing) == 0:
+                return None
+            l = wing[np.argmin(np.abs(abs_delta[wing] - sum(long_range) / 2))]
+            legs.append(np.array([s, l]))
+        return tuple(legs)
+    
+    def passes_greeks_limits(self, calls, puts, c_idx: np.ndarray, p_idx: np.ndarray) -> bool:
+        """Net position greeks (short legs negative) against Min Theta / Max Vega / Max Gamma"""
+        sign = np.array([-1.0, 1.0])
+        net = {
+            name: float(np.dot(sign, getattr(calls, name)[c_idx]) + np.dot(sign, getattr(puts, name)[p_idx]))
+            for name in ('theta', 'vega', 'gamma')
+        }
+        limits = (
+            ('Min Theta (per day)', lambda v: net['theta'] >= v),
+            ('Max Vega', lambda v: abs(net['vega']) <= v),
+            ('Max Gamma', lambda v: abs(net['gamma']) <= v),
+        )
+        for param, ok in limits:
+            limit = parse_range(self.params.get(param))
+            # A limit can't be judged without greeks (no IV), so it doesn't reject
+            if limit is not None and np.isfinite(list(net.values())).all() and not ok(limit[0]):
+                return False
+        return True
+    
+    def schedule_exit(self, pos: OptionsPosition):
+        """Queue a new position's exit event"""
+        planned = self.plan_exit(pos)
+        if planned is not None:
+            self.push_event(planned[0], planned[1], pos)
+    
+    def plan_exit(self, pos: OptionsPosition) -> Optional[tuple]:
+        """
+        (date, event kind) of a new position's exit, or None if it outlives the backtest
+        
+        Positions are marked on the entry-check days before expiration, so the
+        first mark that crosses the stop loss, profit target or trailing stop is
+        found with one pass over the price array; otherwise the position expires (or is closed
+        at the end of the backtest) at its last mark.
+        """
+        days = self.check_days
+        entry = np.datetime64(pos.entry_date.date(), 'D')
+        expiration = np.datetime64(pos.expiration_date.date(), 'D')
+        days = days[(days > entry) & (days < expiration)]
+        
+        series = self.price_series.get(pos.symbol)
+        if series is not None:
+            prices = series.prices_on(days)
+        else:
+            prices = np.array([self.get_underlying_price(pos.symbol, self.as_datetime(d)) or np.nan
+                               for d in days], dtype=np.float64)
+        marked = ~np.isnan(prices)
+        days, prices = days[marked], prices[marked]
         
-        for pos, reason in to_close:
-            self.close_position(pos, date, reason)
+        # Simplified P&L
+        c_sell = self.book.short_strike(pos.book_id, 'call')
+        p_sell = self.book.short_strike(pos.book_id, 'put')
+        inside = (prices >= p_sell) & (prices <= c_sell)
+        pnl = np.where(inside, pos.max_profit * 0.8, -pos.max_loss * 0.5)
+        
+        # Running high-water mark, so the trailing stop is judged on every day at once
+        high_water = np.maximum.accumulate(np.maximum(pnl, 0.0)) if len(pnl) else pnl
+        checks = exit_masks(pnl, high_water, pos.max_profit, pos.max_loss, self.risk_config)
+        
+        hits = np.flatnonzero(np.logical_or.reduce(list(checks.values())))
+        if len(hits):
+            i = hits[0]
+            pos.current_pnl = float(pnl[i])
+            pos.exit_reason = next(reason for reason, hit in checks.items() if hit[i])
+            self.book.high_water[pos.book_id] = high_water[i]
+            return self.as_datetime(days[i]), EVENT_EXIT
+        
+        if len(pnl):
+            pos.current_pnl = float(pnl[-1])
+            self.book.high_water[pos.book_id] = high_water[-1]
+        if pos.expiration_date <= self.end_date:
+            return pos.expiration_date, EVENT_EXPIRATION
+        return None
+    
+    @staticmethod
+    def as_datetime(day: np.datetime64) -> datetime:
+        return datetime.fromisoformat(str(day)).replace(tzinfo=ET)
     
     def close_position(self, pos: OptionsPosition, date: datetime, reason: str):
         pos.exit_date = date
@@ -292,71 +636,87 @@ class OptionsBacktestEngine:
         pos.days_held = (date - pos.entry_date).days
         pos.underlying_exit_price = self.get_underlying_price(pos.symbol, date) or pos.underlying_entry_price
         
-        self.open_positions.remove(pos)
-        self.closed_positions.append(pos)
-        self.all_trades.append({
-            'Symbol': pos.symbol,
-            'Strategy': pos.strategy,
-            'Entry Date': pos.entry_date.strftime('%Y-%m-%d'),
-            'Exit Date': pos.exit_date.strftime('%Y-%m-%d'),
-            'Days Held': pos.days_held,
-            'Entry Cost': round(pos.entry_cost, 2),
-            'Max Profit': round(pos.max_profit, 2),
-            'Max Loss': round(pos.max_loss, 2),
-            'PnL': round(pos.current_pnl, 2),
-            'PnL %': round((pos.current_pnl/abs(pos.entry_cost))*100, 2) if pos.entry_cost != 0 else 0,
-            'Exit Reason': pos.exit_reason,
-            'Win': pos.current_pnl > 0,
-            'Underlying Entry': round(pos.underlying_entry_price, 2),
-            'Underlying Exit': round(pos.underlying_exit_price, 2),
-        })
+        self.book.pnl[pos.book_id] = pos.current_pnl
+        self.book.close(pos.book_id, np.datetime64(date.date(), 'D'))
+        self.all_trades.append(pos)
+        # Stats see the same cent-rounded figures as the trade rows
+        pnl_pct = round((pos.current_pnl / abs(pos.entry_cost)) * 100, 2) if pos.entry_cost != 0 else 0
+        self.trade_stats.add(round(pos.current_pnl, 2), pnl_pct, pos.exit_date.strftime('%Y-%m-%d'),
+                             pos.current_pnl > 0)
     
     def close_all_positions(self, date: datetime):
-        for pos in list(self.open_positions):
+        for pos in self.book.open_positions():
             self.close_position(pos, date, "Backtest End")
     
     def calculate_results(self) -> Dict:
         if not self.all_trades:
-            return {'trades': [], 'stats': {}, 'equity_curve': [], 'strategy': self.strategy, 'config': self.config, 'by_symbol': {}}
-        
-        df = pd.DataFrame(self.all_trades)
-        wins = len(df[df['Win']])
-        total = len(df)
-        
-        stats = {
-            'total_trades': total,
-            'winning_trades': wins,
-            'losing_trades': total - wins,
-            'win_rate': round((wins/total*100) if total > 0 else 0, 2),
-            'total_pnl': round(df['PnL'].sum(), 2),
-            'avg_pnl': round(df['PnL'].mean(), 2),
-            'avg_win': round(df[df['Win']]['PnL'].mean() if wins > 0 else 0, 2),
-            'avg_loss': round(df[~df['Win']]['PnL'].mean() if (total-wins) > 0 else 0, 2),
-            'profit_factor': 0,
-            'max_drawdown': 0,
-            'sharpe_ratio': 0,
-        }
-        
-        if stats['avg_loss'] != 0:
-            stats['profit_factor'] = round(abs(stats['avg_win']/stats['avg_loss']), 2)
-        
-        df_sorted = df.sort_values('Exit Date')
-        df_sorted['Cumulative PnL'] = df_sorted['PnL'].cumsum()
-        
-        equity_curve = [
-            {'date': row['Exit Date'], 'cumulative_pnl': row['Cumulative PnL'], 'trade_pnl': row['PnL']}
-            for _, row in df_sorted.iterrows()
-        ]
-        
-        by_symbol = {}
-        for symbol in df['Symbol'].unique():
-            by_symbol[symbol] = df[df['Symbol'] == symbol].to_dict('records')
+            return {'trades': [], 'stats': {}, 'equity_curve': [], 'strategy': self.strategy, 'config': self.config, 'by_symbol': {},
+                    'data_stats': dict(self.data_stats)}
         
+        nav = self.portfolio_nav()
+        symbol_index = self.all_trades.symbol_index()
+        stats = self.trade_stats.stats()
+        # Drawdown and Sharpe from the daily NAV rather than the exit-date samples
+        stats.update(nav_stats(nav['nav']))
         return {
             'trades': self.all_trades,
             'stats': stats,
-            'equity_curve': equity_curve,
+            'equity_curve': self.trade_stats.equity_curve,
+            'nav': nav,
             'strategy': self.strategy,
             'config': self.config,
-            'by_symbol': by_symbol
+            'by_symbol': symbol_index.by_symbol(self.all_trades),
+            'symbol_index': symbol_index,
+            'data_stats': dict(self.data_stats)
         }
+    
+    def save_results(self, results: Dict):
+        """Write the run to config['results_dir'] (default under the cache dir; empty to skip)"""
+        results_dir = self.config.get('results_dir', DEFAULT_RESULTS_DIR)
+        if not results_dir or not results['trades']:
+            return
+        try:
+            results['results_path'] = save_results(results, new_results_path(results_dir, self.strategy))
+            self.log(f"Saved results to {results['results_path']}")
+        except (OSError, TypeError) as e:
+            self.log(f"Could not save results: {e}")
+    
+    def portfolio_nav(self) -> Dict:
+        """Daily NAV over the backtest sessions: capital + realized P&L + open positions' marks"""
+        sessions = get_calendar().sessions_between(self.start_date, self.end_date)
+        trades = self.all_trades.data
+        # Exits off a session count from the next one (and the last one at the end)
+        exit_rows = np.searchsorted(sessions, trades['exit_day'].astype('datetime64[D]'))
+        exit_rows = np.minimum(exit_rows, len(sessions) - 1)
+        mark_rows, mark_pnl = self.daily_marks(sessions)
+        nav = nav_series(len(sessions), self.starting_capital, exit_rows, trades['pnl'], mark_rows, mark_pnl)
+        return {'dates': sessions, 'nav': nav, 'starting_capital': self.starting_capital}
+    
+    def daily_marks(self, sessions: np.ndarray) -> tuple:
+        """
+        (session rows, P&L) of every position on each session it was open
+        
+        Marked with the same simplified P&L as plan_exit, one array per
+        position, on the sessions strictly between its entry and its exit
+        (entry marks at zero, the exit is realized). A session without a
+        price keeps the previous mark.
+        """
+        book = self.book
+        rows, marks = [], []
+        for pid in range(book.n):
+            series = self.price_series.get(book.symbol[pid])
+            if series is None or np.isnat(book.exit_day[pid]):
+                continue
+            lo = np.searchsorted(sessions, book.entry_day[pid], 'right')
+            hi = np.searchsorted(sessions, book.exit_day[pid], 'left')
+            if hi <= lo:
+                continue
+            prices = series.prices_on(sessions[lo:hi])
+            inside = (prices >= book.short_strike(pid, 'put')) & (prices <= book.short_strike(pid, 'call'))
+            pnl = np.where(inside, book.max_profit[pid] * 0.8, -book.max_loss[pid] * 0.5)
+            last = np.maximum.accumulate(np.where(np.isnan(prices), -1, np.arange(hi - lo)))
+            rows.append(np.arange(lo, hi))
+            marks.append(np.where(last >= 0, pnl[np.maximum(last, 0)], 0.0))
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.concatenate(rows), np.concatenate(marks)
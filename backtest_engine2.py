@@ -4,19 +4,28 @@ Options Backtesting Engine
 Uses Massive API for historical options chains and pricing
 """
 
-from massive import RESTClient
 from datetime import datetime, timedelta, time
 from zoneinfo import ZoneInfo
 from typing import List, Dict, Optional, Callable
-import pandas as pd
 import numpy as np
 from dataclasses import dataclass
-import concurrent.futures
 import time as time_module
+from price_series import PriceSeries
+from batch_fetcher import BatchFetcher
+from position_book import PositionBook
+from trade_log import TradeLog
+from results_io import save_results, new_results_path, DEFAULT_RESULTS_DIR
+from trade_stats import StatsAccumulator, nav_series, nav_stats, STARTING_CAPITAL
+from ohlcv_cube import get_shared_cube
+from trading_calendar import get_calendar, session_datetimes
+from prefetch import SessionPrefetcher
+from options_chain import OptionsChain
+from strategy_builders import STRATEGY_BUILDERS, BACK_MONTH_STRATEGIES, BuildParams, build_position
+from replay_transport import client_for_config
 
 ET = ZoneInfo("America/New_York")
 
-@dataclass
+@dataclass(slots=True)
 class OptionsPosition:
     """Represents an options position"""
     symbol: str
@@ -33,6 +42,7 @@ class OptionsPosition:
     underlying_entry_price: float = 0.0
     underlying_exit_price: Optional[float] = None
     days_held: int = 0
+    book_id: int = -1
 
 class OptionsBacktestEngine:
     def __init__(self, api_key: str, tickers: List[str], config: Dict, 
@@ -46,7 +56,8 @@ class OptionsBacktestEngine:
             config: Configuration dictionary from UI
             progress_callback: Optional callback for progress updates
         """
-        self.client = RESTClient(api_key=api_key)
+        self.client = client_for_config(api_key, config)
+        self.fetcher = BatchFetcher(self.client, max_concurrency=config.get('api_max_concurrency', 64))
         self.tickers = tickers
         self.config = config
         self.progress_callback = progress_callback
@@ -59,20 +70,36 @@ class OptionsBacktestEngine:
         self.max_dte = config['max_dte']
         self.max_positions = config['max_positions']
         self.capital_per_trade = config['capital_per_trade']
+        self.starting_capital = config.get('starting_capital', STARTING_CAPITAL)
         
         # Risk management
         self.risk_config = config['risk_management']
         
         # Parameters
         self.params = config['parameters']
+        self.build_params = BuildParams.from_config(self.params)
         
         # Indicators
         self.indicators = config['indicators']
         
         # Results storage
-        self.all_trades = []
-        self.open_positions = []
-        self.closed_positions = []
+        self.all_trades = TradeLog()
+        self.trade_stats = StatsAccumulator()
+        self.book = PositionBook()
+        # Each session's marks of the positions held at its close, for the NAV
+        self.mark_rows = []
+        self.mark_pnl = []
+        
+        # Underlying closes for the whole window, one array per ticker
+        self.price_series = {}
+        self.cube = get_shared_cube(config['ohlcv_cube']) if config.get('ohlcv_cube') else None
+        
+        # Chains and option marks are loaded this many sessions ahead of the simulation
+        self.prefetch_sessions = config.get('prefetch_sessions', 5)
+        self.prefetch_fetcher = BatchFetcher(self.client, max_concurrency=config.get('api_max_concurrency', 64))
+        self.session_data = {}
+        self.published_symbols = frozenset()
+        self.published_contracts = ()
         
     def log(self, message: str):
         """Log progress"""
@@ -91,109 +118,142 @@ class OptionsBacktestEngine:
         self.log(f"Period: {self.start_date.date()} to {self.end_date.date()}")
         self.log(f"Tickers: {len(self.tickers)} symbols")
         
+        # Load underlying prices for the whole window up front
+        self.preload_underlying_prices()
+        
         # Generate trading days
         trading_days = self.generate_trading_days()
         self.log(f"Total trading days: {len(trading_days)}")
         
-        # Run day-by-day simulation
-        for idx, current_date in enumerate(trading_days):
-            if idx % 20 == 0:
-                self.log(f"Processing: {current_date.date()} ({idx+1}/{len(trading_days)}) - "
-                        f"Positions: {len(self.open_positions)}, Trades: {len(self.all_trades)}")
-            
-            # Update existing positions
-            self.update_positions(current_date)
-            
-            # Check for new entry signals
-            if len(self.open_positions) < self.max_positions:
-                self.check_entry_signals(current_date)
+        # Run day-by-day simulation while upcoming sessions load in the background
+        with SessionPrefetcher(trading_days, self.load_session, self.prefetch_sessions) as sessions:
+            for idx, (current_date, data) in enumerate(sessions):
+                self.session_data = data
+                if idx % 20 == 0:
+                    self.log(f"Processing: {current_date.date()} ({idx+1}/{len(trading_days)}) - "
+                            f"Positions: {self.book.open_count}, Trades: {len(self.all_trades)}")
+                
+                # Update existing positions
+                self.update_positions(current_date)
+                
+                # Check for new entry signals
+                if self.book.open_count < self.max_positions:
+                    self.check_entry_signals(current_date)
+                self.publish_held_contracts()
+                
+                open_ids = self.book.open_ids()
+                self.mark_rows.append(np.full(len(open_ids), idx))
+                self.mark_pnl.append(self.book.pnl[open_ids])
+        self.session_data = {}
+        self.log(f"Waited {sessions.wait_time:.1f}s on prefetched data")
         
         # Close any remaining positions at backtest end
         self.close_all_positions(self.end_date)
         
+        # Write the archive when recording API responses
+        self.client.flush()
+        
         # Calculate statistics
         results = self.calculate_results()
+        self.save_results(results)
         
         self.log(f"✓ Backtest complete! {len(self.all_trades)} total trades")
         
         return results
     
     def generate_trading_days(self) -> List[datetime]:
-        """Generate list of trading days in the backtest period"""
-        days = []
-        current = self.start_date
+        """Generate list of trading days (exchange sessions) in the backtest period"""
+        sessions = get_calendar().sessions_between(self.start_date, self.end_date)
+        return session_datetimes(sessions, ET)
+    
+    def load_session(self, date: datetime) -> Dict:
+        """
+        Market data one session will need, loaded on the prefetch thread
         
-        while current <= self.end_date:
-            # Skip weekends
-            if current.weekday() < 5:  # Monday = 0, Sunday = 6
-                days.append(current)
-            current += timedelta(days=1)
+        Chains for every ticker without an open position and the day's close
+        of every contract held, both as of the simulation's last published
+        snapshot (guesses made ahead of time - whatever the simulation still
+        lacks it fetches itself). The book itself is never read here.
+        """
+        chains = {}
+        back_chains = {}
+        for ticker in self.tickers:
+            if ticker not in self.published_symbols:
+                chains[ticker] = self.get_historical_options_chain(ticker, date)
+                if self.strategy in BACK_MONTH_STRATEGIES and chains[ticker]:
+                    back_chains[ticker] = self.get_back_month_chain(ticker, date, chains[ticker]['expiration'])
+        
+        marks = self.fetch_marks(self.prefetch_fetcher, self.published_contracts, date)
+        return {'chains': chains, 'back_chains': back_chains, 'marks': marks}
+    
+    @staticmethod
+    def fetch_marks(fetcher: BatchFetcher, contracts, date: datetime) -> Dict[str, float]:
+        """Close on date of each contract that traded"""
+        date_str = date.strftime('%Y-%m-%d')
+        bars = fetcher.fetch_daily_bars([(c, date_str, date_str) for c in contracts])
+        return {c: rows[0][4] for c, rows in bars.items() if rows and rows[0][4]}
+    
+    def held_contracts(self) -> List[str]:
+        """Contracts of the open positions (main thread only)"""
+        book = self.book
+        held = book.contract[:book.n_legs][book.is_open[book.leg_pos[:book.n_legs]]]
+        return sorted(set(c for c in held if c))
+    
+    def publish_held_contracts(self):
+        """Hand the prefetch thread immutable copies of the held tickers and contracts"""
+        self.published_symbols = frozenset(p.symbol for p in self.book.open_positions())
+        self.published_contracts = tuple(self.held_contracts())
+    
+    def session_marks(self, date: datetime) -> Dict[str, float]:
+        """
+        The session's marks for every held contract
         
-        return days
+        Positions opened after the prefetch thread loaded this session have
+        no prefetched marks; those contracts are fetched here, once.
+        """
+        marks = self.session_data.setdefault('marks', {})
+        tried = self.session_data.setdefault('unpriced', set())
+        missing = [c for c in self.held_contracts() if c not in marks and c not in tried]
+        if missing:
+            marks.update(self.fetch_marks(self.fetcher, missing, date))
+            tried.update(c for c in missing if c not in marks)
+        return marks
     
     def update_positions(self, current_date: datetime):
-        """Update all open positions - check for exits"""
-        positions_to_close = []
-        
-        for position in self.open_positions:
-            # Check if expired
-            if current_date.date() >= position.expiration_date.date():
-                positions_to_close.append((position, "Expiration"))
-                continue
-            
-            # Get current option prices
-            try:
-                current_value = self.get_position_value(position, current_date)
-                position.current_pnl = current_value - position.entry_cost
-                position.days_held = (current_date - position.entry_date).days
-                
-                # Check stop loss
-                if self.risk_config['stop_loss_enabled']:
-                    stop_loss_threshold = -position.max_loss * (self.risk_config['stop_loss_pct'] / 100.0)
-                    if position.current_pnl <= stop_loss_threshold:
-                        positions_to_close.append((position, "Stop Loss"))
-                        continue
-                
-                # Check profit target
-                if self.risk_config['profit_target_enabled']:
-                    profit_target = position.max_profit * (self.risk_config['profit_target_pct'] / 100.0)
-                    if position.current_pnl >= profit_target:
-                        positions_to_close.append((position, "Profit Target"))
-                        continue
-                
-                # Check trailing stop
-                if self.risk_config['trailing_stop_enabled']:
-                    # Implementation would track high water mark
-                    pass
-                
-            except Exception as e:
-                print(f"Error updating position for {position.symbol}: {e}")
-                continue
-        
-        # Close positions
-        for position, reason in positions_to_close:
-            self.close_position(position, current_date, reason)
+        """Update all open positions - check for exits (one vectorized pass over the book)"""
+        book = self.book
+        ids = book.open_ids()
+        if len(ids) == 0:
+            return
+        
+        reasons = np.full(len(ids), None, dtype=object)
+        expired = book.expiration[ids] <= np.datetime64(current_date.date(), 'D')
+        reasons[expired] = "Expiration"
+        
+        # Mark every open position (expiring ones settle at today's mark) and
+        # test the exit rules on the live ones in one pass
+        live = ~expired
+        book.mark(ids, self.get_position_values(ids, current_date) - book.entry_cost[ids])
+        # Stop loss, profit target and trailing stop (off the high-water marks) in one pass
+        for reason, hit in book.exit_checks(ids[live], self.risk_config).items():
+            reasons[np.flatnonzero(live)[hit]] = reason
+        
+        # Close positions, in the order they were opened
+        for pid, reason in zip(ids, reasons):
+            if reason is not None:
+                self.close_position(book.positions[pid], current_date, reason)
     
     def check_entry_signals(self, current_date: datetime):
         """Check for new entry signals across all tickers"""
-        # Limit concurrent API calls
-        max_workers = min(5, len(self.tickers))
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_ticker = {
-                executor.submit(self.check_ticker_entry, ticker, current_date): ticker
-                for ticker in self.tickers
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_ticker):
-                try:
-                    position = future.result()
-                    if position:
-                        self.open_positions.append(position)
-                        self.log(f"Opened {position.strategy} on {position.symbol}")
-                except Exception as e:
-                    ticker = future_to_ticker[future]
-                    print(f"Error checking {ticker}: {e}")
+        # Market data is preloaded, so evaluating tickers is CPU work - no thread pool needed
+        for ticker in self.tickers:
+            try:
+                position = self.check_ticker_entry(ticker, current_date)
+                if position:
+                    self.book.add(position)
+                    self.log(f"Opened {position.strategy} on {position.symbol}")
+            except Exception as e:
+                print(f"Error checking {ticker}: {e}")
     
     def check_ticker_entry(self, ticker: str, current_date: datetime) -> Optional[OptionsPosition]:
         """
@@ -203,7 +263,7 @@ class OptionsBacktestEngine:
             OptionsPosition if entry signal triggered, else None
         """
         # Don't enter if we already have a position on this ticker
-        if any(p.symbol == ticker for p in self.open_positions):
+        if self.book.has_open(ticker):
             return None
         
         # Get underlying price
@@ -219,27 +279,68 @@ class OptionsBacktestEngine:
         if not self.check_indicators(ticker, current_date, underlying_price):
             return None
         
-        # Get options chain for this date
+        # Get options chain for this date (prefetched when it was foreseen)
         try:
-            options_chain = self.get_historical_options_chain(ticker, current_date)
+            chains = self.session_data.get('chains', {})
+            if ticker in chains:
+                options_chain = chains[ticker]
+            else:
+                options_chain = self.get_historical_options_chain(ticker, current_date)
             if not options_chain:
                 return None
         except Exception as e:
             print(f"Could not get options chain for {ticker}: {e}")
             return None
         
+        # Calendars and diagonals also need the following expiration
+        back_chain = None
+        if self.strategy in BACK_MONTH_STRATEGIES:
+            back_chains = self.session_data.get('back_chains', {})
+            if ticker in back_chains:
+                back_chain = back_chains[ticker]
+            else:
+                back_chain = self.get_back_month_chain(ticker, current_date, self.chain_expiration(options_chain))
+            if not back_chain:
+                return None
+        
         # Find suitable options based on strategy
         position = self.construct_position(
             ticker, 
             current_date, 
             underlying_price, 
-            options_chain
+            options_chain,
+            back_chain
         )
         
         return position
     
+    def preload_underlying_prices(self):
+        """Fetch each ticker's daily bars for the full backtest window with one range request"""
+        start = self.start_date.strftime('%Y-%m-%d')
+        end = self.end_date.strftime('%Y-%m-%d')
+        
+        # Tickers in the shared cube need no request at all
+        tickers = self.tickers
+        if self.cube is not None and self.cube.covers(start, end):
+            for ticker in tickers:
+                if ticker in self.cube:
+                    self.price_series[ticker] = self.cube.price_series(ticker)
+            tickers = [t for t in tickers if t not in self.price_series]
+        
+        # The rest are requested concurrently over the shared connection pool
+        fetched = self.fetcher.fetch_daily_bars([(t, start, end) for t in tickers], adjusted=False)
+        for ticker, rows in fetched.items():
+            self.price_series[ticker] = PriceSeries.from_rows(rows)
+        for ticker, error in self.fetcher.errors.items():
+            print(f"Could not preload prices for {ticker}: {error}")
+    
     def get_underlying_price(self, ticker: str, date: datetime) -> Optional[float]:
         """Get underlying stock price on a specific date"""
+        # Answer from the preloaded window when possible
+        series = self.price_series.get(ticker)
+        if series is not None and self.start_date.date() <= date.date() <= self.end_date.date():
+            return series.price_on(date)
+        
         try:
             # Use daily aggregates - get the close price
             date_str = date.strftime('%Y-%m-%d')
@@ -261,23 +362,50 @@ class OptionsBacktestEngine:
         except Exception as e:
             return None
     
-    def get_historical_options_chain(self, ticker: str, date: datetime) -> Optional[Dict]:
+    def front_expiration(self, date: datetime) -> Optional[str]:
+        """First standard monthly expiration in the DTE range"""
+        exps = get_calendar().monthly_expirations(date.date() + timedelta(days=self.min_dte),
+                                                  date.date() + timedelta(days=self.max_dte))
+        return str(exps[0]) if len(exps) else None
+    
+    @staticmethod
+    def back_expiration(front: str) -> Optional[str]:
+        """The standard monthly expiration after front"""
+        first = datetime.fromisoformat(front).date() + timedelta(days=1)
+        exps = get_calendar().monthly_expirations(first, first + timedelta(days=45))
+        return str(exps[0]) if len(exps) else None
+    
+    @staticmethod
+    def chain_expiration(options_chain) -> Optional[str]:
+        if isinstance(options_chain, OptionsChain):
+            return options_chain.expiration
+        return options_chain.get('expiration')
+    
+    def get_back_month_chain(self, ticker: str, date: datetime, front: Optional[str]) -> Optional[Dict]:
+        """Chain of the monthly expiration after front (the long leg of calendars and diagonals)"""
+        back = self.back_expiration(front) if front else None
+        if back is None:
+            return None
+        return self.get_historical_options_chain(ticker, date, back)
+    
+    def get_historical_options_chain(self, ticker: str, date: datetime,
+                                     expiration: Optional[str] = None) -> Optional[Dict]:
         """
         Get historical options chain for a specific date
         
-        This uses the snapshot options chain endpoint with as_of parameter
+        The chain is for `expiration`, by default the front month in the DTE
+        range; every chain returned carries its expiration.
         """
         try:
-            # Find expirations in our DTE range
-            target_expirations = []
-            min_exp_date = date + timedelta(days=self.min_dte)
-            max_exp_date = date + timedelta(days=self.max_dte)
+            expiration = expiration or self.front_expiration(date)
+            if expiration is None:
+                return None
             
-            # Get available expirations
+            # Get available contracts
             # NOTE: In production, you'd use list_options_contracts with as_of parameter
             # For now, we'll use a simplified approach
             
-            options_data = {'calls': [], 'puts': []}
+            options_data = {'calls': [], 'puts': [], 'expiration': expiration}
             
             # Query options snapshot
             # The Massive API supports historical snapshots using the snapshot endpoint
@@ -331,64 +459,68 @@ class OptionsBacktestEngine:
             return False
     
     def construct_position(self, ticker: str, date: datetime, 
-                          underlying_price: float, options_chain: Dict) -> Optional[OptionsPosition]:
+                          underlying_price: float, options_chain,
+                          back_chain=None) -> Optional[OptionsPosition]:
         """
         Construct an options position based on the selected strategy
         
-        This is where strategy-specific logic goes
+        Legs come from the strategy's builder in strategy_builders; back_chain
+        is the later expiration calendars and diagonals buy.
         """
         strategy = self.strategy
+        if strategy not in STRATEGY_BUILDERS:
+            print(f"Strategy {strategy} not yet implemented")
+            return None
         
-        # Parse parameters
         try:
             # Common parameters
             min_oi = int(self.params.get("Min Open Interest", "100"))
             min_vol = int(self.params.get("Min Volume", "50"))
             
-            # Strategy-specific construction
-            if strategy == "Iron Condor":
-                return self.construct_iron_condor(
-                    ticker, date, underlying_price, options_chain,
-                    min_oi, min_vol
-                )
-            elif strategy == "Long Call":
-                return self.construct_long_call(
-                    ticker, date, underlying_price, options_chain,
-                    min_oi, min_vol
-                )
-            # Add other strategies...
+            chain = self.as_chain(options_chain, underlying_price)
+            back = self.as_chain(back_chain, underlying_price) if back_chain else None
+            if back is not None:
+                back = back.filter_liquidity(min_oi, min_vol)
             
-            else:
-                print(f"Strategy {strategy} not yet implemented")
+            record = build_position(strategy, chain.filter_liquidity(min_oi, min_vol), self.build_params, back)
+            if record is None or record.expiration is None:
                 return None
+            
+            return OptionsPosition(
+                symbol=ticker,
+                strategy=strategy,
+                entry_date=date,
+                expiration_date=datetime.fromisoformat(record.expiration).replace(tzinfo=ET),
+                legs=record.leg_dicts(),
+                entry_cost=record.cost,
+                max_profit=record.max_profit,
+                max_loss=record.max_loss,
+                underlying_entry_price=underlying_price
+            )
                 
         except Exception as e:
             print(f"Error constructing position: {e}")
             return None
     
-    def construct_iron_condor(self, ticker: str, date: datetime, 
-                             underlying_price: float, options_chain: Dict,
-                             min_oi: int, min_vol: int) -> Optional[OptionsPosition]:
-        """Construct an iron condor position"""
-        # This would implement the iron condor logic similar to your screener
-        # but using historical data
-        
-        # For now, return None as placeholder
-        return None
+    @staticmethod
+    def as_chain(options_chain, underlying_price: float) -> OptionsChain:
+        """An OptionsChain from a chain dict ({'calls', 'puts', 'expiration'}) or an OptionsChain"""
+        chain = options_chain
+        if not isinstance(chain, OptionsChain):
+            chain = OptionsChain.from_records(options_chain.get('calls', []) + options_chain.get('puts', []),
+                                              underlying_price, options_chain.get('expiration'))
+        chain.underlying_price = chain.underlying_price or underlying_price
+        return chain
     
-    def construct_long_call(self, ticker: str, date: datetime,
-                           underlying_price: float, options_chain: Dict,
-                           min_oi: int, min_vol: int) -> Optional[OptionsPosition]:
-        """Construct a long call position"""
-        # Find suitable call option based on delta criteria
-        # For now, placeholder
-        return None
-    
-    def get_position_value(self, position: OptionsPosition, date: datetime) -> float:
-        """Get current value of a position"""
-        # In production, you'd fetch current option prices and calculate position value
-        # For now, simplified
-        return position.entry_cost
+    def get_position_values(self, ids: np.ndarray, date: datetime) -> np.ndarray:
+        """Current value of many positions at once"""
+        # Legs priced from the session's marks; a position with an unpriced
+        # leg keeps its last mark
+        book = self.book
+        marks = self.session_marks(date)
+        leg_prices = np.array([marks.get(c, np.nan) for c in book.contract[:book.n_legs]], dtype=np.float64)
+        values = book.position_values(leg_prices)[ids]
+        return np.where(np.isnan(values), book.entry_cost[ids] + book.pnl[ids], values)
     
     def close_position(self, position: OptionsPosition, date: datetime, reason: str):
         """Close an open position"""
@@ -399,43 +531,23 @@ class OptionsBacktestEngine:
         try:
             # Get underlying exit price
             position.underlying_exit_price = self.get_underlying_price(position.symbol, date)
-            
-            # Calculate final P&L
-            exit_value = self.get_position_value(position, date)
-            position.current_pnl = exit_value - position.entry_cost
-            
         except Exception as e:
             print(f"Error closing position: {e}")
         
-        # Move to closed positions
-        self.open_positions.remove(position)
-        self.closed_positions.append(position)
-        self.all_trades.append(self.position_to_trade_dict(position))
+        # Exit at the position's last mark
+        position.current_pnl = float(self.book.pnl[position.book_id])
+        self.book.close(position.book_id, np.datetime64(date.date(), 'D'))
+        self.all_trades.append(position)
+        # Stats see the same cent-rounded figures as the trade rows
+        pnl_pct = round((position.current_pnl / abs(position.entry_cost)) * 100, 2) if position.entry_cost != 0 else 0
+        self.trade_stats.add(round(position.current_pnl, 2), pnl_pct, position.exit_date.strftime('%Y-%m-%d'),
+                             position.current_pnl > 0)
     
     def close_all_positions(self, date: datetime):
         """Close all remaining open positions"""
-        for position in list(self.open_positions):
+        for position in self.book.open_positions():
             self.close_position(position, date, "Backtest End")
     
-    def position_to_trade_dict(self, position: OptionsPosition) -> Dict:
-        """Convert position to trade dictionary for results"""
-        return {
-            'Symbol': position.symbol,
-            'Strategy': position.strategy,
-            'Entry Date': position.entry_date.strftime('%Y-%m-%d'),
-            'Exit Date': position.exit_date.strftime('%Y-%m-%d') if position.exit_date else None,
-            'Days Held': position.days_held,
-            'Entry Cost': round(position.entry_cost, 2),
-            'Max Profit': round(position.max_profit, 2),
-            'Max Loss': round(position.max_loss, 2),
-            'PnL': round(position.current_pnl, 2),
-            'PnL %': round((position.current_pnl / abs(position.entry_cost)) * 100, 2) if position.entry_cost != 0 else 0,
-            'Exit Reason': position.exit_reason,
-            'Win': position.current_pnl > 0,
-            'Underlying Entry': round(position.underlying_entry_price, 2),
-            'Underlying Exit': round(position.underlying_exit_price, 2) if position.underlying_exit_price else None,
-        }
-    
     def calculate_results(self) -> Dict:
         """Calculate backtest statistics"""
         if not self.all_trades:
@@ -447,89 +559,40 @@ class OptionsBacktestEngine:
                 'config': self.config
             }
         
-        df = pd.DataFrame(self.all_trades)
-        
-        # Calculate statistics
-        total_trades = len(df)
-        winning_trades = len(df[df['Win']])
-        losing_trades = total_trades - winning_trades
-        win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
-        
-        total_pnl = df['PnL'].sum()
-        avg_pnl = df['PnL'].mean()
-        avg_win = df[df['Win']]['PnL'].mean() if winning_trades > 0 else 0
-        avg_loss = df[~df['Win']]['PnL'].mean() if losing_trades > 0 else 0
-        
-        # Build equity curve
-        df_sorted = df.sort_values('Exit Date')
-        df_sorted['Cumulative PnL'] = df_sorted['PnL'].cumsum()
-        
-        equity_curve = []
-        for _, row in df_sorted.iterrows():
-            equity_curve.append({
-                'date': row['Exit Date'],
-                'cumulative_pnl': row['Cumulative PnL'],
-                'trade_pnl': row['PnL']
-            })
-        
-        stats = {
-            'total_trades': total_trades,
-            'winning_trades': winning_trades,
-            'losing_trades': losing_trades,
-            'win_rate': round(win_rate, 2),
-            'total_pnl': round(total_pnl, 2),
-            'avg_pnl': round(avg_pnl, 2),
-            'avg_win': round(avg_win, 2),
-            'avg_loss': round(avg_loss, 2),
-            'profit_factor': round(abs(avg_win / avg_loss), 2) if avg_loss != 0 else 0,
-            'max_drawdown': self.calculate_max_drawdown(df_sorted),
-            'sharpe_ratio': self.calculate_sharpe_ratio(df_sorted),
-        }
-        
+        nav = self.portfolio_nav()
+        symbol_index = self.all_trades.symbol_index()
+        stats = self.trade_stats.stats()
+        # Drawdown and Sharpe from the daily NAV rather than the exit-date samples
+        stats.update(nav_stats(nav['nav']))
         return {
             'trades': self.all_trades,
             'stats': stats,
-            'equity_curve': equity_curve,
+            'equity_curve': self.trade_stats.equity_curve,
+            'nav': nav,
             'strategy': self.strategy,
             'config': self.config,
-            'by_symbol': self.group_by_symbol(df)
+            'by_symbol': symbol_index.by_symbol(self.all_trades),
+            'symbol_index': symbol_index
         }
     
-    def calculate_max_drawdown(self, df: pd.DataFrame) -> float:
-        """Calculate maximum drawdown"""
-        if 'Cumulative PnL' not in df.columns or len(df) == 0:
-            return 0.0
-        
-        cumulative = df['Cumulative PnL'].values
-        running_max = np.maximum.accumulate(cumulative)
-        drawdown = cumulative - running_max
-        max_dd = drawdown.min()
-        
-        return round(max_dd, 2)
-    
-    def calculate_sharpe_ratio(self, df: pd.DataFrame) -> float:
-        """Calculate Sharpe ratio"""
-        if len(df) < 2:
-            return 0.0
-        
-        returns = df['PnL %'].values
-        avg_return = np.mean(returns)
-        std_return = np.std(returns)
-        
-        if std_return == 0:
-            return 0.0
-        
-        # Annualized Sharpe (assuming ~252 trading days)
-        sharpe = (avg_return / std_return) * np.sqrt(252 / len(df))
-        
-        return round(sharpe, 2)
+    def save_results(self, results: Dict):
+        """Write the run to config['results_dir'] (default under the cache dir; empty to skip)"""
+        results_dir = self.config.get('results_dir', DEFAULT_RESULTS_DIR)
+        if not results_dir or not results['trades']:
+            return
+        try:
+            results['results_path'] = save_results(results, new_results_path(results_dir, self.strategy))
+            self.log(f"Saved results to {results['results_path']}")
+        except (OSError, TypeError) as e:
+            self.log(f"Could not save results: {e}")
     
-    def group_by_symbol(self, df: pd.DataFrame) -> Dict:
-        """Group trades by symbol"""
-        by_symbol = {}
-        
-        for symbol in df['Symbol'].unique():
-            symbol_trades = df[df['Symbol'] == symbol]
-            by_symbol[symbol] = symbol_trades.to_dict('records')
-        
-        return by_symbol
+    def portfolio_nav(self) -> Dict:
+        """Daily NAV over the backtest sessions: capital + realized P&L + the marks recorded each session"""
+        sessions = get_calendar().sessions_between(self.start_date, self.end_date)
+        trades = self.all_trades.data
+        exit_rows = np.minimum(np.searchsorted(sessions, trades['exit_day'].astype('datetime64[D]')),
+                               len(sessions) - 1)
+        mark_rows = np.concatenate(self.mark_rows) if self.mark_rows else np.zeros(0, dtype=np.int64)
+        mark_pnl = np.concatenate(self.mark_pnl) if self.mark_pnl else np.zeros(0)
+        nav = nav_series(len(sessions), self.starting_capital, exit_rows, trades['pnl'], mark_rows, mark_pnl)
+        return {'dates': sessions, 'nav': nav, 'starting_capital': self.starting_capital}
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Concurrent batch fetcher
+Runs many (contract, date-range) bar requests over the shared async client's
+connection pool with bounded concurrency; the client enforces the
+requests-per-second budget
+"""
+
+import asyncio
+from typing import List, Dict, Tuple
+
+from price_series import aggs_to_rows
+
+class BatchFetcher:
+    """Fetch daily bars for many tickers or contracts at once"""
+
+    def __init__(self, client, max_concurrency: int = 64):
+        self.client = client
+        self.max_concurrency = max(1, max_concurrency)
+        self.errors = {}
+
+    def fetch_daily_bars(self, requests: List[Tuple[str, str, str]],
+                         adjusted: bool = True) -> Dict[str, List[Tuple]]:
+        """
+        Fetch (ticker, start, end) requests
+
+        Returns ticker -> (date, open, high, low, close, volume) rows. Failed
+        requests are left out of the result and recorded in self.errors.
+        """
+        if not requests:
+            return {}
+
+        rows = self.client.run(self._fetch_all(requests, adjusted))
+        results = {}
+        for (ticker, _, _), result in zip(requests, rows):
+            if isinstance(result, Exception):
+                self.errors[ticker] = str(result)
+            else:
+                results[ticker] = result
+        return results
+
+    async def _fetch_all(self, requests: List[Tuple[str, str, str]], adjusted: bool) -> list:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch_one(ticker: str, start: str, end: str) -> List[Tuple]:
+            async with semaphore:
+                aggs = await self.client.aio.get_aggs(
+                    ticker=ticker,
+                    multiplier=1,
+                    timespan='day',
+                    from_=start,
+                    to=end,
+                    adjusted=adjusted,
+                    limit=50000
+                )
+            return aggs_to_rows(aggs)
+
+        return await asyncio.gather(*(fetch_one(*r) for r in requests), return_exceptions=True)
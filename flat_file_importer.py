@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Flat-File Importer
+Streams Polygon/Massive day-aggregate flat files (gzip CSV) for stocks and
+options into the market data store, so historical backtests run offline
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from market_data_store import MarketDataStore, DEFAULT_CACHE_DIR
+from trading_calendar import get_calendar
+
+KINDS = ('stocks', 'options')
+
+# Flat-file layout: <root>/<YYYY>/<MM>/<YYYY-MM-DD>.csv.gz
+COLUMNS = ['ticker', 'volume', 'open', 'close', 'high', 'low', 'window_start']
+CHUNK_ROWS = 250_000
+
+# OCC roots that trade under a different underlying symbol (PM-settled weeklies etc.)
+ROOT_ALIASES = {'SPXW': 'SPX', 'NDXP': 'NDX', 'RUTW': 'RUT', 'VIXW': 'VIX', 'XSPW': 'XSP'}
+
+def underlying_for_root(root: str) -> str:
+    """Underlying of an OCC root; adjusted roots (SPY1, AAPL2) map back to the plain symbol"""
+    root = ROOT_ALIASES.get(root, root)
+    stripped = root.rstrip('0123456789')
+    return stripped or root
+
+def parse_occ_tickers(tickers: pd.Series) -> pd.DataFrame:
+    """Split OCC option tickers (O:SPY240119C00450000) into their parts, vectorized over a column"""
+    body = tickers.str.slice(2)
+    ymd = body.str.slice(-15, -9)
+    roots = body.str.slice(0, -15)
+    return pd.DataFrame({
+        'underlying': roots.map(underlying_for_root),
+        'expiration': '20' + ymd.str.slice(0, 2) + '-' + ymd.str.slice(2, 4) + '-' + ymd.str.slice(4, 6),
+        'type': np.where(body.str.slice(-9, -8) == 'C', 'call', 'put'),
+        'strike': body.str.slice(-8).astype(np.int64) / 1000.0,
+    }, index=tickers.index)
+
+def flat_file_path(root: str, day: datetime) -> str:
+    return os.path.join(root, day.strftime('%Y'), day.strftime('%m'), f"{day.strftime('%Y-%m-%d')}.csv.gz")
+
+def iter_flat_files(root: str, start: datetime, end: datetime) -> Iterable[Tuple[str, str]]:
+    """(date, path) for every file present in start..end; weekends and holidays simply have none"""
+    day = start
+    while day <= end:
+        path = flat_file_path(root, day)
+        if os.path.exists(path):
+            yield day.strftime('%Y-%m-%d'), path
+        day += timedelta(days=1)
+
+def covered_spans(start: datetime, end: datetime, imported: Iterable[str]) -> List[Tuple[str, str]]:
+    """
+    Date spans within start..end whose every session was imported
+
+    A session without a file splits the window; each span stretches over the
+    non-session days up to the missing sessions (or the window's ends).
+    """
+    sessions = get_calendar().sessions_between(start, end)
+    present = np.isin(sessions, np.array(sorted(imported), dtype='datetime64[D]'))
+    first, last = np.datetime64(start.date(), 'D'), np.datetime64(end.date(), 'D')
+    spans = []
+    lo = first
+    for session, ok in zip(sessions, present):
+        if not ok:
+            if lo < session:
+                spans.append((str(lo), str(session - 1)))
+            lo = session + 1
+    if lo <= last:
+        spans.append((str(lo), str(last)))
+    return spans
+
+def read_day_aggs(path: str, chunk_rows: int = CHUNK_ROWS) -> Iterable[pd.DataFrame]:
+    """Stream one day file in chunks, with window_start converted to an ET date string"""
+    for chunk in pd.read_csv(path, usecols=COLUMNS, chunksize=chunk_rows,
+                             dtype={'ticker': str, 'window_start': np.int64}):
+        stamps = pd.to_datetime(chunk['window_start'], unit='ns', utc=True)
+        chunk['date'] = stamps.dt.tz_convert('America/New_York').dt.strftime('%Y-%m-%d')
+        yield chunk
+
+class FlatFileImporter:
+    """Import day-aggregate files into a MarketDataStore with bounded memory"""
+
+    def __init__(self, store: MarketDataStore, tickers: Optional[Iterable[str]] = None,
+                 chunk_rows: int = CHUNK_ROWS, log=print):
+        self.store = store
+        self.tickers = set(tickers) if tickers else None
+        self.chunk_rows = chunk_rows
+        self.log = log
+        self.rows_imported = 0
+        self.contracts_seen = 0
+        self._roots = set()
+
+    def import_range(self, kind: str, root: str, start: datetime, end: datetime) -> int:
+        """
+        Import every file of `kind` between start and end
+
+        Coverage is recorded only after the last file lands, and only for the
+        stretches whose every session had a file, so neither an interrupted
+        import nor a missing day file claims coverage it doesn't have.
+        Returns rows imported.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown flat-file kind {kind!r}, expected one of {KINDS}")
+        before = self.rows_imported
+        imported = []
+        for date, path in iter_flat_files(root, start, end):
+            for chunk in read_day_aggs(path, self.chunk_rows):
+                if kind == 'options':
+                    self._import_options_chunk(chunk)
+                else:
+                    self._import_stocks_chunk(chunk)
+            imported.append(date)
+            self.log(f"  {kind} {date}: {self.rows_imported - before:,} rows so far")
+
+        if imported:
+            spans = covered_spans(start, end, imported)
+            if spans != [(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))]:
+                self.log(f"  {kind}: sessions without a file; recording only {spans}")
+            # A ticker-filtered import only covers its own symbols (and the
+            # OCC roots seen for them, which is how option bars are owned)
+            scopes = [kind] if self.tickers is None else \
+                [f"{kind}:{s}" for s in sorted(self.tickers | self._roots)]
+            for scope in scopes:
+                for span_start, span_end in spans:
+                    self.store.put_flat_file_span(scope, span_start, span_end)
+        return self.rows_imported - before
+
+    def _import_stocks_chunk(self, chunk: pd.DataFrame):
+        if self.tickers is not None:
+            chunk = chunk[chunk['ticker'].isin(self.tickers)]
+        self._put_bars(chunk)
+
+    def _import_options_chunk(self, chunk: pd.DataFrame):
+        chunk = chunk[chunk['ticker'].str.startswith('O:')]
+        parsed = parse_occ_tickers(chunk['ticker'])
+        if self.tickers is not None:
+            keep = parsed['underlying'].isin(self.tickers)
+            chunk, parsed = chunk[keep], parsed[keep]
+        if chunk.empty:
+            return
+
+        self._put_bars(chunk)
+        self._roots.update(chunk['ticker'].str.slice(2, -15).unique())
+        contracts = list(zip(chunk['ticker'], parsed['underlying'], parsed['expiration'],
+                             parsed['strike'], parsed['type'], chunk['date']))
+        self.store.put_imported_contracts(contracts)
+        self.contracts_seen += len(contracts)
+
+    def _put_bars(self, chunk: pd.DataFrame):
+        if chunk.empty:
+            return
+        rows = list(zip(chunk['ticker'], chunk['date'], chunk['open'].astype(float),
+                        chunk['high'].astype(float), chunk['low'].astype(float),
+                        chunk['close'].astype(float), chunk['volume'].astype(float)))
+        self.store.put_daily_rows(rows)
+        self.rows_imported += len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Import day-aggregate flat files into the market data store")
+    parser.add_argument('--kind', choices=KINDS, required=True)
+    parser.add_argument('--root', required=True, help="directory holding YYYY/MM/YYYY-MM-DD.csv.gz files")
+    parser.add_argument('--start', required=True, help="first date (YYYY-MM-DD)")
+    parser.add_argument('--end', required=True, help="last date (YYYY-MM-DD)")
+    parser.add_argument('--tickers', nargs='*', help="only these stocks / option underlyings")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    store = MarketDataStore(args.cache_dir)
+    importer = FlatFileImporter(store, args.tickers)
+    rows = importer.import_range(args.kind, args.root,
+                                 datetime.strptime(args.start, '%Y-%m-%d'),
+                                 datetime.strptime(args.end, '%Y-%m-%d'))
+    print(f"Imported {rows:,} {args.kind} rows into {args.cache_dir}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Intraday Backtest Mode
+Streams minute bars one session at a time through a generator pipeline,
+entering under per-day and spacing limits and marking positions bar by bar
+"""
+
+from datetime import datetime, time, timedelta
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple, Callable
+import numpy as np
+
+from backtest_engine import OptionsBacktestEngine, ET
+from market_data_store import MarketDataStore
+from position_book import exit_masks
+from trading_calendar import get_calendar
+
+MARKET_OPEN = time(9, 30)
+
+class MinuteBars:
+    """One ticker's regular-hours minute bars for one session"""
+
+    __slots__ = ('ticker', 'session', 'minute', 'close')
+
+    def __init__(self, ticker: str, session: np.datetime64, minute: np.ndarray, close: np.ndarray):
+        self.ticker = ticker
+        self.session = session
+        self.minute = minute    # minutes after the open
+        self.close = close
+
+    def __len__(self) -> int:
+        return len(self.minute)
+
+    @classmethod
+    def from_aggs(cls, ticker: str, session: np.datetime64, aggs, close_minute: int) -> 'MinuteBars':
+        """Keep bars from the open to the session's (possibly early) close"""
+        stamps = np.array([a.timestamp for a in aggs if a.timestamp and a.close], dtype=np.int64)
+        close = np.array([a.close for a in aggs if a.timestamp and a.close], dtype=np.float64)
+        local = np.array([datetime.fromtimestamp(s / 1000, tz=ET) for s in stamps], dtype=object)
+        minute = np.array([(t.hour * 60 + t.minute) - (MARKET_OPEN.hour * 60 + MARKET_OPEN.minute)
+                           for t in local], dtype=np.int64)
+        keep = (minute >= 0) & (minute < close_minute)
+        return cls(ticker, session, minute[keep], close[keep])
+
+def session_minute_bars(client, tickers: List[str], sessions: Iterable[np.datetime64]
+                        ) -> Iterator[Tuple[np.datetime64, Dict[str, MinuteBars]]]:
+    """
+    Yield (session, ticker -> MinuteBars), fetching one session at a time
+
+    Every ticker's session is requested concurrently over the shared client.
+    Nothing beyond the current session is held, so memory stays at one
+    session per ticker however long the backtest runs.
+    """
+    calendar = get_calendar()
+    for session in sessions:
+        day = str(session)
+        close = calendar.close_time(session)
+        close_minute = (close.hour * 60 + close.minute) - (MARKET_OPEN.hour * 60 + MARKET_OPEN.minute)
+        results = client.gather([
+            client.aio.get_aggs(ticker=t, multiplier=1, timespan='minute', from_=day, to=day,
+                                adjusted=False, limit=50000)
+            for t in tickers
+        ])
+        bars = {}
+        for ticker, aggs in zip(tickers, results):
+            if isinstance(aggs, Exception) or not aggs:
+                continue
+            bars[ticker] = MinuteBars.from_aggs(ticker, session, aggs, close_minute)
+        yield session, bars
+
+def iter_bars(bars: Dict[str, MinuteBars]) -> Iterator[Tuple[int, str, float]]:
+    """One session's bars of every ticker as (minute, ticker, close), in time order"""
+    if not bars:
+        return
+    tickers = list(bars)
+    minute = np.concatenate([bars[t].minute for t in tickers])
+    close = np.concatenate([bars[t].close for t in tickers])
+    owner = np.repeat(np.arange(len(tickers)), [len(bars[t]) for t in tickers])
+    # Stable, so simultaneous bars keep the ticker order
+    order = np.argsort(minute, kind='stable')
+    for i in order:
+        yield int(minute[i]), tickers[owner[i]], float(close[i])
+
+class EntryLimiter:
+    """Max entries per ticker per session and minimum minutes between a ticker's entries"""
+
+    def __init__(self, max_per_day: int, min_minutes: int):
+        self.max_per_day = max_per_day
+        self.min_minutes = min_minutes
+        self.count = {}
+        self.last = {}
+
+    def new_session(self):
+        self.count.clear()
+        self.last.clear()
+
+    def allows(self, ticker: str, minute: int) -> bool:
+        if self.count.get(ticker, 0) >= self.max_per_day:
+            return False
+        last = self.last.get(ticker)
+        return last is None or minute - last >= self.min_minutes
+
+    def record(self, ticker: str, minute: int):
+        self.count[ticker] = self.count.get(ticker, 0) + 1
+        self.last[ticker] = minute
+
+class IntradayBacktestEngine(OptionsBacktestEngine):
+    """
+    OptionsBacktestEngine driven by minute bars
+
+    Chains still come from daily option bars; the underlying price, the
+    entry timing and every exit check use the current minute bar. Positions
+    are marked with the engine's simplified P&L on each bar of their ticker.
+    """
+
+    def __init__(self, api_key: str, tickers: List[str], config: Dict,
+                 progress_callback: Optional[Callable] = None,
+                 data_store: Optional[MarketDataStore] = None):
+        super().__init__(api_key, tickers, config, progress_callback, data_store)
+        self.limiter = EntryLimiter(int(config.get('trades_per_day', 1)),
+                                    int(config.get('min_minutes_between_trades', 0)))
+        self.bar_session = None
+        self.bar_price = {}
+
+    def run_backtest(self) -> Dict:
+        self.log(f"Starting: {self.strategy} intraday backtest")
+        self.log(f"Period: {self.start_date.date()} to {self.end_date.date()}")
+        self.prepare_data()
+
+        sessions = get_calendar().sessions_between(self.start_date, self.end_date)
+        for idx, (session, bars) in enumerate(session_minute_bars(self.client, self.tickers, sessions)):
+            if idx % 5 == 0:
+                self.log(f"{session} ({idx+1}/{len(sessions)}) - Pos:{self.book.open_count}, Trades:{len(self.all_trades)}")
+            self.run_session(session, bars)
+
+        self.close_all_positions(self.end_date)
+        self.client.flush()
+        results = self.calculate_results()
+        self.save_results(results)
+        self.log(f"✓ Complete! {len(self.all_trades)} trades")
+        return results
+
+    def run_session(self, session: np.datetime64, bars: Dict[str, MinuteBars]):
+        opened = datetime.combine(session.astype(object), MARKET_OPEN, tzinfo=ET)
+        self.limiter.new_session()
+        self.bar_session = session.astype(object)
+        self.bar_price.clear()
+        for minute, ticker, price in iter_bars(bars):
+            self.bar_price[ticker] = price
+            now = opened + timedelta(minutes=minute)
+            self.mark_ticker(ticker, price, now)
+            if (self.book.open_count < self.max_positions and not self.book.has_open(ticker)
+                    and self.limiter.allows(ticker, minute)):
+                pos = self.find_entry(ticker, now)
+                if pos:
+                    self.book.add(pos)
+                    self.limiter.record(ticker, minute)
+                    self.log(f"Opened {pos.strategy} on {pos.symbol} at {now:%H:%M}")
+
+        # Whatever expires today is settled at the close
+        close = datetime.combine(session.astype(object), get_calendar().close_time(session), tzinfo=ET)
+        ids = self.book.open_ids()
+        for pid in ids[self.book.expiration[ids] <= session]:
+            pos = self.book.positions[pid]
+            pos.current_pnl = float(self.book.pnl[pid])
+            self.close_position(pos, close, "Expiration")
+
+    def mark_ticker(self, ticker: str, price: float, now: datetime):
+        """Mark the ticker's open positions on one bar and close any that hit an exit rule"""
+        book = self.book
+        ids = book.open_ids()
+        ids = ids[book.symbol[ids] == ticker]
+        if len(ids) == 0:
+            return
+        # Simplified P&L, as in the daily engine: inside the short strikes or not
+        calls = np.array([book.short_strike(i, 'call') for i in ids], dtype=np.float64)
+        puts = np.array([book.short_strike(i, 'put') for i in ids], dtype=np.float64)
+        inside = (price >= puts) & (price <= calls)
+        book.mark(ids, np.where(inside, book.max_profit[ids] * 0.8, -book.max_loss[ids] * 0.5))
+
+        checks = exit_masks(book.pnl[ids], book.high_water[ids], book.max_profit[ids], book.max_loss[ids],
+                            self.risk_config)
+        for reason, hit in checks.items():
+            for pid in ids[hit]:
+                pos = book.positions[pid]
+                pos.current_pnl = float(book.pnl[pid])
+                self.close_position(pos, now, reason)
+
+    def get_underlying_price(self, ticker: str, date: datetime) -> Optional[float]:
+        # During a session the underlying is the latest minute bar
+        price = self.bar_price.get(ticker)
+        if price is not None and date.date() == self.bar_session:
+            return price
+        return super().get_underlying_price(ticker, date)
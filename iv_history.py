@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Implied Volatility History
+Daily at-the-money implied vol per underlying with rolling IV rank and IV
+percentile, built once into the market data store for O(1) entry-check lookups
+"""
+
+import argparse
+import os
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+
+from market_data_store import MarketDataStore, DEFAULT_CACHE_DIR
+from options_index import build_index
+from price_series import PriceSeries
+from pricing import implied_vol, DAYS_PER_YEAR
+from trading_calendar import get_calendar
+
+IV_WINDOW = 252          # sessions in the rank / percentile lookback
+MIN_PERIODS = 63         # observations needed before a rank is reported
+TARGET_DTE = 30          # ATM vol is read from the expiration nearest this
+MIN_DTE = 7
+MAX_DTE = 60
+
+class RollingRank:
+    """
+    IV rank and IV percentile over the last `window` observations
+
+    Updated one value at a time: the window min and max come from monotonic
+    deques (amortized O(1)) and the percentile from a sorted copy of the
+    window (binary search).
+    """
+
+    def __init__(self, window: int = IV_WINDOW, min_periods: int = MIN_PERIODS):
+        self.window = window
+        self.min_periods = min_periods
+        self.count = 0
+        self._values = deque()
+        self._sorted = []
+        self._max = deque()   # (index, value), values decreasing
+        self._min = deque()   # (index, value), values increasing
+
+    def push(self, value: float) -> Tuple[float, float]:
+        """Add the next observation and return its (rank, percentile), both 0-100 (NaN while warming up)"""
+        i = self.count
+        self.count += 1
+
+        self._values.append(value)
+        insort(self._sorted, value)
+        if len(self._values) > self.window:
+            old = self._values.popleft()
+            del self._sorted[bisect_left(self._sorted, old)]
+
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((i, value))
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((i, value))
+        while self._max[0][0] <= i - self.window:
+            self._max.popleft()
+        while self._min[0][0] <= i - self.window:
+            self._min.popleft()
+
+        n = len(self._values)
+        if n < max(self.min_periods, 2):
+            return np.nan, np.nan
+        lo, hi = self._min[0][1], self._max[0][1]
+        rank = 100.0 * (value - lo) / (hi - lo) if hi > lo else 50.0
+        # Share of the other days in the window with a lower IV
+        percentile = 100.0 * bisect_left(self._sorted, value) / (n - 1)
+        return rank, percentile
+
+def rolling_rank(values: np.ndarray, window: int = IV_WINDOW,
+                 min_periods: int = MIN_PERIODS) -> Tuple[np.ndarray, np.ndarray]:
+    """Rank and percentile for a whole series; NaN values are skipped and get NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    rank = np.full(len(values), np.nan)
+    percentile = np.full(len(values), np.nan)
+    roller = RollingRank(window, min_periods)
+    for i in np.flatnonzero(np.isfinite(values)):
+        rank[i], percentile[i] = roller.push(float(values[i]))
+    return rank, percentile
+
+class IVHistory:
+    """One underlying's IV series, indexed by session for O(1) lookups"""
+
+    def __init__(self, symbol: str, rows: List[Tuple]):
+        self.symbol = symbol
+        self.dates = np.array([r[0] for r in rows], dtype='datetime64[D]')
+        self.atm_iv = np.array([np.nan if r[1] is None else r[1] for r in rows], dtype=np.float64)
+        self.rank = np.array([np.nan if r[2] is None else r[2] for r in rows], dtype=np.float64)
+        self.percentile = np.array([np.nan if r[3] is None else r[3] for r in rows], dtype=np.float64)
+        self._row = {str(d): i for i, d in enumerate(self.dates)}
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def _lookup(self, values: np.ndarray, date) -> Optional[float]:
+        if isinstance(date, datetime):
+            date = date.date()
+        i = self._row.get(str(date)[:10])
+        if i is None or not np.isfinite(values[i]):
+            return None
+        return float(values[i])
+
+    def iv_on(self, date) -> Optional[float]:
+        return self._lookup(self.atm_iv, date)
+
+    def rank_on(self, date) -> Optional[float]:
+        return self._lookup(self.rank, date)
+
+    def percentile_on(self, date) -> Optional[float]:
+        return self._lookup(self.percentile, date)
+
+def lookback_start(start, window: int = IV_WINDOW) -> str:
+    """Session `window` sessions before start, so the first backtest day already has a full window"""
+    calendar = get_calendar()
+    i = int(np.searchsorted(calendar.sessions, calendar.next_session(start)))
+    return str(calendar.sessions[max(i - window, 0)])
+
+def atm_iv_series(store: MarketDataStore, client, fetcher, underlying: str, first: str, last: str,
+                  rate: float = 0.04, log=print) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (sessions, ATM IV) of an underlying over first..last
+
+    Each session's IV is the mean of the call and put implied vols at the
+    strike nearest the close, on the expiration closest to TARGET_DTE days.
+    Bars the store doesn't hold are fetched in one batch, one range per
+    contract over the sessions it is needed.
+    """
+    if not store.has_range(underlying, first, last):
+        fetched = fetcher.fetch_daily_bars([(underlying, first, last)], adjusted=False)
+        if underlying in fetched:
+            store.put_range(underlying, first, last, fetched[underlying])
+    series = PriceSeries.from_rows(store.get_bars(underlying, first, last))
+    sessions = get_calendar().sessions_between(first, last)
+    spots = series.prices_on(sessions)
+
+    index = build_index(client, store, underlying,
+                        datetime.strptime(first, '%Y-%m-%d'), datetime.strptime(last, '%Y-%m-%d'),
+                        MIN_DTE, MAX_DTE)
+
+    # ATM pair per session, and the sessions each contract is needed on
+    picks = []
+    needed = {}
+    for day, spot in zip(sessions, spots):
+        if not np.isfinite(spot):
+            continue
+        exps = index.expirations_between(day, MIN_DTE, MAX_DTE)
+        if not exps:
+            continue
+        exp = min(exps, key=lambda e: abs((np.datetime64(e, 'D') - day).astype(int) - TARGET_DTE))
+        atm = index.atm_contracts(exp, spot)
+        if atm is None:
+            continue
+        strike, call, put = atm
+        day_str = str(day)
+        picks.append((day_str, spot, strike, exp, call, put))
+        for ticker in (call, put):
+            lo, hi = needed.get(ticker, (day_str, day_str))
+            needed[ticker] = (min(lo, day_str), max(hi, day_str))
+
+    missing = [(t, lo, hi) for t, (lo, hi) in needed.items() if not store.has_range(t, lo, hi)]
+    if missing:
+        log(f"IV history {underlying}: fetching {len(missing)} of {len(needed)} contracts")
+        fetched = fetcher.fetch_daily_bars(missing)
+        store.put_ranges([(t, lo, hi, fetched[t]) for t, lo, hi in missing if t in fetched])
+    closes = {t: {r[0]: r[4] for r in store.get_bars(t, lo, hi)} for t, (lo, hi) in needed.items()}
+
+    iv = np.full(len(sessions), np.nan)
+    if not picks:
+        return sessions, iv
+    row = np.searchsorted(sessions, np.array([p[0] for p in picks], dtype='datetime64[D]'))
+    spot = np.array([p[1] for p in picks])
+    strike = np.array([p[2] for p in picks])
+    years = np.array([(np.datetime64(p[3], 'D') - np.datetime64(p[0], 'D')).astype(int) for p in picks]) / DAYS_PER_YEAR
+
+    def closes_of(side: int) -> np.ndarray:
+        return np.array([closes[p[side]].get(p[0]) or np.nan for p in picks], dtype=np.float64)
+
+    call_iv = implied_vol(closes_of(4), spot, strike, years, rate, False)
+    put_iv = implied_vol(closes_of(5), spot, strike, years, rate, True)
+    with np.errstate(invalid='ignore'):
+        # One side missing (no print, or outside the arbitrage bounds) leaves the other
+        both = np.where(np.isnan(call_iv), put_iv, np.where(np.isnan(put_iv), call_iv, 0.5 * (call_iv + put_iv)))
+    iv[row] = both
+    return sessions, iv
+
+def build_iv_history(store: MarketDataStore, client, fetcher, underlying: str, start, end,
+                     rate: float = 0.04, log=print) -> IVHistory:
+    """
+    IV history of an underlying covering start..end, built into the store on first use
+
+    The series starts IV_WINDOW sessions before start, so ranks inside the
+    window are computed from a full year of history.
+    """
+    first = lookback_start(start)
+    last = str(end.date() if isinstance(end, datetime) else end)[:10]
+    if not store.has_iv_range(underlying, first, last):
+        sessions, iv = atm_iv_series(store, client, fetcher, underlying, first, last, rate, log)
+        rank, percentile = rolling_rank(iv)
+        rows = [(str(d), _or_none(v), _or_none(r), _or_none(p))
+                for d, v, r, p in zip(sessions, iv, rank, percentile)]
+        store.put_iv_history(underlying, first, last, rows)
+        log(f"IV history {underlying}: {int(np.isfinite(iv).sum())} of {len(sessions)} sessions priced")
+    return IVHistory(underlying, store.get_iv_history(underlying, first, last))
+
+def _or_none(value: float) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Build ATM IV / IV rank history into the market data store")
+    parser.add_argument('--start', required=True, help="first backtest date (YYYY-MM-DD)")
+    parser.add_argument('--end', required=True, help="last date (YYYY-MM-DD)")
+    parser.add_argument('--tickers', nargs='+', required=True)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--rate', type=float, default=0.04, help="risk-free rate")
+    args = parser.parse_args()
+
+    from async_client import get_shared_client
+    from batch_fetcher import BatchFetcher
+    client = get_shared_client(os.environ['MASSIVE_API_KEY'])
+    store = MarketDataStore(args.cache_dir)
+    for ticker in args.tickers:
+        history = build_iv_history(store, client, BatchFetcher(client), ticker, args.start, args.end, args.rate)
+        ranks = history.rank[np.isfinite(history.rank)]
+        print(f"{ticker}: {len(history)} sessions, {len(ranks)} ranked")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Persistent Market Data Store
+SQLite-backed local cache of daily bars and options contracts so repeated
+backtests and optimizer runs read from disk instead of the Massive API
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional, Iterable, Tuple
+
+from trading_calendar import get_calendar
+
+# Bump when the schema or the meaning of stored rows changes; a store written
+# by another version is dropped and rebuilt on open.
+STORE_VERSION = 6
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".options_backtest_cache")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+# Seconds a write waits for another connection's write (e.g. a parallel worker's) to finish
+DEFAULT_BUSY_TIMEOUT = 60.0
+
+# Why a lookup came back empty (negative cache reasons)
+NO_TRADE = 'no_trade'      # market closed or the symbol didn't print that day
+NOT_LISTED = 'not_listed'  # no contracts for the underlying/expiration
+API_ERROR = 'api_error'    # request failed; transient, so cached with a TTL
+
+# Rough on-disk cost of one row, used for LRU size accounting
+BAR_ROW_BYTES = 64
+CONTRACT_ROW_BYTES = 96
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS daily_bars (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume REAL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS bar_ranges (
+    symbol TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    PRIMARY KEY (symbol, start, end)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS option_contracts (
+    ticker TEXT PRIMARY KEY,
+    underlying TEXT NOT NULL,
+    expiration TEXT NOT NULL,
+    strike REAL NOT NULL,
+    contract_type TEXT NOT NULL,
+    listed TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_contracts_underlying
+    ON option_contracts (underlying, expiration, strike);
+CREATE TABLE IF NOT EXISTS contract_lists (
+    underlying TEXT NOT NULL,
+    expiration TEXT NOT NULL,
+    PRIMARY KEY (underlying, expiration)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS contract_ranges (
+    underlying TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    PRIMARY KEY (underlying, start, end)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS flat_file_spans (
+    kind TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    PRIMARY KEY (kind, start, end)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS negative_cache (
+    symbol TEXT NOT NULL,
+    key TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    expires REAL,
+    PRIMARY KEY (symbol, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS iv_history (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    atm_iv REAL,
+    iv_rank REAL,
+    iv_percentile REAL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS iv_ranges (
+    symbol TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    PRIMARY KEY (symbol, start, end)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lru (
+    symbol TEXT PRIMARY KEY,
+    last_access REAL NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    pinned INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_lru_access ON lru (last_access);
+"""
+
+class MarketDataStore:
+    """
+    Local store keyed by ticker/contract and date
+
+    Underlying tickers and option contracts share the daily_bars table (option
+    symbols keep their "O:" prefix). Eviction is least-recently-used at the
+    symbol level: an underlying owns its bars, its contract listings and the
+    bars of its contracts, so evicting it frees everything it pulled in.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.path = os.path.join(cache_dir, "market_data.sqlite")
+
+        self._lock = threading.RLock()
+        # Several processes may share the file: WAL lets readers run alongside
+        # the one writer, and SQLite retries a locked write until busy_timeout
+        self._conn = sqlite3.connect(self.path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._touched = {}
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            row = self._conn.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+            if row is None or int(row[0]) != STORE_VERSION:
+                self._reset()
+
+    def _reset(self):
+        """Drop everything written by another store version"""
+        for table in ("daily_bars", "bar_ranges", "option_contracts", "contract_lists",
+                      "contract_ranges", "flat_file_spans", "negative_cache", "iv_history", "iv_ranges",
+                      "lru", "meta"):
+            self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self._conn.executescript(SCHEMA)
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(STORE_VERSION),))
+        self._conn.commit()
+
+    @staticmethod
+    def owner_of(symbol: str) -> str:
+        """LRU owner of a symbol: option contracts belong to their underlying"""
+        if symbol.startswith("O:"):
+            # O:AAPL240119C00150000 -> AAPL (root is everything before the 15-char suffix)
+            return symbol[2:-15]
+        return symbol
+
+    def _touch(self, symbol: str, added_bytes: int = 0):
+        owner = self.owner_of(symbol)
+        self._touched[owner] = self._touched.get(owner, 0) + added_bytes
+
+    # ------------------------------------------------------------------
+    # Daily bars
+    # ------------------------------------------------------------------
+
+    def get_bar(self, symbol: str, date: str) -> Optional[Dict]:
+        """Get one daily bar, or None if it is not stored"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT open, high, low, close, volume FROM daily_bars WHERE symbol=? AND date=?",
+                (symbol, date)).fetchone()
+            if row is None:
+                return None
+            self._touch(symbol)
+        return {'open': row[0], 'high': row[1], 'low': row[2], 'close': row[3], 'volume': row[4]}
+
+    def get_bars_on(self, symbols: List[str], date: str) -> Dict[str, Tuple]:
+        """Get symbol -> (open, high, low, close, volume) for many symbols on one date"""
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(symbols), 500):
+                chunk = symbols[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                for row in self._conn.execute(
+                        f"SELECT symbol, open, high, low, close, volume FROM daily_bars "
+                        f"WHERE date=? AND symbol IN ({marks})", [date] + chunk):
+                    found[row[0]] = row[1:]
+            for symbol in found:
+                self._touch(symbol)
+        return found
+
+    def get_bars(self, symbol: str, start: str, end: str) -> List[Tuple]:
+        """Get (date, open, high, low, close, volume) rows between two dates, inclusive"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, open, high, low, close, volume FROM daily_bars "
+                "WHERE symbol=? AND date BETWEEN ? AND ? ORDER BY date",
+                (symbol, start, end)).fetchall()
+            if rows:
+                self._touch(symbol)
+        return rows
+
+    def put_bars(self, symbol: str, rows: Iterable[Tuple]):
+        """Store (date, open, high, low, close, volume) rows for a symbol"""
+        rows = [(symbol,) + tuple(r) for r in rows]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO daily_bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._touch(symbol, len(rows) * BAR_ROW_BYTES)
+            self._commit()
+
+    def has_range(self, symbol: str, start: str, end: str) -> bool:
+        """
+        True if the store holds every bar the symbol has in start..end
+
+        Either a range fetch covered it, or imported flat files for the
+        symbol's asset class span the dates (a missing bar then means the
+        symbol did not trade that day).
+        """
+        kind = 'options' if symbol.startswith('O:') else 'stocks'
+        if (self.has_flat_file_span(kind, start, end) or
+                self.has_flat_file_span(f"{kind}:{self.owner_of(symbol)}", start, end)):
+            return True
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM bar_ranges WHERE symbol=? AND start<=? AND end>=?",
+                (symbol, start, end)).fetchone()
+        return row is not None
+
+    def put_range(self, symbol: str, start: str, end: str, rows: Iterable[Tuple]):
+        """Store the bars of a full range fetch and record that the range is complete"""
+        self.put_ranges([(symbol, start, end, rows)])
+
+    def put_ranges(self, ranges: Iterable[Tuple[str, str, str, Iterable[Tuple]]]):
+        """
+        Store several (symbol, start, end, rows) range fetches in one transaction
+
+        A range is only marked complete up to the last completed session;
+        bars for later days (today, or the future) may still arrive.
+        """
+        complete = str(get_calendar().last_completed_session())
+        with self._lock:
+            for symbol, start, end, rows in ranges:
+                rows = [(symbol,) + tuple(r) for r in rows]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO daily_bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                end = min(end, complete)
+                if start <= end:
+                    self._conn.execute("INSERT OR REPLACE INTO bar_ranges VALUES (?, ?, ?)", (symbol, start, end))
+                self._touch(symbol, len(rows) * BAR_ROW_BYTES)
+            self._commit()
+
+    # ------------------------------------------------------------------
+    # Options contracts
+    # ------------------------------------------------------------------
+
+    def get_contracts(self, underlying: str, expiration: str) -> Optional[List[Dict]]:
+        """
+        Get the stored contract list for one expiration
+
+        Returns None when the list was never fetched, so an empty list can be
+        told apart from a missing one.
+        """
+        with self._lock:
+            listed = self._conn.execute(
+                "SELECT 1 FROM contract_lists WHERE underlying=? AND expiration=?",
+                (underlying, expiration)).fetchone()
+            if listed is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT ticker, strike, contract_type FROM option_contracts "
+                "WHERE underlying=? AND expiration=? ORDER BY strike",
+                (underlying, expiration)).fetchall()
+            self._touch(underlying)
+        return [{'ticker': r[0], 'strike': r[1], 'type': r[2], 'expiration': expiration} for r in rows]
+
+    def put_contracts(self, underlying: str, expiration: str, contracts: Iterable[Dict]):
+        """Store the complete contract list for one expiration"""
+        rows = [(c['ticker'], underlying, expiration, float(c['strike']), c['type'], c.get('listed'))
+                for c in contracts]
+        with self._lock:
+            self._insert_contracts(rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO contract_lists VALUES (?, ?)", (underlying, expiration))
+            self._touch(underlying, len(rows) * CONTRACT_ROW_BYTES)
+            self._commit()
+
+    def _insert_contracts(self, rows: List[Tuple]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO option_contracts "
+            "(ticker, underlying, expiration, strike, contract_type, listed) VALUES (?, ?, ?, ?, ?, ?)",
+            rows)
+
+    def has_contract_range(self, underlying: str, start: str, end: str) -> bool:
+        """True if every contract expiring in start..end was already stored"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM contract_ranges WHERE underlying=? AND start<=? AND end>=?",
+                (underlying, start, end)).fetchone()
+        return row is not None
+
+    def get_contract_range(self, underlying: str, start: str, end: str) -> List[Dict]:
+        """Get every stored contract of an underlying expiring in start..end"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ticker, expiration, strike, contract_type, listed FROM option_contracts "
+                "WHERE underlying=? AND expiration BETWEEN ? AND ?",
+                (underlying, start, end)).fetchall()
+            self._touch(underlying)
+        return [{'ticker': r[0], 'expiration': r[1], 'strike': r[2], 'type': r[3], 'listed': r[4]}
+                for r in rows]
+
+    def put_contract_range(self, underlying: str, start: str, end: str, contracts: Iterable[Dict]):
+        """Store every contract of an underlying expiring in start..end and mark the range complete"""
+        rows = [(c['ticker'], underlying, c['expiration'], float(c['strike']), c['type'], c.get('listed'))
+                for c in contracts]
+        with self._lock:
+            self._insert_contracts(rows)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO contract_lists VALUES (?, ?)",
+                [(underlying, e) for e in sorted(set(r[2] for r in rows))])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO contract_ranges VALUES (?, ?, ?)", (underlying, start, end))
+            self._touch(underlying, len(rows) * CONTRACT_ROW_BYTES)
+            self._commit()
+
+    # ------------------------------------------------------------------
+    # Implied volatility history
+    # ------------------------------------------------------------------
+
+    def has_iv_range(self, symbol: str, start: str, end: str) -> bool:
+        """True if the IV series of symbol was built over start..end"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM iv_ranges WHERE symbol=? AND start<=? AND end>=?",
+                (symbol, start, end)).fetchone()
+        return row is not None
+
+    def get_iv_history(self, symbol: str, start: str, end: str) -> List[Tuple]:
+        """(date, atm_iv, iv_rank, iv_percentile) rows of symbol in start..end, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, atm_iv, iv_rank, iv_percentile FROM iv_history "
+                "WHERE symbol=? AND date BETWEEN ? AND ? ORDER BY date",
+                (symbol, start, end)).fetchall()
+            self._touch(symbol)
+        return rows
+
+    def get_iv_rank(self, symbol: str, date: str) -> Optional[Tuple[float, float]]:
+        """(iv_rank, iv_percentile) of symbol on one date, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT iv_rank, iv_percentile FROM iv_history WHERE symbol=? AND date=?",
+                (symbol, date)).fetchone()
+        return tuple(row) if row else None
+
+    def put_iv_history(self, symbol: str, start: str, end: str, rows: Iterable[Tuple]):
+        """Store (date, atm_iv, iv_rank, iv_percentile) rows and record the series as built over start..end"""
+        rows = [(symbol,) + tuple(r) for r in rows]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO iv_history VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO iv_ranges VALUES (?, ?, ?)", (symbol, start, end))
+            self._touch(symbol, len(rows) * BAR_ROW_BYTES)
+            self._commit()
+
+    # ------------------------------------------------------------------
+    # Negative cache
+    # ------------------------------------------------------------------
+
+    def get_negative(self, symbol: str, key: str) -> Optional[str]:
+        """Reason a lookup for symbol/key is known to come back empty, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT reason, expires FROM negative_cache WHERE symbol=? AND key=?",
+                (symbol, key)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def put_negative(self, symbol: str, key: str, reason: str, ttl: Optional[float] = None):
+        """Remember an empty result; with a ttl (seconds) it is retried once that passes"""
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO negative_cache VALUES (?, ?, ?, ?)",
+                               (symbol, key, reason, expires))
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Flat-file imports
+    # ------------------------------------------------------------------
+
+    def put_daily_rows(self, rows: Iterable[Tuple]):
+        """Store (symbol, date, open, high, low, close, volume) rows for many symbols; imported data is pinned"""
+        rows = list(rows)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO daily_bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._pin(set(self.owner_of(r[0]) for r in rows))
+            self._conn.commit()
+
+    def put_imported_contracts(self, rows: Iterable[Tuple]):
+        """
+        Store (ticker, underlying, expiration, strike, type, listed) rows seen in flat files
+
+        `listed` is the first day a contract was seen trading; re-importing an
+        earlier file moves it back.
+        """
+        rows = list(rows)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO option_contracts "
+                "(ticker, underlying, expiration, strike, contract_type, listed) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(ticker) DO UPDATE SET listed=min(coalesce(listed, excluded.listed), excluded.listed)",
+                rows)
+            self._pin(set(r[1] for r in rows))
+            self._conn.commit()
+
+    def put_flat_file_span(self, kind: str, start: str, end: str):
+        """
+        Record that every trading day of `kind` in start..end was imported
+
+        `kind` is 'stocks' or 'options' for a whole-universe import, or
+        'stocks:SPY' / 'options:SPY' when only some symbols were taken.
+        """
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO flat_file_spans VALUES (?, ?, ?)", (kind, start, end))
+            self._conn.commit()
+
+    def has_flat_file_span(self, kind: str, start: str, end: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM flat_file_spans WHERE kind=? AND start<=? AND end>=?",
+                (kind, start, end)).fetchone()
+        return row is not None
+
+    def _pin(self, owners: Iterable[str]):
+        """Exclude owners from LRU eviction (flat-file data can't be re-fetched on demand)"""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO lru (symbol, last_access, bytes, pinned) VALUES (?, ?, 0, 1) "
+            "ON CONFLICT(symbol) DO UPDATE SET pinned=1",
+            [(owner, now) for owner in owners])
+
+    # ------------------------------------------------------------------
+    # Size cap and LRU eviction
+    # ------------------------------------------------------------------
+
+    def _flush_touched(self):
+        if not self._touched:
+            return
+        now = time.time()
+        for owner, added in self._touched.items():
+            self._conn.execute(
+                "INSERT INTO lru (symbol, last_access, bytes) VALUES (?, ?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET last_access=excluded.last_access, "
+                "bytes=bytes + excluded.bytes",
+                (owner, now, added))
+        self._touched = {}
+
+    def _commit(self):
+        self._flush_touched()
+        self._conn.commit()
+        if self.size_bytes() > self.max_bytes:
+            self.evict()
+
+    def size_bytes(self) -> int:
+        """Live size of the database file (free pages excluded)"""
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        free = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def evict(self, target_bytes: Optional[int] = None):
+        """Evict least-recently-used symbols until the store fits target_bytes"""
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * 0.9)  # leave headroom so we don't evict on every write
+
+        with self._lock:
+            self._flush_touched()
+            excess = self.size_bytes() - target_bytes
+            if excess <= 0:
+                return
+
+            victims = []
+            freed = 0
+            for owner, nbytes in self._conn.execute(
+                    "SELECT symbol, bytes FROM lru WHERE pinned=0 ORDER BY last_access"):
+                victims.append(owner)
+                freed += nbytes
+                if freed >= excess:
+                    break
+
+            for owner in victims:
+                self._drop_owner(owner)
+            self._conn.commit()
+
+    def _drop_owner(self, owner: str):
+        self._conn.execute("DELETE FROM daily_bars WHERE symbol=?", (owner,))
+        self._conn.execute("DELETE FROM bar_ranges WHERE symbol=?", (owner,))
+        # Contract bars, ranges and negatives are owned by their underlying's root
+        for table in ('daily_bars', 'bar_ranges', 'negative_cache'):
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE symbol IN "
+                "(SELECT ticker FROM option_contracts WHERE underlying=?)", (owner,))
+        self._conn.execute("DELETE FROM option_contracts WHERE underlying=?", (owner,))
+        self._conn.execute("DELETE FROM contract_lists WHERE underlying=?", (owner,))
+        self._conn.execute("DELETE FROM contract_ranges WHERE underlying=?", (owner,))
+        self._conn.execute("DELETE FROM negative_cache WHERE symbol=?", (owner,))
+        self._conn.execute("DELETE FROM iv_history WHERE symbol=?", (owner,))
+        self._conn.execute("DELETE FROM iv_ranges WHERE symbol=?", (owner,))
+        self._conn.execute("DELETE FROM lru WHERE symbol=?", (owner,))
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped OHLCV Cube
+Daily bars for a whole ticker universe as one float32 ticker x day x field
+matrix on disk, opened read-only and shared as zero-copy slices
+"""
+
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional, Iterable
+import numpy as np
+import pandas as pd
+
+from market_data_store import MarketDataStore, DEFAULT_CACHE_DIR
+from price_series import PriceSeries
+from trading_calendar import get_calendar
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+DEFAULT_CUBE_PATH = os.path.join(DEFAULT_CACHE_DIR, "ohlcv_cube")
+
+class OHLCVCube:
+    """
+    Bars of many tickers on a shared session axis
+
+    data[row, day, field] is NaN where a ticker had no bar. Every accessor
+    returns a view into the (usually memory-mapped) matrix, never a copy.
+    """
+
+    def __init__(self, data: np.ndarray, tickers: List[str], dates: np.ndarray,
+                 start=None, end=None):
+        self.data = data
+        self.tickers = list(tickers)
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.row_of = {t: i for i, t in enumerate(self.tickers)}
+        # The window the cube was built for (wider than dates when it starts
+        # or ends on a day without a session)
+        self.start = _day(start) if start is not None else (self.dates[0] if len(self.dates) else None)
+        self.end = _day(end) if end is not None else (self.dates[-1] if len(self.dates) else None)
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_CUBE_PATH) -> 'OHLCVCube':
+        """Open a built cube read-only"""
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        data = np.memmap(f"{path}.f32", dtype=np.float32, mode='r',
+                         shape=(len(meta['tickers']), len(meta['dates']), len(FIELDS)))
+        return cls(data, meta['tickers'], np.array(meta['dates'], dtype='datetime64[D]'),
+                   meta.get('start'), meta.get('end'))
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self.row_of
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def covers(self, start, end) -> bool:
+        """True if the cube was built for a window spanning start..end"""
+        if self.start is None:
+            return False
+        return self.start <= _day(start) and _day(end) <= self.end
+
+    def day_slice(self, start=None, end=None) -> slice:
+        """Session range start..end (inclusive) on the day axis"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, _day(start), side='left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, _day(end), side='right'))
+        return slice(lo, hi)
+
+    def bars(self, ticker: str, start=None, end=None) -> np.ndarray:
+        """(days, fields) view of one ticker"""
+        return self.data[self.row_of[ticker], self.day_slice(start, end)]
+
+    def field(self, ticker: str, name: str, start=None, end=None) -> np.ndarray:
+        """One field of one ticker as a 1-D (strided) view"""
+        return self.bars(ticker, start, end)[:, FIELDS.index(name)]
+
+    def cross_section(self, date, name: str = 'close') -> np.ndarray:
+        """One field of every ticker on one session (NaN if it isn't a session)"""
+        day = _day(date)
+        idx = int(np.searchsorted(self.dates, day))
+        if idx == len(self.dates) or self.dates[idx] != day:
+            return np.full(len(self.tickers), np.nan, dtype=np.float32)
+        return self.data[:, idx, FIELDS.index(name)]
+
+    def price_series(self, ticker: str) -> PriceSeries:
+        """Closes as a PriceSeries sharing the cube's memory"""
+        return PriceSeries(self.dates, self.field(ticker, 'close'))
+
+    def frame(self, ticker: str, start=None, end=None) -> pd.DataFrame:
+        """Chart-style DataFrame (Open/High/Low/Close/Volume by Date) over the cube's memory"""
+        days = self.day_slice(start, end)
+        bars = self.data[self.row_of[ticker], days]
+        df = pd.DataFrame(bars, index=pd.DatetimeIndex(self.dates[days], name='Date'),
+                          columns=[f.capitalize() for f in FIELDS], copy=False)
+        # Days the ticker didn't trade are dropped (that part is a copy)
+        has_bar = df['Close'].notna().to_numpy()
+        return df if has_bar.all() else df[has_bar]
+
+def build_cube(path: str, store: MarketDataStore, tickers: Iterable[str], start: str, end: str,
+               fetcher=None, log=print) -> OHLCVCube:
+    """
+    Write a cube for tickers over start..end from the market data store
+
+    With a BatchFetcher, ranges the store doesn't hold yet are fetched first
+    (unadjusted, like the engines). The files are written beside the target
+    and renamed into place, so readers never see a half-built cube.
+    """
+    tickers = sorted(set(tickers))
+    if fetcher is not None:
+        missing = [t for t in tickers if not store.has_range(t, start, end)]
+        log(f"Fetching {len(missing)} of {len(tickers)} tickers")
+        fetched = fetcher.fetch_daily_bars([(t, start, end) for t in missing], adjusted=False)
+        store.put_ranges([(t, start, end, fetched[t]) for t in missing if t in fetched])
+
+    # Session axis: every date any ticker traded
+    sessions = set()
+    for ticker in tickers:
+        sessions.update(r[0] for r in store.get_bars(ticker, start, end))
+    dates = np.array(sorted(sessions), dtype='datetime64[D]')
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    data = np.memmap(f"{path}.f32.tmp", dtype=np.float32, mode='w+',
+                     shape=(len(tickers), len(dates), len(FIELDS)))
+    data[:] = np.nan
+    for row, ticker in enumerate(tickers):
+        rows = store.get_bars(ticker, start, end)
+        if not rows:
+            continue
+        idx = np.searchsorted(dates, np.array([r[0] for r in rows], dtype='datetime64[D]'))
+        data[row, idx] = np.array([r[1:6] for r in rows], dtype=np.float64)
+    data.flush()
+    del data
+
+    # Sessions after the last completed one may still gain bars
+    meta = {'tickers': tickers, 'dates': [str(d) for d in dates], 'fields': list(FIELDS),
+            'start': start, 'end': min(end, str(get_calendar().last_completed_session()))}
+    with open(f"{path}.json.tmp", 'w') as f:
+        json.dump(meta, f)
+    os.replace(f"{path}.f32.tmp", f"{path}.f32")
+    os.replace(f"{path}.json.tmp", f"{path}.json")
+    log(f"Cube: {len(tickers)} tickers x {len(dates)} sessions -> {path}.f32")
+    return OHLCVCube.open(path)
+
+_cubes = {}
+_cubes_lock = threading.Lock()
+
+def get_shared_cube(path: str = DEFAULT_CUBE_PATH) -> Optional[OHLCVCube]:
+    """Process-wide read-only cube per path, or None if it hasn't been built"""
+    path = os.path.abspath(path)
+    with _cubes_lock:
+        if path not in _cubes:
+            _cubes[path] = OHLCVCube.open(path) if os.path.exists(f"{path}.json") else None
+        return _cubes[path]
+
+def _day(value) -> np.datetime64:
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(str(value)[:10], 'D')
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the shared OHLCV cube from the market data store")
+    parser.add_argument('--start', required=True, help="first date (YYYY-MM-DD)")
+    parser.add_argument('--end', required=True, help="last date (YYYY-MM-DD)")
+    parser.add_argument('--tickers', nargs='*', default=[])
+    parser.add_argument('--tickers-file', help="file with one ticker per line")
+    parser.add_argument('--path', default=DEFAULT_CUBE_PATH)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--offline', action='store_true', help="use only bars already in the store")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip() for line in f if line.strip()]
+
+    fetcher = None
+    if not args.offline:
+        from async_client import get_shared_client
+        from batch_fetcher import BatchFetcher
+        fetcher = BatchFetcher(get_shared_client(os.environ['MASSIVE_API_KEY']))
+
+    store = MarketDataStore(args.cache_dir)
+    build_cube(args.path, store, tickers, args.start, args.end, fetcher)
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Columnar Options Chain
+Quotes for one underlying and expiration held as NumPy arrays, pre-split
+into calls and puts sorted by strike, so leg selection is array operations
+"""
+
+from typing import List, Dict, Optional, Iterable
+import numpy as np
+
+# Per-contract columns; anything a data source doesn't provide is NaN
+FIELDS = ('strike', 'bid', 'ask', 'mid', 'volume', 'open_interest',
+          'iv', 'delta', 'gamma', 'theta', 'vega')
+
+class ChainSide:
+    """One side (calls or puts) of a chain, every column sorted by strike"""
+
+    def __init__(self, contract_type: str, columns: Dict[str, np.ndarray],
+                 tickers: Optional[np.ndarray] = None):
+        self.contract_type = contract_type
+        n = len(columns.get('strike', ()))
+        for field in FIELDS:
+            values = columns.get(field)
+            if values is None:
+                values = np.full(n, np.nan)
+            setattr(self, field, np.asarray(values, dtype=np.float64))
+        self.tickers = tickers if tickers is not None else np.full(n, None, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.strike)
+
+    def take(self, rows) -> 'ChainSide':
+        """New side holding the given rows (boolean mask or indices)"""
+        columns = {field: getattr(self, field)[rows] for field in FIELDS}
+        return ChainSide(self.contract_type, columns, self.tickers[rows])
+
+    def row(self, i: int) -> Dict:
+        """One contract as a dict (for logging and position legs)"""
+        d = {field: float(getattr(self, field)[i]) for field in FIELDS}
+        d['type'] = self.contract_type
+        d['ticker'] = self.tickers[i]
+        return d
+
+    # ------------------------------------------------------------------
+    # Leg lookup
+    # ------------------------------------------------------------------
+
+    def first_above(self, strike: float) -> int:
+        """Index of the lowest strike strictly above `strike` (len if none)"""
+        return int(np.searchsorted(self.strike, strike, side='right'))
+
+    def count_below(self, strike: float) -> int:
+        """Number of strikes strictly below `strike`"""
+        return int(np.searchsorted(self.strike, strike, side='left'))
+
+    def nearest(self, strike: float) -> int:
+        """Index of the strike closest to `strike` (-1 if the side is empty)"""
+        if len(self) == 0:
+            return -1
+        i = int(np.searchsorted(self.strike, strike))
+        if i == 0:
+            return 0
+        if i == len(self):
+            return i - 1
+        return i if self.strike[i] - strike < strike - self.strike[i - 1] else i - 1
+
+    def nearest_delta(self, target: float) -> int:
+        """Index whose |delta| is closest to `target` (-1 if no deltas)"""
+        dist = np.abs(np.abs(self.delta) - target)
+        if len(dist) == 0 or np.all(np.isnan(dist)):
+            return -1
+        return int(np.nanargmin(dist))
+
+    # ------------------------------------------------------------------
+    # Vectorized filters (boolean masks)
+    # ------------------------------------------------------------------
+
+    def moneyness(self, underlying_price: float) -> np.ndarray:
+        return self.strike / underlying_price
+
+    def otm_mask(self, underlying_price: float) -> np.ndarray:
+        if self.contract_type == 'call':
+            return self.strike > underlying_price
+        return self.strike < underlying_price
+
+    def moneyness_mask(self, underlying_price: float, lo: float, hi: float) -> np.ndarray:
+        m = self.moneyness(underlying_price)
+        return (m >= lo) & (m <= hi)
+
+    def delta_mask(self, lo: float, hi: float) -> np.ndarray:
+        """|delta| within [lo, hi]; contracts without a delta never match"""
+        d = np.abs(self.delta)
+        return (d >= lo) & (d <= hi)
+
+    def liquidity_mask(self, min_open_interest: float = 0, min_volume: float = 0) -> np.ndarray:
+        """Volume/OI at least the minimums; a missing (NaN) column is not held against a contract"""
+        oi_ok = np.isnan(self.open_interest) | (self.open_interest >= min_open_interest)
+        vol_ok = np.isnan(self.volume) | (self.volume >= min_volume)
+        return oi_ok & vol_ok
+
+class OptionsChain:
+    """Calls and puts of one underlying and expiration"""
+
+    def __init__(self, calls: ChainSide, puts: ChainSide,
+                 underlying_price: Optional[float] = None, expiration: Optional[str] = None):
+        self.calls = calls
+        self.puts = puts
+        self.underlying_price = underlying_price
+        self.expiration = expiration
+
+    def __len__(self) -> int:
+        return len(self.calls) + len(self.puts)
+
+    def side(self, contract_type: str) -> ChainSide:
+        return self.calls if contract_type == 'call' else self.puts
+
+    @classmethod
+    def from_arrays(cls, is_put: np.ndarray, columns: Dict[str, np.ndarray],
+                    tickers: Optional[np.ndarray] = None, underlying_price: Optional[float] = None,
+                    expiration: Optional[str] = None) -> 'OptionsChain':
+        """Build from unsorted parallel arrays, splitting calls from puts and sorting by strike"""
+        is_put = np.asarray(is_put, dtype=bool)
+        if tickers is None:
+            tickers = np.full(len(is_put), None, dtype=object)
+        sides = {}
+        for contract_type, mask in (('call', ~is_put), ('put', is_put)):
+            order = np.flatnonzero(mask)
+            order = order[np.argsort(columns['strike'][order], kind='stable')]
+            sides[contract_type] = ChainSide(
+                contract_type, {k: np.asarray(v)[order] for k, v in columns.items()}, tickers[order])
+        return cls(sides['call'], sides['put'], underlying_price, expiration)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], underlying_price: Optional[float] = None,
+                     expiration: Optional[str] = None) -> 'OptionsChain':
+        """Build from quote dicts with a 'type' key and any of the FIELDS"""
+        records = list(records)
+        columns = {
+            field: np.array([r.get(field, np.nan) for r in records], dtype=np.float64)
+            for field in FIELDS
+        }
+        is_put = np.array([r['type'] == 'put' for r in records], dtype=bool)
+        tickers = np.array([r.get('ticker') for r in records], dtype=object)
+        return cls.from_arrays(is_put, columns, tickers, underlying_price, expiration)
+
+    def filter(self, call_mask: np.ndarray, put_mask: np.ndarray) -> 'OptionsChain':
+        return OptionsChain(self.calls.take(call_mask), self.puts.take(put_mask),
+                            self.underlying_price, self.expiration)
+
+    def filter_liquidity(self, min_open_interest: float = 0, min_volume: float = 0) -> 'OptionsChain':
+        return self.filter(self.calls.liquidity_mask(min_open_interest, min_volume),
+                           self.puts.liquidity_mask(min_open_interest, min_volume))
+
+    def filter_moneyness(self, lo: float, hi: float) -> 'OptionsChain':
+        price = self.underlying_price
+        return self.filter(self.calls.moneyness_mask(price, lo, hi),
+                           self.puts.moneyness_mask(price, lo, hi))
+
+    def filter_delta(self, lo: float, hi: float) -> 'OptionsChain':
+        return self.filter(self.calls.delta_mask(lo, hi), self.puts.delta_mask(lo, hi))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Options Contract Reference Index
+All contracts of one underlying for a backtest window, sorted so expiration
+and strike lookups are binary searches instead of reference API calls
+"""
+
+from datetime import datetime, timedelta, date as date_type
+from typing import List, Dict, Optional, Iterable
+import numpy as np
+
+# Contracts without a known listing date are treated as always listed
+ALWAYS_LISTED = np.datetime64('1970-01-01', 'D')
+
+class OptionsContractIndex:
+    """
+    Contracts of one underlying, sorted by (expiration, type, strike)
+
+    Calls sort ahead of puts within an expiration, matching the ticker order the
+    reference endpoint returns, so each (expiration, type) is one contiguous
+    strike-sorted block.
+    """
+
+    def __init__(self, underlying: str, contracts: Iterable[Dict]):
+        contracts = list(contracts)
+        self.underlying = underlying
+
+        exp = np.array([c['expiration'] for c in contracts], dtype='datetime64[D]')
+        is_put = np.array([c['type'] == 'put' for c in contracts], dtype=bool)
+        strike = np.array([c['strike'] for c in contracts], dtype=np.float64)
+        listed = np.array([c.get('listed') or ALWAYS_LISTED for c in contracts], dtype='datetime64[D]')
+        tickers = np.array([c['ticker'] for c in contracts], dtype=object)
+
+        order = np.lexsort((strike, is_put, exp))
+        self.expiration = exp[order]
+        self.is_put = is_put[order]
+        self.strike = strike[order]
+        self.listed = listed[order]
+        self.tickers = tickers[order]
+
+        # Distinct expirations with the first listing date of any of their contracts
+        self.expirations, starts = np.unique(self.expiration, return_index=True)
+        self.exp_listed = (np.minimum.reduceat(self.listed, starts)
+                           if len(starts) else np.array([], dtype='datetime64[D]'))
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    @staticmethod
+    def _day(value) -> np.datetime64:
+        if isinstance(value, datetime):
+            value = value.date()
+        if isinstance(value, date_type):
+            value = value.isoformat()
+        return np.datetime64(str(value)[:10], 'D')
+
+    def expirations_between(self, date, min_dte: int, max_dte: int) -> List[str]:
+        """Expirations between min_dte and max_dte days out that were listed as of date"""
+        day = self._day(date)
+        lo = np.searchsorted(self.expirations, day + min_dte, side='left')
+        hi = np.searchsorted(self.expirations, day + max_dte, side='right')
+        exps = self.expirations[lo:hi]
+        exps = exps[self.exp_listed[lo:hi] <= day]
+        return [str(e) for e in exps]
+
+    def expiration_slice(self, expiration) -> slice:
+        """Row range holding every contract of one expiration"""
+        day = self._day(expiration)
+        lo = np.searchsorted(self.expiration, day, side='left')
+        hi = np.searchsorted(self.expiration, day, side='right')
+        return slice(int(lo), int(hi))
+
+    def strikes_for(self, expiration, contract_type: str) -> np.ndarray:
+        """Sorted strikes of one expiration and contract type"""
+        rows = self.expiration_slice(expiration)
+        # Within an expiration calls come first, so the type boundary is one search
+        split = rows.start + int(np.searchsorted(self.is_put[rows], True, side='left'))
+        if contract_type == 'call':
+            return self.strike[rows.start:split]
+        return self.strike[split:rows.stop]
+
+    def atm_contracts(self, expiration, price: float) -> Optional[tuple]:
+        """(strike, call ticker, put ticker) of the listed strike nearest price that has both a call and a put"""
+        rows = self.expiration_slice(expiration)
+        split = rows.start + int(np.searchsorted(self.is_put[rows], True, side='left'))
+        call_strikes = self.strike[rows.start:split]
+        put_strikes = self.strike[split:rows.stop]
+        both = np.intersect1d(call_strikes, put_strikes)
+        if len(both) == 0:
+            return None
+        strike = both[np.argmin(np.abs(both - price))]
+        call = rows.start + int(np.searchsorted(call_strikes, strike))
+        put = split + int(np.searchsorted(put_strikes, strike))
+        return float(strike), self.tickers[call], self.tickers[put]
+
+    def contracts_for(self, expiration, date=None) -> List[Dict]:
+        """Contracts of one expiration as dicts, optionally only those listed as of date"""
+        rows = self.expiration_slice(expiration)
+        listed = self.listed[rows]
+        keep = np.ones(len(listed), dtype=bool) if date is None else listed <= self._day(date)
+        exp_str = str(self._day(expiration))
+        return [
+            {'ticker': t, 'strike': float(k), 'type': 'put' if p else 'call', 'expiration': exp_str}
+            for t, k, p in zip(self.tickers[rows][keep], self.strike[rows][keep], self.is_put[rows][keep])
+        ]
+
+    def to_records(self) -> List[Dict]:
+        """Contracts as dicts for persisting in the market data store"""
+        return [
+            {'ticker': t, 'expiration': str(e), 'strike': float(k), 'type': 'put' if p else 'call',
+             'listed': None if l == ALWAYS_LISTED else str(l)}
+            for t, e, k, p, l in zip(self.tickers, self.expiration, self.strike, self.is_put, self.listed)
+        ]
+
+def fetch_contracts(client, underlying: str, first_expiration: str, last_expiration: str) -> List[Dict]:
+    """
+    Pull every contract of an underlying expiring in a window from the reference API
+
+    Backtest windows are mostly in the past, so expired contracts are queried
+    explicitly and live ones are added when the window reaches today.
+    """
+    contracts = {}
+    queries = [True]
+    if last_expiration >= datetime.now().strftime('%Y-%m-%d'):
+        queries.append(False)
+
+    for expired in queries:
+        for c in client.list_options_contracts(
+            underlying_ticker=underlying,
+            expiration_date_gte=first_expiration,
+            expiration_date_lte=last_expiration,
+            expired=expired,
+            limit=1000
+        ):
+            if not c.expiration_date:
+                continue
+            contracts[c.ticker] = {
+                'ticker': c.ticker,
+                'expiration': str(c.expiration_date),
+                'strike': float(c.strike_price),
+                'type': c.contract_type,
+            }
+    return list(contracts.values())
+
+def build_index(client, store, underlying: str, start: datetime, end: datetime,
+                min_dte: int, max_dte: int) -> OptionsContractIndex:
+    """Build an underlying's index for a backtest window, reading through the store"""
+    first = (start + timedelta(days=min_dte)).strftime('%Y-%m-%d')
+    last = (end + timedelta(days=max_dte)).strftime('%Y-%m-%d')
+
+    if store is not None and store.has_contract_range(underlying, first, last):
+        return OptionsContractIndex(underlying, store.get_contract_range(underlying, first, last))
+
+    # Imported flat files list every contract that traded in the window, with
+    # its first trading day as the listing date
+    day_first, day_last = start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+    if store is not None and (store.has_flat_file_span('options', day_first, day_last) or
+                              store.has_flat_file_span(f'options:{underlying}', day_first, day_last)):
+        return OptionsContractIndex(underlying, store.get_contract_range(underlying, first, last))
+
+    contracts = fetch_contracts(client, underlying, first, last)
+    if store is not None:
+        store.put_contract_range(underlying, first, last, contracts)
+    return OptionsContractIndex(underlying, contracts)
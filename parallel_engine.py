@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Ticker-Sharded Parallel Backtest
+Splits the ticker universe across worker processes that simulate candidate
+entries and exits, then merges them in date order under the portfolio limits
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Optional, Callable
+import numpy as np
+
+from backtest_engine import OptionsBacktestEngine, OptionsPosition
+from market_data_store import MarketDataStore
+from replay_transport import worker_config, absorb_worker_archive
+
+def simulate_shard(api_key: str, tickers: List[str], config: Dict, shard: List[str]) -> Dict:
+    """
+    Candidate trades of one shard over the whole window
+
+    Runs in a worker process. Every entry check that falls to a shard ticker
+    is evaluated as if the portfolio had room and the ticker were flat; whether
+    the candidate is actually taken is decided by the merge. Each candidate
+    carries its planned exit and the underlying closes its close will need.
+    """
+    engine = OptionsBacktestEngine(api_key, tickers, config)
+    engine.prepare_data(shard)
+    check_dates = engine.generate_entry_check_dates()
+    engine.check_days = np.array([d.date() for d in check_dates], dtype='datetime64[D]')
+
+    members = set(shard)
+    candidates = []
+    for date in check_dates:
+        ticker = engine.entry_ticker(date)
+        if ticker not in members:
+            continue
+        pos = engine.find_entry(ticker, date)
+        if pos is None:
+            continue
+        # The book only lends plan_exit the position's legs
+        engine.book.add(pos)
+        planned = engine.plan_exit(pos)
+        engine.book.close(pos.book_id)
+        exit_dates = [engine.end_date] + ([planned[0]] if planned else [])
+        candidates.append({
+            'date': date,
+            'position': pos,
+            'exit': planned,
+            'exit_prices': {d.strftime('%Y-%m-%d'): engine.get_underlying_price(ticker, d) for d in exit_dates},
+        })
+
+    engine.client.flush()
+    engine.store.close()
+    return {'shard': shard, 'candidates': candidates, 'data_stats': engine.data_stats}
+
+class ParallelBacktestEngine(OptionsBacktestEngine):
+    """
+    OptionsBacktestEngine with the per-ticker work spread over processes
+
+    Entry decisions only depend on portfolio state through max_positions and
+    the one-position-per-ticker rule, so workers simulate every candidate and
+    the parent replays the event loop over them; trades and statistics are
+    identical to the single-process engine.
+    """
+
+    def __init__(self, api_key: str, tickers: List[str], config: Dict,
+                 progress_callback: Optional[Callable] = None,
+                 data_store: Optional[MarketDataStore] = None,
+                 workers: Optional[int] = None):
+        super().__init__(api_key, tickers, config, progress_callback, data_store)
+        self.api_key = api_key
+        self.workers = workers or config.get('parallel_workers') or os.cpu_count() or 1
+        self.candidates = {}
+        self.exit_prices = {}
+
+    def shards(self) -> List[List[str]]:
+        """Tickers dealt round-robin, so every shard gets a similar share of the rotation"""
+        n = max(1, min(self.workers, len(self.tickers)))
+        return [self.tickers[i::n] for i in range(n)]
+
+    def prepare_data(self, tickers: Optional[List[str]] = None):
+        shards = self.shards()
+        self.log(f"Simulating {len(self.tickers)} tickers in {len(shards)} processes")
+        # Spawned, not forked: a forked worker would inherit the shared API
+        # client without the I/O thread that drives it
+        with ProcessPoolExecutor(max_workers=len(shards),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(simulate_shard, self.api_key, self.tickers, worker_config(self.config, i), shard)
+                       for i, shard in enumerate(shards)]
+            for i, future in enumerate(futures):
+                result = future.result()
+                absorb_worker_archive(self.client, self.config, i)
+                for candidate in result['candidates']:
+                    self.candidates[candidate['date']] = candidate
+                    symbol = candidate['position'].symbol
+                    for day, price in candidate['exit_prices'].items():
+                        self.exit_prices[(symbol, day)] = price
+                for key, count in result['data_stats'].items():
+                    self.data_stats[key] += count
+                self.log(f"Shard {', '.join(result['shard'][:3])}"
+                         f"{'...' if len(result['shard']) > 3 else ''}: "
+                         f"{len(result['candidates'])} candidate entries")
+        # Underlying closes for the NAV marks; the workers have already stored them
+        self.preload_underlying_prices(self.tickers)
+
+    def check_entry_signals(self, date: datetime):
+        candidate = self.candidates.get(date)
+        if candidate is None or self.book.has_open(candidate['position'].symbol):
+            return
+        pos = candidate['position']
+        self.book.add(pos)
+        self.schedule_exit(pos)
+        self.log(f"Opened {pos.strategy} on {pos.symbol}")
+
+    def plan_exit(self, pos: OptionsPosition) -> Optional[tuple]:
+        # Planned by the worker that found the position
+        return self.candidates[pos.entry_date]['exit']
+
+    def get_underlying_price(self, ticker: str, date: datetime) -> Optional[float]:
+        # Only position closes ask for prices here, at the dates the workers priced
+        return self.exit_prices.get((ticker, date.strftime('%Y-%m-%d')))
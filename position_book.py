@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Array-Backed Position Book
+Positions and their legs in flat NumPy arrays, so marking, P&L and exit
+checks over every open position are single vectorized passes
+"""
+
+from collections import Counter
+from typing import List, Dict, Optional
+import numpy as np
+
+class PositionBook:
+    """
+    Every position of a backtest, open or closed
+
+    A position's id is its row in the position arrays and its index in
+    self.positions (the open OptionsPosition objects). Legs are rows of the
+    leg arrays, pointing back at their position through leg_pos. Closing a
+    position clears its is_open flag and releases the object to the trade log.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.positions = []
+        self.n = 0
+        self.open_count = 0
+        self.n_legs = 0
+        self._open_symbols = Counter()
+
+        # Per position
+        self.is_open = np.zeros(capacity, dtype=bool)
+        self.symbol = np.full(capacity, None, dtype=object)
+        self.entry_cost = np.zeros(capacity)
+        self.max_profit = np.zeros(capacity)
+        self.max_loss = np.zeros(capacity)
+        self.pnl = np.zeros(capacity)
+        self.high_water = np.zeros(capacity)     # best pnl marked so far (0 at entry)
+        self.entry_day = np.zeros(capacity, dtype='datetime64[D]')
+        self.expiration = np.zeros(capacity, dtype='datetime64[D]')
+        self.exit_day = np.full(capacity, np.datetime64('NaT'), dtype='datetime64[D]')
+        self.leg_start = np.zeros(capacity, dtype=np.int64)
+        self.leg_count = np.zeros(capacity, dtype=np.int64)
+
+        # Per leg
+        self.leg_pos = np.zeros(capacity * 4, dtype=np.int64)
+        self.contract = np.full(capacity * 4, None, dtype=object)
+        self.strike = np.zeros(capacity * 4)
+        self.is_put = np.zeros(capacity * 4, dtype=bool)
+        self.side = np.zeros(capacity * 4, dtype=np.int8)     # +1 long, -1 short
+        self.quantity = np.zeros(capacity * 4)
+        self.entry_price = np.full(capacity * 4, np.nan)
+
+    # ------------------------------------------------------------------
+    # Adding and closing
+    # ------------------------------------------------------------------
+
+    def add(self, pos) -> int:
+        """Add an OptionsPosition (legs as dicts with type/action/strike) and return its id"""
+        pid = self.n
+        self._grow_positions(pid + 1)
+        self._grow_legs(self.n_legs + len(pos.legs))
+
+        self.positions.append(pos)
+        self.is_open[pid] = True
+        self.symbol[pid] = pos.symbol
+        self.entry_cost[pid] = pos.entry_cost
+        self.max_profit[pid] = pos.max_profit
+        self.max_loss[pid] = pos.max_loss
+        self.pnl[pid] = pos.current_pnl
+        self.high_water[pid] = max(pos.current_pnl, 0.0)
+        self.entry_day[pid] = np.datetime64(pos.entry_date.date(), 'D')
+        self.expiration[pid] = np.datetime64(pos.expiration_date.date(), 'D')
+        self.leg_start[pid] = self.n_legs
+        self.leg_count[pid] = len(pos.legs)
+
+        rows = slice(self.n_legs, self.n_legs + len(pos.legs))
+        legs = pos.legs
+        self.leg_pos[rows] = pid
+        self.contract[rows] = [leg.get('ticker') for leg in legs]
+        self.strike[rows] = [leg['strike'] for leg in legs]
+        self.is_put[rows] = [leg['type'] == 'put' for leg in legs]
+        self.side[rows] = [1 if leg['action'] == 'buy' else -1 for leg in legs]
+        self.quantity[rows] = [leg.get('quantity', 1) for leg in legs]
+        self.entry_price[rows] = [leg.get('price', np.nan) for leg in legs]
+
+        self.n += 1
+        self.n_legs += len(legs)
+        self.open_count += 1
+        self._open_symbols[pos.symbol] += 1
+        pos.book_id = pid
+        return pid
+
+    def close(self, pid: int, day: Optional[np.datetime64] = None):
+        """Close a position, on session `day` when the NAV will need it"""
+        if self.is_open[pid]:
+            self.is_open[pid] = False
+            self.exit_day[pid] = day if day is not None else np.datetime64('NaT')
+            self.open_count -= 1
+            self._open_symbols[self.positions[pid].symbol] -= 1
+            self.positions[pid] = None
+
+    def _grow_positions(self, needed: int):
+        capacity = len(self.is_open)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name in ('is_open', 'symbol', 'entry_cost', 'max_profit', 'max_loss', 'pnl', 'high_water', 'entry_day',
+                     'expiration', 'exit_day', 'leg_start', 'leg_count'):
+            setattr(self, name, _resized(getattr(self, name), capacity))
+
+    def _grow_legs(self, needed: int):
+        capacity = len(self.leg_pos)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name in ('leg_pos', 'contract', 'strike', 'is_put', 'side', 'quantity', 'entry_price'):
+            setattr(self, name, _resized(getattr(self, name), capacity))
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def open_ids(self) -> np.ndarray:
+        """Ids of open positions, in the order they were opened"""
+        return np.flatnonzero(self.is_open[:self.n])
+
+    def open_positions(self) -> List:
+        return [self.positions[i] for i in self.open_ids()]
+
+    def has_open(self, symbol: str) -> bool:
+        return self._open_symbols[symbol] > 0
+
+    def legs_of(self, pid: int) -> slice:
+        """Leg rows of one position (legs are stored contiguously)"""
+        return slice(int(self.leg_start[pid]), int(self.leg_start[pid] + self.leg_count[pid]))
+
+    def short_strike(self, pid: int, contract_type: str) -> Optional[float]:
+        """Strike of a position's first short leg of one type"""
+        rows = self.legs_of(pid)
+        match = np.flatnonzero((self.side[rows] < 0) & (self.is_put[rows] == (contract_type == 'put')))
+        return float(self.strike[rows][match[0]]) if len(match) else None
+
+    # ------------------------------------------------------------------
+    # Vectorized marking
+    # ------------------------------------------------------------------
+
+    def position_values(self, leg_prices: np.ndarray) -> np.ndarray:
+        """
+        Net value of every position from per-leg prices (indexed like the leg arrays)
+
+        Long legs add and short legs subtract price x quantity. A leg without a
+        price (NaN) makes its position's value NaN.
+        """
+        legs = slice(0, self.n_legs)
+        weights = self.side[legs] * self.quantity[legs] * leg_prices[legs]
+        return np.bincount(self.leg_pos[legs], weights=weights, minlength=self.n)
+
+    def mark(self, ids: np.ndarray, pnl: np.ndarray):
+        """Record current pnl for ids and raise their high-water marks"""
+        self.pnl[ids] = pnl
+        self.high_water[ids] = np.maximum(self.high_water[ids], pnl)
+
+    def exit_checks(self, ids: np.ndarray, risk_config: Dict) -> Dict[str, np.ndarray]:
+        """Stop-loss, profit-target and trailing-stop masks for ids from their current marks"""
+        return exit_masks(self.pnl[ids], self.high_water[ids], self.max_profit[ids], self.max_loss[ids],
+                          risk_config)
+
+def exit_masks(pnl: np.ndarray, high_water: np.ndarray, max_profit, max_loss,
+               risk_config: Dict) -> Dict[str, np.ndarray]:
+    """
+    Exit rule masks over any broadcastable marks (positions, or one position's days)
+
+    Stop loss and profit target are percentages of max loss / max profit. The
+    trailing stop fires once a position that has been in profit gives back
+    trailing_stop_pct of its max profit from the high-water mark. Where several
+    rules hit, the stop loss wins, then the profit target.
+    """
+    none = np.zeros(np.shape(pnl), dtype=bool)
+    stop = none
+    target = none
+    trailing = none
+    if risk_config.get('stop_loss_enabled'):
+        stop = pnl <= -max_loss * (risk_config['stop_loss_pct'] / 100.0)
+    if risk_config.get('profit_target_enabled'):
+        target = ~stop & (pnl >= max_profit * (risk_config['profit_target_pct'] / 100.0))
+    if risk_config.get('trailing_stop_enabled'):
+        give_back = max_profit * (risk_config['trailing_stop_pct'] / 100.0)
+        trailing = ~stop & ~target & (high_water > 0) & (pnl <= high_water - give_back)
+    return {'Stop Loss': stop, 'Profit Target': target, 'Trailing Stop': trailing}
+
+def _resized(values: np.ndarray, capacity: int) -> np.ndarray:
+    out = np.zeros(capacity, dtype=values.dtype)
+    if values.dtype == object:
+        out[:] = None
+    elif values.dtype.kind == 'f':
+        out[:] = np.nan
+    elif values.dtype.kind == 'M':
+        out[:] = np.datetime64('NaT')
+    out[:len(values)] = values
+    return out
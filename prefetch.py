@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Session Prefetcher
+Loads each session's market data on a background thread a bounded number
+of sessions ahead of the simulation, so network waits overlap simulation work
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, Tuple
+
+_DONE = object()
+
+class SessionPrefetcher:
+    """
+    Iterate (session, data) pairs while later sessions load in the background
+
+    load(session) runs on a daemon thread in session order. At most
+    `lookahead` loaded sessions wait in the buffer; when it is full the loader
+    blocks until the simulation catches up, which caps memory. An exception
+    raised by load is re-raised to the consumer at that session.
+    """
+
+    def __init__(self, sessions: Iterable, load: Callable[[Any], Any], lookahead: int = 5):
+        self.sessions = list(sessions)
+        self.load = load
+        self.lookahead = max(1, lookahead)
+        self._buffer = queue.Queue(maxsize=self.lookahead)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session-prefetch", daemon=True)
+        # Seconds the simulation spent waiting on data it didn't have yet
+        self.wait_time = 0.0
+
+    def start(self) -> 'SessionPrefetcher':
+        self._thread.start()
+        return self
+
+    def __enter__(self) -> 'SessionPrefetcher':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        for session in self.sessions:
+            if self._stop.is_set():
+                return
+            try:
+                item = (session, self.load(session), None)
+            except Exception as e:
+                item = (session, None, e)
+            if not self._put(item):
+                return
+        self._put(_DONE)
+
+    def _put(self, item) -> bool:
+        """Block while the buffer is full; give up once closed"""
+        while not self._stop.is_set():
+            try:
+                self._buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        while True:
+            started = time.perf_counter()
+            item = self._buffer.get()
+            self.wait_time += time.perf_counter() - started
+            if item is _DONE:
+                return
+            session, data, error = item
+            if error is not None:
+                raise error
+            yield session, data
+
+    def close(self):
+        """Stop the loader and drop whatever it buffered"""
+        self._stop.set()
+        while True:
+            try:
+                self._buffer.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Date-indexed daily price arrays
+Loads a ticker's whole backtest window with one range request and answers
+per-day price lookups from NumPy arrays
+"""
+
+from datetime import datetime, date as date_type
+from zoneinfo import ZoneInfo
+from typing import List, Optional, Iterable, Tuple
+import numpy as np
+
+ET = ZoneInfo("America/New_York")
+
+class PriceSeries:
+    """Daily closes for one ticker, indexed by session date"""
+
+    def __init__(self, dates: np.ndarray, closes: np.ndarray):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        # Float arrays are kept as given, so cube-backed series stay zero-copy
+        closes = np.asarray(closes)
+        self.closes = closes if closes.dtype.kind == 'f' else closes.astype(np.float64)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple]) -> 'PriceSeries':
+        """Build from (date, open, high, low, close, volume) rows sorted by date"""
+        rows = [r for r in rows if (r[4] or r[1])]
+        dates = np.array([r[0] for r in rows], dtype='datetime64[D]')
+        closes = np.array([r[4] or r[1] for r in rows], dtype=np.float64)
+        return cls(dates, closes)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def index_of(self, date) -> int:
+        """Position of a session date, or -1 if the market had no bar that day"""
+        day = np.datetime64(_to_date(date), 'D')
+        idx = int(np.searchsorted(self.dates, day))
+        if idx < len(self.dates) and self.dates[idx] == day:
+            return idx
+        return -1
+
+    def price_on(self, date) -> Optional[float]:
+        """Close on an exact session date, or None if there was no bar"""
+        idx = self.index_of(date)
+        if idx < 0 or np.isnan(self.closes[idx]):
+            return None
+        return float(self.closes[idx])
+
+    def prices_on(self, days: np.ndarray) -> np.ndarray:
+        """Closes on many session dates at once (NaN where there was no bar)"""
+        days = np.asarray(days, dtype='datetime64[D]')
+        prices = np.full(len(days), np.nan)
+        if len(self.dates) == 0:
+            return prices
+        idx = np.minimum(np.searchsorted(self.dates, days), len(self.dates) - 1)
+        found = self.dates[idx] == days
+        prices[found] = self.closes[idx[found]]
+        return prices
+
+    def covers(self, date) -> bool:
+        """True if the date falls inside the loaded window"""
+        if len(self.dates) == 0:
+            return False
+        day = np.datetime64(_to_date(date), 'D')
+        return self.dates[0] <= day <= self.dates[-1]
+
+def _to_date(value) -> date_type:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date_type.fromisoformat(value[:10])
+    return value
+
+def aggs_to_rows(aggs) -> List[Tuple]:
+    """Convert daily range aggs into (date, open, high, low, close, volume) rows"""
+    rows = []
+    for agg in aggs or []:
+        day = datetime.fromtimestamp(agg.timestamp / 1000, tz=ET).strftime('%Y-%m-%d')
+        rows.append((day, getattr(agg, 'open', None), getattr(agg, 'high', None),
+                     getattr(agg, 'low', None), getattr(agg, 'close', None),
+                     getattr(agg, 'volume', None)))
+    return rows
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Record/replay transports for the async Massive client
+Record mode captures every API response into a compact gzip archive;
+replay mode serves those responses from disk with no network access
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple, Any
+
+from async_client import AiohttpTransport, MassiveAPIError, MassiveClient, get_shared_client
+
+API_MODES = ("live", "record", "replay")
+
+class RecordingTransport:
+    """Pass requests through to a live transport and keep every response"""
+
+    def __init__(self, archive_path: str, inner):
+        self.archive_path = archive_path
+        self.inner = inner
+        self.responses = load_archive(archive_path) if os.path.exists(archive_path) else {}
+        self._lock = threading.Lock()
+
+    async def get(self, url: str) -> Tuple[int, Any, Dict]:
+        status, body, headers = await self.inner.get(url)
+        # Transient failures are retried by the client; only final answers are worth replaying
+        if status == 200 or 400 <= status < 500 and status != 429:
+            with self._lock:
+                self.responses[url] = (status, body)
+        return status, body, headers
+
+    def flush(self):
+        with self._lock:
+            save_archive(self.archive_path, self.responses)
+
+    def absorb(self, path: str):
+        """Take over the responses recorded in another archive (a worker's) and delete it"""
+        if not os.path.exists(path):
+            return
+        responses = load_archive(path)
+        with self._lock:
+            self.responses.update(responses)
+        os.remove(path)
+
+    async def close(self):
+        self.flush()
+        await self.inner.close()
+
+class ReplayTransport:
+    """
+    Serve recorded responses
+
+    A URL not in the archive raises MassiveAPIError(0, 'NOT_RECORDED') at
+    once: not retried, and cached like any API error (with a TTL) rather
+    than as the permanent "no data" a recorded 404 means.
+    """
+
+    def __init__(self, archive_path: str):
+        self.archive_path = archive_path
+        self.responses = load_archive(archive_path)
+        self.misses = 0
+
+    async def get(self, url: str) -> Tuple[int, Any, Dict]:
+        recorded = self.responses.get(url)
+        if recorded is None:
+            self.misses += 1
+            raise MassiveAPIError(0, f"NOT_RECORDED: not in archive: {url}")
+        status, body = recorded
+        return status, body, {}
+
+    def flush(self):
+        pass
+
+    async def close(self):
+        pass
+
+def load_archive(path: str) -> Dict[str, Tuple[int, Any]]:
+    """Read a gzip JSON-lines archive into url -> (status, body)"""
+    responses = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            rec = json.loads(line)
+            responses[rec['url']] = (rec['status'], rec['body'])
+    return responses
+
+def save_archive(path: str, responses: Dict[str, Tuple[int, Any]]):
+    """Write url -> (status, body) as a gzip JSON-lines archive, sorted by URL"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        for url in sorted(responses):
+            status, body = responses[url]
+            f.write(json.dumps({'url': url, 'status': status, 'body': body}, separators=(',', ':')))
+            f.write('\n')
+    os.replace(tmp, path)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def isolated_cache_dir(config: Dict) -> Optional[tempfile.TemporaryDirectory]:
+    """
+    A fresh, empty store directory for record and replay runs (None when live)
+
+    A store warmed by earlier runs would answer requests the archive then
+    never sees, so a recording would replay only against that same cache.
+    """
+    if config.get('api_mode', 'live') == 'live':
+        return None
+    return tempfile.TemporaryDirectory(prefix='replay_store_')
+
+def worker_config(config: Dict, worker: int) -> Dict:
+    """
+    Config for a worker process of a run with `config`
+
+    A recording worker writes its own archive (the parent absorbs it with
+    absorb_worker_archive); several processes rewriting one archive would
+    each overwrite the others' responses.
+    """
+    if config.get('api_mode') != 'record':
+        return config
+    return dict(config, api_archive=f"{os.path.abspath(config['api_archive'])}.worker{worker}")
+
+def absorb_worker_archive(client: MassiveClient, config: Dict, worker: int):
+    """Merge what worker recorded into client's archive (record mode only)"""
+    transport = client.aio.transport
+    if isinstance(transport, RecordingTransport):
+        transport.absorb(worker_config(config, worker)['api_archive'])
+
+def client_for_config(api_key: str, config: Dict) -> MassiveClient:
+    """
+    Client for an engine config
+
+    config['api_mode'] is 'live' (default), 'record' or 'replay';
+    config['api_archive'] is the archive path for the latter two.
+    """
+    mode = config.get('api_mode', 'live')
+    if mode not in API_MODES:
+        raise ValueError(f"Unknown api_mode {mode!r}, expected one of {API_MODES}")
+    if mode == 'live':
+        return get_shared_client(api_key)
+
+    archive = os.path.abspath(config['api_archive'])
+    with _clients_lock:
+        client = _clients.get((mode, archive))
+        if client is None:
+            if mode == 'record':
+                transport = RecordingTransport(archive, AiohttpTransport(api_key))
+            else:
+                transport = ReplayTransport(archive)
+            # Replays never hit the network, so there is nothing to back off from
+            client = MassiveClient(api_key, transport=transport,
+                                   max_retries=0 if mode == 'replay' else 5)
+            _clients[(mode, archive)] = client
+        return client
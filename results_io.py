@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Backtest Results Files
+Saves a run as a directory of .npy columns plus JSON metadata, and loads it
+back memory-mapped so a saved run opens without rereading its trades
+"""
+
+import argparse
+import json
+import os
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Dict
+import numpy as np
+
+from market_data_store import DEFAULT_CACHE_DIR
+from trade_log import TradeLog, SymbolIndex, day_string
+
+RESULTS_VERSION = 1
+RESULTS_SUFFIX = '.btr'
+DEFAULT_RESULTS_DIR = os.path.join(DEFAULT_CACHE_DIR, "results")
+
+EQUITY_DTYPE = np.dtype([('exit_day', np.int32), ('cumulative_pnl', np.float64), ('trade_pnl', np.float64)])
+
+class EquityPoints(Sequence):
+    """A saved equity curve, read as the {'date', 'cumulative_pnl', 'trade_pnl'} dicts"""
+
+    def __init__(self, points: np.ndarray):
+        self.points = points
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return EquityPoints(self.points[i])
+        p = self.points[i]
+        return {'date': day_string(p['exit_day']),
+                'cumulative_pnl': float(p['cumulative_pnl']),
+                'trade_pnl': float(p['trade_pnl'])}
+
+def new_results_path(results_dir: str, strategy: str) -> str:
+    """A fresh run directory under results_dir, named after the strategy and the time"""
+    name = strategy.replace(' ', '_').replace('/', '-')
+    return os.path.join(results_dir, f"{name}_{datetime.now():%Y%m%d_%H%M%S_%f}{RESULTS_SUFFIX}")
+
+def _equity_points(equity_curve) -> np.ndarray:
+    if isinstance(equity_curve, EquityPoints):
+        return np.asarray(equity_curve.points)
+    points = np.zeros(len(equity_curve), dtype=EQUITY_DTYPE)
+    if len(equity_curve):
+        points['exit_day'] = np.array([p['date'] for p in equity_curve], dtype='datetime64[D]').astype(np.int64)
+        points['cumulative_pnl'] = [p['cumulative_pnl'] for p in equity_curve]
+        points['trade_pnl'] = [p['trade_pnl'] for p in equity_curve]
+    return points
+
+def save_results(results: Dict, path: str) -> str:
+    """
+    Write an engine's results dict to the directory `path`
+
+    Trades (the TradeLog columns), the symbol index, the equity curve and the
+    NAV series go to .npy files; categories, stats, config and the rest to
+    metadata.json.
+    """
+    log = results['trades']
+    if not isinstance(log, TradeLog):
+        raise TypeError("only engine results (trades in a TradeLog) can be saved")
+    os.makedirs(path, exist_ok=True)
+
+    index = results.get('symbol_index') or log.symbol_index()
+    np.save(os.path.join(path, 'trades.npy'), log.data)
+    np.save(os.path.join(path, 'symbol_rows.npy'), index.rows)
+    np.save(os.path.join(path, 'symbol_offsets.npy'), index.offsets)
+    np.save(os.path.join(path, 'equity.npy'), _equity_points(results.get('equity_curve') or []))
+    nav = results.get('nav')
+    if nav is not None:
+        np.save(os.path.join(path, 'nav_dates.npy'), np.asarray(nav['dates'], dtype='datetime64[D]'))
+        np.save(os.path.join(path, 'nav.npy'), np.asarray(nav['nav'], dtype=np.float64))
+
+    metadata = {
+        'version': RESULTS_VERSION,
+        'strategy': results.get('strategy'),
+        'stats': results.get('stats', {}),
+        'config': results.get('config', {}),
+        'data_stats': results.get('data_stats'),
+        'symbols': log.symbols.values,
+        'strategies': log.strategies.values,
+        'exit_reasons': log.exit_reasons.values,
+        'starting_capital': nav['starting_capital'] if nav is not None else None,
+    }
+    # Written last: a directory without metadata is an incomplete save
+    with open(os.path.join(path, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2, default=str)
+    return path
+
+def load_results(path: str) -> Dict:
+    """
+    A results dict read back from `path`, in the shape the tabs take
+
+    Every array is memory-mapped, so this costs the same for ten trades as
+    for a million; rows are read from disk as the tabs touch them.
+    """
+    with open(os.path.join(path, 'metadata.json')) as f:
+        metadata = json.load(f)
+    if metadata.get('version') != RESULTS_VERSION:
+        raise ValueError(f"unsupported results version {metadata.get('version')} in {path}")
+
+    def column(name: str):
+        return np.load(os.path.join(path, name), mmap_mode='r')
+
+    log = TradeLog.from_records(column('trades.npy'), metadata['symbols'],
+                                metadata['strategies'], metadata['exit_reasons'])
+    index = SymbolIndex(metadata['symbols'], column('symbol_rows.npy'), column('symbol_offsets.npy'))
+    results = {
+        'trades': log,
+        'stats': metadata['stats'],
+        'equity_curve': EquityPoints(column('equity.npy')),
+        'strategy': metadata['strategy'],
+        'config': metadata['config'],
+        'by_symbol': index.by_symbol(log),
+        'symbol_index': index,
+        'results_path': path,
+    }
+    if metadata.get('data_stats') is not None:
+        results['data_stats'] = metadata['data_stats']
+    if os.path.exists(os.path.join(path, 'nav.npy')):
+        results['nav'] = {'dates': column('nav_dates.npy'), 'nav': column('nav.npy'),
+                          'starting_capital': metadata['starting_capital']}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="List or summarize saved backtest runs")
+    parser.add_argument('path', nargs='?', default=DEFAULT_RESULTS_DIR,
+                        help="a saved run, or a directory of runs to list")
+    args = parser.parse_args()
+
+    if args.path.endswith(RESULTS_SUFFIX):
+        results = load_results(args.path)
+        print(f"{results['strategy']}: {len(results['trades'])} trades")
+        for key, value in results['stats'].items():
+            print(f"  {key}: {value}")
+        return
+    for name in sorted(os.listdir(args.path)) if os.path.isdir(args.path) else []:
+        if name.endswith(RESULTS_SUFFIX):
+            print(name)
+
+if __name__ == "__main__":
+    main()
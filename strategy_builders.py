@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Strategy Builders
+Registry of leg-construction functions for every strategy in the UI, each
+picking strikes with array lookups on an OptionsChain
+"""
+
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Callable, NamedTuple, Tuple
+import numpy as np
+
+from options_chain import OptionsChain, ChainSide
+from pricing import parse_range
+
+STRATEGY_BUILDERS: Dict[str, Callable] = {}
+
+class Leg(NamedTuple):
+    type: str                 # 'call', 'put' or 'stock'
+    action: str               # 'buy' or 'sell'
+    strike: float             # NaN for stock
+    quantity: int
+    price: float
+    ticker: Optional[str]
+    expiration: Optional[str]
+
+class PositionRecord(NamedTuple):
+    """
+    A constructed position
+
+    cost is the net debit (negative for a credit). max_profit and max_loss
+    are positive amounts from the expiration payoff, inf when unlimited; a
+    calendar or diagonal has no single payoff diagram, so its max_profit is NaN.
+    """
+    strategy: str
+    legs: Tuple[Leg, ...]
+    cost: float
+    max_profit: float
+    max_loss: float
+
+    @property
+    def expiration(self) -> Optional[str]:
+        dates = [leg.expiration for leg in self.legs if leg.expiration]
+        return min(dates) if dates else None
+
+    def leg_dicts(self) -> List[Dict]:
+        """Legs as dicts, the form OptionsPosition and PositionBook take"""
+        return [leg._asdict() for leg in self.legs]
+
+@dataclass
+class BuildParams:
+    """Leg-selection settings read once from the config's parameters"""
+    short_delta: Optional[tuple] = (0.20, 0.35)
+    long_delta: Optional[tuple] = (0.05, 0.15)
+    width: Optional[float] = None
+    otm_offset: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, params: Dict) -> 'BuildParams':
+        width = parse_range(params.get('Spread Width ($)'))
+        # 'Strike Selection' is "ATM" or an OTM offset fraction for straddles/strangles
+        offset = parse_range(params.get('Strike Selection'))
+        return cls(
+            short_delta=parse_range(params.get('Delta Range (Short Leg)')),
+            long_delta=parse_range(params.get('Delta Range (Long Leg)')),
+            width=width[0] if width else None,
+            otm_offset=offset[0] if offset and offset[0] > 0 else None,
+        )
+
+def register(*names: str):
+    """Register a builder under one or more strategy names"""
+    def wrap(fn):
+        for name in names:
+            STRATEGY_BUILDERS[name] = fn
+        return fn
+    return wrap
+
+def build_position(strategy: str, chain: OptionsChain, params: BuildParams,
+                   back: Optional[OptionsChain] = None) -> Optional[PositionRecord]:
+    """
+    Construct `strategy` on chain (back is the later expiration for calendars and diagonals)
+
+    None if the strategy is unknown or the chain has no suitable strikes.
+    """
+    builder = STRATEGY_BUILDERS.get(strategy)
+    if builder is None or not chain.underlying_price:
+        return None
+    return builder(strategy, chain, params, back)
+
+# ----------------------------------------------------------------------
+# Strike lookups
+# ----------------------------------------------------------------------
+
+def _atm(side: ChainSide, price: float) -> Optional[int]:
+    i = side.nearest(price)
+    return None if i < 0 else i
+
+def _otm_by_delta(side: ChainSide, price: float, delta_range: Optional[tuple]) -> Optional[int]:
+    """
+    OTM contract with |delta| nearest the middle of delta_range
+
+    Without deltas (or a range) it falls back to the first strike 2% out of
+    the money, like the engine's iron condor.
+    """
+    if len(side) == 0:
+        return None
+    otm = side.otm_mask(price)
+    if delta_range is not None and not np.all(np.isnan(side.delta)):
+        rows = np.flatnonzero(side.delta_mask(*delta_range) & otm)
+        if len(rows) == 0:
+            return None
+        return int(rows[np.argmin(np.abs(np.abs(side.delta[rows]) - sum(delta_range) / 2))])
+    if side.contract_type == 'call':
+        i = side.first_above(price * 1.02)
+        return i if i < len(side) else None
+    i = side.count_below(price * 0.98) - 1
+    return i if i >= 0 else None
+
+def _offset(side: ChainSide, price: float, offset: float) -> Optional[int]:
+    """Strike nearest price moved `offset` (a fraction) out of the money"""
+    target = price * (1 + offset) if side.contract_type == 'call' else price * (1 - offset)
+    return _atm(side, target)
+
+def _wing(side: ChainSide, i: int, params: BuildParams, direction: Optional[int] = None) -> Optional[int]:
+    """
+    Protective leg further from the money than row i
+
+    By default further OTM (up for calls, down for puts): the contract
+    nearest the middle of the long delta range when there are deltas,
+    otherwise the strike nearest Spread Width away, otherwise the next strike.
+    """
+    if direction is None:
+        direction = 1 if side.contract_type == 'call' else -1
+    beyond = side.strike > side.strike[i] if direction > 0 else side.strike < side.strike[i]
+    if params.long_delta is not None and not np.all(np.isnan(side.delta)):
+        rows = np.flatnonzero(side.delta_mask(*params.long_delta) & beyond)
+        if len(rows):
+            return int(rows[np.argmin(np.abs(np.abs(side.delta[rows]) - sum(params.long_delta) / 2))])
+    if params.width:
+        rows = np.flatnonzero(beyond)
+        if len(rows):
+            return int(rows[np.argmin(np.abs(side.strike[rows] - (side.strike[i] + direction * params.width)))])
+        return None
+    j = i + direction
+    return j if 0 <= j < len(side) else None
+
+def _width_from(side: ChainSide, i: int, params: BuildParams, direction: int) -> Optional[int]:
+    """Strike Spread Width away from row i in direction (the next strike without a width)"""
+    beyond = side.strike > side.strike[i] if direction > 0 else side.strike < side.strike[i]
+    rows = np.flatnonzero(beyond)
+    if len(rows) == 0:
+        return None
+    if params.width:
+        return int(rows[np.argmin(np.abs(side.strike[rows] - (side.strike[i] + direction * params.width)))])
+    return int(rows[0] if direction > 0 else rows[-1])
+
+# ----------------------------------------------------------------------
+# Records
+# ----------------------------------------------------------------------
+
+def _price(side: ChainSide, i: int) -> float:
+    mid = side.mid[i]
+    if np.isnan(mid):
+        mid = (side.bid[i] + side.ask[i]) / 2
+    return float(mid)
+
+def _leg(chain: OptionsChain, side: Optional[ChainSide], i: Optional[int], action: str,
+         quantity: int = 1) -> Leg:
+    if side is None:
+        return Leg('stock', action, float('nan'), quantity, float(chain.underlying_price), None, None)
+    return Leg(side.contract_type, action, float(side.strike[i]), quantity, _price(side, i),
+               side.tickers[i], chain.expiration)
+
+def _record(strategy: str, legs: List[Leg], same_expiration: bool = True) -> Optional[PositionRecord]:
+    """Price the legs and bound the payoff; None if any leg has no price"""
+    sign = np.array([1.0 if leg.action == 'buy' else -1.0 for leg in legs])
+    qty = np.array([leg.quantity for leg in legs], dtype=np.float64)
+    price = np.array([leg.price for leg in legs])
+    if np.isnan(price).any():
+        return None
+    cost = float(np.dot(sign * qty, price))
+
+    if not same_expiration:
+        # Worst case is the whole debit; the best case depends on the back leg's remaining value
+        return PositionRecord(strategy, tuple(legs), cost, float('nan'), max(cost, 0.0))
+
+    # Expiration payoff is piecewise linear with kinks at the strikes, so its
+    # extremes are at the strikes, at zero or off to infinity
+    kind = np.array([leg.type for leg in legs])
+    strike = np.array([leg.strike for leg in legs])
+    w = sign * qty
+    strikes = np.unique(strike[~np.isnan(strike)])
+    top = strikes[-1] * 2 + 1 if len(strikes) else 1.0
+    grid = np.concatenate(([0.0], strikes, [top]))[:, None]
+    value = np.where(kind == 'stock', grid,
+                     np.where(kind == 'call', np.maximum(grid - strike, 0), np.maximum(strike - grid, 0)))
+    pnl = np.nan_to_num(value) @ w - cost
+    slope = w[(kind == 'call') | (kind == 'stock')].sum()
+    max_profit = float('inf') if slope > 0 else float(pnl.max())
+    max_loss = float('inf') if slope < 0 else float(-pnl.min())
+    return PositionRecord(strategy, tuple(legs), cost, max_profit, max_loss)
+
+# ----------------------------------------------------------------------
+# Single legs and stock combinations
+# ----------------------------------------------------------------------
+
+@register("Long Call", "Long Put")
+def long_option(strategy, chain, params, back=None):
+    side = chain.calls if strategy == "Long Call" else chain.puts
+    i = _otm_by_delta(side, chain.underlying_price, params.short_delta)
+    if i is None:
+        return None
+    return _record(strategy, [_leg(chain, side, i, 'buy')])
+
+@register("Cash-Secured Put")
+def cash_secured_put(strategy, chain, params, back=None):
+    i = _otm_by_delta(chain.puts, chain.underlying_price, params.short_delta)
+    if i is None:
+        return None
+    return _record(strategy, [_leg(chain, chain.puts, i, 'sell')])
+
+@register("Covered Call")
+def covered_call(strategy, chain, params, back=None):
+    i = _otm_by_delta(chain.calls, chain.underlying_price, params.short_delta)
+    if i is None:
+        return None
+    return _record(strategy, [_leg(chain, None, None, 'buy'), _leg(chain, chain.calls, i, 'sell')])
+
+@register("Protective Put")
+def protective_put(strategy, chain, params, back=None):
+    i = _otm_by_delta(chain.puts, chain.underlying_price, params.long_delta)
+    if i is None:
+        return None
+    return _record(strategy, [_leg(chain, None, None, 'buy'), _leg(chain, chain.puts, i, 'buy')])
+
+@register("Collar")
+def collar(strategy, chain, params, back=None):
+    price = chain.underlying_price
+    c = _otm_by_delta(chain.calls, price, params.short_delta)
+    p = _otm_by_delta(chain.puts, price, params.long_delta)
+    if c is None or p is None:
+        return None
+    return _record(strategy, [_leg(chain, None, None, 'buy'), _leg(chain, chain.puts, p, 'buy'),
+                              _leg(chain, chain.calls, c, 'sell')])
+
+# ----------------------------------------------------------------------
+# Verticals and ratio spreads
+# ----------------------------------------------------------------------
+
+@register("Bull Put Spread", "Bear Call Spread")
+def credit_vertical(strategy, chain, params, back=None):
+    side = chain.puts if strategy == "Bull Put Spread" else chain.calls
+    s = _otm_by_delta(side, chain.underlying_price, params.short_delta)
+    if s is None:
+        return None
+    l = _wing(side, s, params)
+    if l is None:
+        return None
+    return _record(strategy, [_leg(chain, side, s, 'sell'), _leg(chain, side, l, 'buy')])
+
+@register("Bull Call Spread", "Bear Put Spread")
+def debit_vertical(strategy, chain, params, back=None):
+    side = chain.calls if strategy == "Bull Call Spread" else chain.puts
+    l = _atm(side, chain.underlying_price)
+    if l is None:
+        return None
+    s = _width_from(side, l, params, 1 if side.contract_type == 'call' else -1)
+    if s is None:
+        return None
+    return _record(strategy, [_leg(chain, side, l, 'buy'), _leg(chain, side, s, 'sell')])
+
+@register("Call Ratio Backspread", "Put Ratio Backspread")
+def ratio_backspread(strategy, chain, params, back=None):
+    side = chain.calls if strategy == "Call Ratio Backspread" else chain.puts
+    s = _atm(side, chain.underlying_price)
+    if s is None:
+        return None
+    l = _width_from(side, s, params, 1 if side.contract_type == 'call' else -1)
+    if l is None:
+        return None
+    return _record(strategy, [_leg(chain, side, s, 'sell'), _leg(chain, side, l, 'buy', 2)])
+
+# ----------------------------------------------------------------------
+# Condors, butterflies, straddles and strangles
+# ----------------------------------------------------------------------
+
+@register("Iron Condor")
+def iron_condor(strategy, chain, params, back=None):
+    price = chain.underlying_price
+    legs = []
+    for side in (chain.calls, chain.puts):
+        s = _otm_by_delta(side, price, params.short_delta)
+        if s is None:
+            return None
+        l = _wing(side, s, params)
+        if l is None:
+            return None
+        legs += [_leg(chain, side, s, 'sell'), _leg(chain, side, l, 'buy')]
+    return _record(strategy, legs)
+
+@register("Iron Butterfly")
+def iron_butterfly(strategy, chain, params, back=None):
+    c = _atm(chain.calls, chain.underlying_price)
+    if c is None:
+        return None
+    p = int(np.searchsorted(chain.puts.strike, chain.calls.strike[c]))
+    if p == len(chain.puts) or chain.puts.strike[p] != chain.calls.strike[c]:
+        return None
+    cw = _width_from(chain.calls, c, params, 1)
+    pw = _width_from(chain.puts, p, params, -1)
+    if cw is None or pw is None:
+        return None
+    return _record(strategy, [_leg(chain, chain.calls, c, 'sell'), _leg(chain, chain.puts, p, 'sell'),
+                              _leg(chain, chain.calls, cw, 'buy'), _leg(chain, chain.puts, pw, 'buy')])
+
+@register("Long Straddle", "Short Straddle")
+def straddle(strategy, chain, params, back=None):
+    c = _atm(chain.calls, chain.underlying_price)
+    if c is None:
+        return None
+    p = int(np.searchsorted(chain.puts.strike, chain.calls.strike[c]))
+    if p == len(chain.puts) or chain.puts.strike[p] != chain.calls.strike[c]:
+        return None
+    action = 'buy' if strategy == "Long Straddle" else 'sell'
+    return _record(strategy, [_leg(chain, chain.calls, c, action), _leg(chain, chain.puts, p, action)])
+
+@register("Long Strangle", "Short Strangle")
+def strangle(strategy, chain, params, back=None):
+    price = chain.underlying_price
+    if params.otm_offset:
+        c, p = _offset(chain.calls, price, params.otm_offset), _offset(chain.puts, price, params.otm_offset)
+    else:
+        c, p = _otm_by_delta(chain.calls, price, params.short_delta), _otm_by_delta(chain.puts, price, params.short_delta)
+    if c is None or p is None:
+        return None
+    action = 'buy' if strategy == "Long Strangle" else 'sell'
+    return _record(strategy, [_leg(chain, chain.calls, c, action), _leg(chain, chain.puts, p, action)])
+
+# ----------------------------------------------------------------------
+# Two expirations
+# ----------------------------------------------------------------------
+
+# Strategies whose builder needs a back-month chain as well as the front month
+BACK_MONTH_STRATEGIES = ("Calendar Spread", "Call Diagonal Spread")
+
+@register(*BACK_MONTH_STRATEGIES)
+def time_spread(strategy, chain, params, back=None):
+    """Sell the front-month call, buy a back-month call (same strike, or ATM for a diagonal)"""
+    if back is None or not back.expiration or back.expiration <= (chain.expiration or ''):
+        return None
+    price = chain.underlying_price
+    if strategy == "Calendar Spread":
+        s = _atm(chain.calls, price)
+        if s is None:
+            return None
+        l = int(np.searchsorted(back.calls.strike, chain.calls.strike[s]))
+        if l == len(back.calls) or back.calls.strike[l] != chain.calls.strike[s]:
+            return None
+    else:
+        s = _otm_by_delta(chain.calls, price, params.short_delta)
+        l = _atm(back.calls, price)
+        if s is None or l is None:
+            return None
+    return _record(strategy, [_leg(chain, chain.calls, s, 'sell'), _leg(back, back.calls, l, 'buy')],
+                   same_expiration=False)
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def _synthetic_chain(rng, spot: float, expiration: str, days: int, n_strikes: int = 60) -> OptionsChain:
+    from pricing import bs_price, greeks
+    strikes = np.round(spot * np.linspace(0.7, 1.3, n_strikes))
+    is_put = np.repeat([False, True], n_strikes)
+    strike = np.tile(strikes, 2)
+    vol = rng.uniform(0.15, 0.45)
+    t = days / 365.0
+    mid = bs_price(spot, strike, t, 0.04, vol, is_put)
+    delta = greeks(spot, strike, t, 0.04, vol, is_put)['delta']
+    return OptionsChain.from_arrays(is_put, {'strike': strike, 'mid': mid, 'bid': mid * 0.98,
+                                             'ask': mid * 1.02, 'delta': delta},
+                                    underlying_price=spot, expiration=expiration)
+
+def _benchmark(n_chains: int = 500):
+    rng = np.random.default_rng(0)
+    fronts = [_synthetic_chain(rng, rng.uniform(50, 500), '2024-02-16', 30) for _ in range(n_chains)]
+    backs = [_synthetic_chain(rng, c.underlying_price, '2024-03-15', 58) for c in fronts]
+    params = BuildParams(width=5.0)
+
+    start = time.perf_counter()
+    built = attempts = 0
+    for front, back in zip(fronts, backs):
+        for strategy in STRATEGY_BUILDERS:
+            attempts += 1
+            built += build_position(strategy, front, params, back) is not None
+    elapsed = time.perf_counter() - start
+    print(f"{len(STRATEGY_BUILDERS)} strategies x {n_chains} chains: {built:,}/{attempts:,} built "
+          f"in {elapsed:.2f}s ({attempts / elapsed:,.0f} candidates/s)")
+
+if __name__ == "__main__":
+    _benchmark()
@@ -141,7 +141,7 @@ class BacktestResultsTab:
         self.all_trades = results['trades']
         
         # Populate symbol filter
-        symbols = sorted(set(t['Symbol'] for t in self.all_trades))
+        symbols = sorted(results['by_symbol'])
         self.symbol_filter['values'] = ['All'] + symbols
         self.symbol_filter.current(0)
         
@@ -189,6 +189,11 @@ class BacktestResultsTab:
         """Apply filters to trades"""
         filtered = self.all_trades
         
+        # Filter by symbol through the results' per-symbol views
+        symbol = self.symbol_filter.get()
+        if symbol and symbol != "All":
+            filtered = self.results['by_symbol'].get(symbol, [])
+        
         # Filter by win/loss
         filter_type = self.filter_var.get()
         if filter_type == "Winners":
@@ -196,11 +201,6 @@ class BacktestResultsTab:
         elif filter_type == "Losers":
             filtered = [t for t in filtered if not t.get('Win', False)]
         
-        # Filter by symbol
-        symbol = self.symbol_filter.get()
-        if symbol and symbol != "All":
-            filtered = [t for t in filtered if t.get('Symbol') == symbol]
-        
         self.refresh_tree(filtered)
         self.update_summary(filtered)
     
@@ -261,8 +261,8 @@ Double-click any trade for detailed information."""
         entry_date = values[2]
         
         trade = None
-        for t in self.all_trades:
-            if t.get('Symbol') == symbol and t.get('Entry Date') == entry_date:
+        for t in self.results['by_symbol'].get(symbol, []):
+            if t.get('Entry Date') == entry_date:
                 trade = t
                 break
         
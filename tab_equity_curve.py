@@ -73,7 +73,8 @@ class EquityCurveTab:
         stats_grid.pack(fill=tk.X, padx=10, pady=5)
 
         # Calculate total return percentage
-        starting_capital = 20000
+        nav = results.get('nav')
+        starting_capital = nav['starting_capital'] if nav else 20000
         total_return_pct = (stats['total_pnl'] / starting_capital) * 100
 
         # Define stats to display (5 per row for even more compactness)
@@ -109,26 +110,31 @@ class EquityCurveTab:
             stats_grid.columnconfigure(i, weight=1)
         
         # Plot equity curve
-        self.plot_equity_curve(equity_curve, stats)
+        self.plot_equity_curve(equity_curve, stats, nav)
     
-    def plot_equity_curve(self, equity_curve: list, stats: dict):
-        """Plot the equity curve"""
-        if not equity_curve:
+    def plot_equity_curve(self, equity_curve: list, stats: dict, nav: dict = None):
+        """Plot the daily NAV, or the equity curve at trade exits when there is none"""
+        if not equity_curve and not nav:
             return
 
         # Clear previous plot
         self.ax.clear()
 
-        # Starting capital
-        starting_capital = 20000
-
-        # Prepare data
-        df = pd.DataFrame(equity_curve)
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date')
-
-        # Calculate account balance (starting capital + cumulative P&L)
-        df['account_balance'] = starting_capital + df['cumulative_pnl']
+        if nav:
+            # Daily mark-to-market portfolio value straight from the engine
+            starting_capital = nav['starting_capital']
+            df = pd.DataFrame({'date': pd.to_datetime(nav['dates']), 'account_balance': nav['nav']})
+        else:
+            # Starting capital
+            starting_capital = 20000
+
+            # Prepare data
+            df = pd.DataFrame(equity_curve)
+            df['date'] = pd.to_datetime(df['date'])
+            df = df.sort_values('date')
+
+            # Calculate account balance (starting capital + cumulative P&L)
+            df['account_balance'] = starting_capital + df['cumulative_pnl']
 
         # Calculate final balance and return
         final_balance = df['account_balance'].iloc[-1]
@@ -2,6 +2,16 @@ import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 from datetime import datetime, timedelta
 import json
+import os
+import threading
+
+from trade_log import SymbolIndex
+from trade_stats import StatsAccumulator
+
+INTRADAY = "Intraday (Multiple per day)"
+
+class ConfigError(Exception):
+    """A setting in the form is invalid (the message says which)"""
 
 class StrategyConfigTab:
     def __init__(self, notebook, app):
@@ -310,7 +320,7 @@ class StrategyConfigTab:
 
         self.trade_freq = tk.StringVar(value="On Signal")
         frequencies = [
-            ("Intraday (Multiple per day)", "Multiple entries per stock per day - for active trading"),
+            (INTRADAY, "Multiple entries per stock per day - for active trading"),
             ("On Signal", "Enter whenever indicators trigger"),
             ("Daily", "Check for entries every day"),
             ("Weekly", "Check for entries once per week"),
@@ -406,6 +416,10 @@ class StrategyConfigTab:
                  font=("Arial", 14, "bold"), command=self.save_config,
                  padx=30, pady=15, cursor="hand2").pack(side=tk.LEFT, padx=10)
 
+        tk.Button(btn_frame, text="📂 LOAD RESULTS", bg="#9C27B0", fg="black",
+                 font=("Arial", 14, "bold"), command=self.load_saved_results,
+                 padx=30, pady=15, cursor="hand2").pack(side=tk.LEFT, padx=10)
+
         tk.Button(btn_frame, text="🎯 OPTIMIZE PARAMETERS", bg="#FF9800", fg="black",
                  font=("Arial", 14, "bold"), command=self.open_optimizer,
                  padx=30, pady=15, cursor="hand2").pack(side=tk.LEFT, padx=10)
@@ -554,14 +568,41 @@ class StrategyConfigTab:
 
     def save_config(self):
         """Save configuration to file"""
-        config = self.get_config()
         try:
+            config = self.get_config()
             with open("backtest_config.json", "w") as f:
                 json.dump(config, f, indent=2)
             messagebox.showinfo("Success", "Configuration saved to backtest_config.json")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save configuration: {e}")
 
+    def load_saved_results(self):
+        """Open a saved backtest run in the analysis tabs"""
+        from tkinter import filedialog
+        from results_io import load_results, DEFAULT_RESULTS_DIR
+
+        path = filedialog.askdirectory(title="Open saved backtest (.btr folder)",
+                                       initialdir=DEFAULT_RESULTS_DIR if os.path.isdir(DEFAULT_RESULTS_DIR) else None)
+        if not path:
+            return
+
+        try:
+            results = load_results(path)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Error", f"Failed to load results: {e}")
+            return
+
+        self.app.backtest_results = results
+        self.app.enable_analysis_tabs()
+
+        self.app.equity_tab.display_results(results)
+        self.app.results_tab.display_results(results)
+        self.app.viz_tab.display_results(results)
+
+        self.app.notebook.select(2)
+        self.progress_label.config(text=f"✓ Loaded {len(results['trades'])} trades from {os.path.basename(path)}",
+                                   fg="#4CAF50")
+
     def get_config(self):
         """Get current configuration as dictionary"""
         # Get indicator parameters for enabled indicators
@@ -594,8 +635,26 @@ class StrategyConfigTab:
             "indicator_parameters": indicator_params,
             "parameters": {k: v.get() for k, v in self.param_widgets.items()}
         }
+        # The intraday fields are hidden (and may be blank) for the other frequencies
+        if self.trade_freq.get() == INTRADAY:
+            config.update(self.get_intraday_config())
         return config
 
+    def get_intraday_config(self):
+        """Intraday entry limits, validated"""
+        limits = {}
+        for key, widget, label, minimum in (
+                ("trades_per_day", self.trades_per_day, "Max trades per day", 1),
+                ("min_minutes_between_trades", self.min_time_between, "Minutes between trades", 0)):
+            try:
+                value = int(widget.get())
+            except ValueError:
+                raise ConfigError(f"{label} must be a whole number") from None
+            if value < minimum:
+                raise ConfigError(f"{label} must be at least {minimum}")
+            limits[key] = value
+        return limits
+
     def run_backtest(self):
         """Execute the backtest"""
         try:
@@ -779,50 +838,20 @@ class StrategyConfigTab:
             # Move to next day
             current_date += timedelta(days=1)
 
-        # Calculate stats
-        winning_trades = sum(1 for t in trades if t['Win'])
-        total_trades = len(trades)
-
-        stats = {
-            'total_trades': total_trades,
-            'winning_trades': winning_trades,
-            'losing_trades': total_trades - winning_trades,
-            'win_rate': round((winning_trades / total_trades * 100) if total_trades > 0 else 0, 2),
-            'total_pnl': round(sum(t['PnL'] for t in trades), 2),
-            'avg_pnl': round(sum(t['PnL'] for t in trades) / total_trades if total_trades > 0 else 0, 2),
-            'avg_win': round(sum(t['PnL'] for t in trades if t['Win']) / winning_trades if winning_trades > 0 else 0, 2),
-            'avg_loss': round(sum(t['PnL'] for t in trades if not t['Win']) / (total_trades - winning_trades) if (total_trades - winning_trades) > 0 else 0, 2),
-            'profit_factor': 0,
-            'max_drawdown': round(random.uniform(-500, -100), 2),
-            'sharpe_ratio': round(random.uniform(0.8, 2.5), 2),
+        # Stats and equity curve in one pass over the trades in exit order
+        summary = StatsAccumulator()
+        for trade in sorted(trades, key=lambda x: x['Exit Date']):
+            summary.add_trade(trade)
+        stats = summary.stats()
+        stats.update({
             'days_checked': days_checked,
             'entry_signals': entry_signals,
             'signal_rate': round((entry_signals / days_checked * 100) if days_checked > 0 else 0, 2)
-        }
-
-        avg_win = stats['avg_win']
-        avg_loss = stats['avg_loss']
-        stats['profit_factor'] = round(abs(avg_win / avg_loss) if avg_loss != 0 else 0, 2)
+        })
+        equity_curve = summary.equity_curve
 
-        # Build equity curve
-        equity_curve = []
-        cumulative = 0
-        for trade in sorted(trades, key=lambda x: x['Exit Date']):
-            cumulative += trade['PnL']
-            equity_curve.append({
-                'date': trade['Exit Date'],
-                'cumulative_pnl': round(cumulative, 2),
-                'trade_pnl': trade['PnL']
-            })
-
-        # Group by symbol
-        by_symbol = {}
-        for trade in trades:
-            symbol = trade['Symbol']
-            if symbol not in by_symbol:
-                by_symbol[symbol] = {'trades': [], 'pnl': 0}
-            by_symbol[symbol]['trades'].append(trade)
-            by_symbol[symbol]['pnl'] += trade['PnL']
+        # Group by symbol: one index, every symbol's trades a view into the list
+        symbol_index = SymbolIndex.from_trades(trades)
 
         # Add metadata about indicator filtering
         return {
@@ -830,7 +859,8 @@ class StrategyConfigTab:
             'stats': stats,
             'equity_curve': equity_curve,
             'config': self.get_config(),
-            'by_symbol': by_symbol,
+            'by_symbol': symbol_index.by_symbol(trades),
+            'symbol_index': symbol_index,
             'filtering_info': {
                 'enabled_indicators': enabled_indicators,
                 'days_checked': days_checked,
@@ -911,47 +941,15 @@ class StrategyConfigTab:
             trades.append(trade)
             current_date = exit_date
 
-        # Calculate stats
-        df_trades = [t for t in trades]
-        winning_trades = sum(1 for t in trades if t['Win'])
-        total_trades = len(trades)
-
-        stats = {
-            'total_trades': total_trades,
-            'winning_trades': winning_trades,
-            'losing_trades': total_trades - winning_trades,
-            'win_rate': round((winning_trades / total_trades * 100) if total_trades > 0 else 0, 2),
-            'total_pnl': round(sum(t['PnL'] for t in trades), 2),
-            'avg_pnl': round(sum(t['PnL'] for t in trades) / total_trades if total_trades > 0 else 0, 2),
-            'avg_win': round(sum(t['PnL'] for t in trades if t['Win']) / winning_trades if winning_trades > 0 else 0, 2),
-            'avg_loss': round(sum(t['PnL'] for t in trades if not t['Win']) / (total_trades - winning_trades) if (total_trades - winning_trades) > 0 else 0, 2),
-            'profit_factor': 0,
-            'max_drawdown': round(random.uniform(-500, -100), 2),
-            'sharpe_ratio': round(random.uniform(0.8, 2.5), 2),
-        }
-
-        avg_win = stats['avg_win']
-        avg_loss = stats['avg_loss']
-        stats['profit_factor'] = round(abs(avg_win / avg_loss) if avg_loss != 0 else 0, 2)
-
-        # Build equity curve
-        equity_curve = []
-        cumulative = 0
+        # Stats and equity curve in one pass over the trades in exit order
+        summary = StatsAccumulator()
         for trade in sorted(trades, key=lambda x: x['Exit Date']):
-            cumulative += trade['PnL']
-            equity_curve.append({
-                'date': trade['Exit Date'],
-                'cumulative_pnl': round(cumulative, 2),
-                'trade_pnl': trade['PnL']
-            })
-
-        # Group by symbol
-        by_symbol = {}
-        for trade in trades:
-            symbol = trade['Symbol']
-            if symbol not in by_symbol:
-                by_symbol[symbol] = []
-            by_symbol[symbol].append(trade)
+            summary.add_trade(trade)
+        stats = summary.stats()
+        equity_curve = summary.equity_curve
+
+        # Group by symbol: one index, every symbol's trades a view into the list
+        symbol_index = SymbolIndex.from_trades(trades)
 
         return {
             'trades': trades,
@@ -959,7 +957,8 @@ class StrategyConfigTab:
             'equity_curve': equity_curve,
             'strategy': strategy,
             'config': self.get_config(),
-            'by_symbol': by_symbol
+            'by_symbol': symbol_index.by_symbol(trades),
+            'symbol_index': symbol_index
         }
 
     def run_real_backtest(self, start, end):
@@ -968,90 +967,142 @@ class StrategyConfigTab:
             self.progress_label.config(text="Running backtest with indicator filtering...", fg="#FF9800")
             self.frame.update()
 
+            if self.trade_freq.get() == INTRADAY:
+                # Intraday runs on minute bars in the intraday engine, off the Tk thread
+                self.start_intraday_engine(self.get_config())
+                return
+
             # Generate results with indicator-based filtering
             results = self.generate_indicator_filtered_backtest(start, end)
+            self.show_backtest_results(results)
 
-            if not results or len(results.get('trades', [])) == 0:
-                enabled_indicators = [name for name, var in self.indicator_vars.items() if var.get()]
-                msg = "Backtest completed but generated no trades.\n\n"
-                if enabled_indicators:
-                    msg += f"Your {len(enabled_indicators)} enabled indicator(s) may be too restrictive:\n"
-                    msg += "\n".join(f"• {ind}" for ind in enabled_indicators)
-                    msg += "\n\nTry disabling some indicators or adjusting their parameters."
-                else:
-                    msg += "Try adjusting strategy parameters or date range."
+        except ConfigError as e:
+            messagebox.showerror("Invalid Settings", str(e))
+            self.progress_label.config(text="Error occurred", fg="red")
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid date format: {e}")
+            self.progress_label.config(text="Error occurred", fg="red")
+        except Exception as e:
+            messagebox.showerror("Error", f"Backtest failed: {e}")
+            self.progress_label.config(text="Error occurred", fg="red")
+            import traceback
+            traceback.print_exc()
 
-                messagebox.showwarning("No Trades", msg)
-                self.progress_label.config(text="Complete - No trades generated", fg="#666")
-                return
+    def show_backtest_results(self, results):
+        """Show a finished run in the analysis tabs"""
+        if not results or len(results.get('trades', [])) == 0:
+            enabled_indicators = [name for name, var in self.indicator_vars.items() if var.get()]
+            msg = "Backtest completed but generated no trades.\n\n"
+            if enabled_indicators:
+                msg += f"Your {len(enabled_indicators)} enabled indicator(s) may be too restrictive:\n"
+                msg += "\n".join(f"• {ind}" for ind in enabled_indicators)
+                msg += "\n\nTry disabling some indicators or adjusting their parameters."
+            else:
+                msg += "Try adjusting strategy parameters or date range."
 
-            # Store results
-            self.app.backtest_results = results
+            messagebox.showwarning("No Trades", msg)
+            self.progress_label.config(text="Complete - No trades generated", fg="#666")
+            return
 
-            # Enable analysis tabs
-            self.app.enable_analysis_tabs()
+        # Store results
+        self.app.backtest_results = results
 
-            # Populate equity curve
-            self.app.equity_tab.display_results(results)
+        # Enable analysis tabs
+        self.app.enable_analysis_tabs()
 
-            # Populate detailed results
-            self.app.results_tab.display_results(results)
+        # Populate equity curve
+        self.app.equity_tab.display_results(results)
 
-            # Populate trade visualization
-            self.app.viz_tab.display_results(results)
+        # Populate detailed results
+        self.app.results_tab.display_results(results)
 
-            # Switch to equity curve
-            self.app.notebook.select(2)
+        # Populate trade visualization
+        self.app.viz_tab.display_results(results)
 
-            total_trades = len(results['trades'])
-            filtering_info = results.get('filtering_info', {})
+        # Switch to equity curve
+        self.app.notebook.select(2)
 
-            self.progress_label.config(
-                text=f"✓ Backtest complete! Generated {total_trades} trades.",
-                fg="#4CAF50")
+        total_trades = len(results['trades'])
+        filtering_info = results.get('filtering_info', {})
 
-            # Show filtering statistics
-            if filtering_info:
-                enabled_inds = filtering_info.get('enabled_indicators', [])
-                days_checked = filtering_info.get('days_checked', 0)
-                entry_signals = filtering_info.get('entry_signals', 0)
-                signal_rate = filtering_info.get('signal_rate', 0)
+        self.progress_label.config(
+            text=f"✓ Backtest complete! Generated {total_trades} trades.",
+            fg="#4CAF50")
 
-                filter_msg = f"Backtest Results\n\n"
-                filter_msg += f"Total Trades: {total_trades}\n"
-                filter_msg += f"Days Checked: {days_checked}\n"
-                filter_msg += f"Entry Signals: {entry_signals}\n"
-                filter_msg += f"Signal Rate: {signal_rate}%\n\n"
+        # Show filtering statistics
+        if filtering_info:
+            enabled_inds = filtering_info.get('enabled_indicators', [])
+            days_checked = filtering_info.get('days_checked', 0)
+            entry_signals = filtering_info.get('entry_signals', 0)
+            signal_rate = filtering_info.get('signal_rate', 0)
 
-                if enabled_inds:
-                    filter_msg += f"Active Indicators ({len(enabled_inds)}):\n"
-                    filter_msg += "\n".join(f"✓ {ind}" for ind in enabled_inds)
-                    win_rate = results['stats'].get('win_rate', 0)
-                    filter_msg += f"\n\nEach indicator improves trade selection quality (win rate)."
-                    filter_msg += f"\nCurrent Win Rate: {win_rate}%"
-                    filter_msg += f"\n\nNote: More indicators = better trades, not fewer trades!"
-                else:
-                    filter_msg += "No indicators enabled - trades entered based on strategy parameters only."
+            filter_msg = f"Backtest Results\n\n"
+            filter_msg += f"Total Trades: {total_trades}\n"
+            filter_msg += f"Days Checked: {days_checked}\n"
+            filter_msg += f"Entry Signals: {entry_signals}\n"
+            filter_msg += f"Signal Rate: {signal_rate}%\n\n"
 
-                messagebox.showinfo("Backtest Complete", filter_msg)
+            if enabled_inds:
+                filter_msg += f"Active Indicators ({len(enabled_inds)}):\n"
+                filter_msg += "\n".join(f"✓ {ind}" for ind in enabled_inds)
+                win_rate = results['stats'].get('win_rate', 0)
+                filter_msg += f"\n\nEach indicator improves trade selection quality (win rate)."
+                filter_msg += f"\nCurrent Win Rate: {win_rate}%"
+                filter_msg += f"\n\nNote: More indicators = better trades, not fewer trades!"
+            else:
+                filter_msg += "No indicators enabled - trades entered based on strategy parameters only."
 
-        except ValueError as e:
-            messagebox.showerror("Error", f"Invalid date format: {e}")
-            self.progress_label.config(text="Error occurred", fg="red")
-        except Exception as e:
+            messagebox.showinfo("Backtest Complete", filter_msg)
+
+    def start_intraday_engine(self, config):
+        """
+        Run IntradayBacktestEngine on a worker thread
+
+        The minute-bar run takes a while; progress and the results are handed
+        back to the Tk thread with after(), so the window stays responsive.
+        """
+        from intraday import IntradayBacktestEngine
+
+        tickers = list(self.app.selected_tickers)
+
+        def on_tk_thread(fn, *args):
+            self.frame.after(0, fn, *args)
+
+        def failed(e):
             messagebox.showerror("Error", f"Backtest failed: {e}")
             self.progress_label.config(text="Error occurred", fg="red")
-            import traceback
-            traceback.print_exc()
+
+        def run():
+            try:
+                engine = IntradayBacktestEngine(
+                    api_key=self.app.api_key,
+                    tickers=tickers,
+                    config=config,
+                    progress_callback=lambda message: on_tk_thread(self.show_progress, message)
+                )
+                results = engine.run_backtest()
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                on_tk_thread(failed, e)
+                return
+            on_tk_thread(self.show_backtest_results, results)
+
+        self.progress_label.config(text="Running intraday backtest...", fg="#FF9800")
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+
+    def show_progress(self, message):
+        self.progress_label.config(text=message, fg="#FF9800")
 
     def update_progress(self, message):
         """Update progress label"""
-        self.progress_label.config(text=message, fg="#FF9800")
+        self.show_progress(message)
         self.frame.update()
 
     def on_frequency_change(self, *args):
         """Show/hide intraday settings based on frequency selection"""
-        if self.trade_freq.get() == "Intraday (Multiple per day)":
+        if self.trade_freq.get() == INTRADAY:
             self.intraday_frame.grid()
         else:
             self.intraday_frame.grid_remove()
@@ -6,7 +6,8 @@ from matplotlib.figure import Figure
 import matplotlib.dates as mdates
 from datetime import datetime, timedelta
 import pandas as pd
-from polygon import RESTClient
+from async_client import get_shared_client
+from ohlcv_cube import get_shared_cube
 
 class TradeVisualizationTab:
     def __init__(self, notebook, app):
@@ -210,8 +211,13 @@ class TradeVisualizationTab:
 
     def fetch_price_data_from_polygon(self, symbol, start_date, end_date):
         """Fetch daily price data from Polygon API"""
+        # The shared OHLCV cube answers without a request when it holds the symbol
+        cube = get_shared_cube()
+        if cube is not None and symbol in cube and cube.covers(start_date, end_date):
+            return cube.frame(symbol, start_date, end_date)
+
         try:
-            client = RESTClient(self.app.api_key)
+            client = get_shared_client(self.app.api_key)
 
             # Format dates for Polygon API
             start_str = start_date.strftime('%Y-%m-%d')
@@ -259,17 +265,8 @@ class TradeVisualizationTab:
         if not results or 'by_symbol' not in results:
             return
 
-        # Get list of symbols that have trades
-        # Handle both old and new data structure formats
-        symbols = []
-        for sym, data in results['by_symbol'].items():
-            if isinstance(data, dict) and 'trades' in data:
-                if data['trades']:
-                    symbols.append(sym)
-            elif data:
-                symbols.append(sym)
-
-        symbols = sorted(symbols)
+        # Symbols that have trades (every symbol in by_symbol has at least one)
+        symbols = sorted(sym for sym, trades in results['by_symbol'].items() if len(trades))
 
         if not symbols:
             self.info_label.config(text="● NO DATA", fg="#ff4444")
@@ -301,12 +298,8 @@ class TradeVisualizationTab:
             # Get trades for this symbol
             self.current_symbol = symbol
 
-            # Handle both old and new data structure formats
-            symbol_data = self.results['by_symbol'][symbol]
-            if isinstance(symbol_data, dict) and 'trades' in symbol_data:
-                self.current_trades = symbol_data['trades']
-            else:
-                self.current_trades = symbol_data
+            # A view of the symbol's rows; nothing is copied
+            self.current_trades = self.results['by_symbol'][symbol]
 
             if not self.current_trades:
                 self.info_label.config(text="● NO TRADES", fg="#ff4444")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Columnar Trade Log
+Closed trades stored as one NumPy structured array with day indices and
+categorical codes; the familiar trade dicts are built only when the UI reads them
+"""
+
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+import numpy as np
+
+TRADE_DTYPE = np.dtype([
+    ('symbol', np.int32),          # codes into TradeLog.symbols
+    ('strategy', np.int16),        # codes into TradeLog.strategies
+    ('exit_reason', np.int16),     # codes into TradeLog.exit_reasons
+    ('entry_day', np.int32),       # days since 1970-01-01
+    ('exit_day', np.int32),
+    ('days_held', np.int32),
+    ('entry_cost', np.float64),
+    ('max_profit', np.float64),
+    ('max_loss', np.float64),
+    ('pnl', np.float64),
+    ('underlying_entry', np.float64),
+    ('underlying_exit', np.float64),   # NaN when unknown
+])
+
+class Categories:
+    """Interned strings for a categorical column"""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = list(values or [])
+        self._codes: Dict[str, int] = {v: i for i, v in enumerate(self.values)}
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> Optional[int]:
+        return self._codes.get(value)
+
+    def __getitem__(self, code: int) -> str:
+        return self.values[code]
+
+def day_index(date) -> int:
+    return int(np.datetime64(date.date(), 'D').astype(np.int64))
+
+def day_string(day: int) -> str:
+    return str(np.datetime64(int(day), 'D'))
+
+class TradeLog(Sequence):
+    """
+    Append-only log of closed trades
+
+    Reads as a sequence of trade dicts (the results['trades'] rows) so the
+    tabs need no changes, but each dict is built on access and not kept.
+    Columns are available directly through `data`.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.records = np.zeros(capacity, dtype=TRADE_DTYPE)
+        self.n = 0
+        self.symbols = Categories()
+        self.strategies = Categories()
+        self.exit_reasons = Categories()
+
+    @classmethod
+    def from_records(cls, records: np.ndarray, symbols: List[str], strategies: List[str],
+                     exit_reasons: List[str]) -> 'TradeLog':
+        """A log over existing rows (e.g. a memory-mapped saved run), without copying them"""
+        log = cls(capacity=0)
+        log.records = records
+        log.n = len(records)
+        log.symbols = Categories(symbols)
+        log.strategies = Categories(strategies)
+        log.exit_reasons = Categories(exit_reasons)
+        return log
+
+    @property
+    def data(self) -> np.ndarray:
+        """The filled part of the log"""
+        return self.records[:self.n]
+
+    def append(self, pos) -> int:
+        """Record a closed position; returns its row"""
+        if self.n == len(self.records):
+            grown = np.zeros(max(2 * len(self.records), 256), dtype=TRADE_DTYPE)
+            grown[:self.n] = self.records
+            self.records = grown
+        i = self.n
+        self.records[i] = (
+            self.symbols.code(pos.symbol),
+            self.strategies.code(pos.strategy),
+            self.exit_reasons.code(pos.exit_reason),
+            day_index(pos.entry_date),
+            day_index(pos.exit_date),
+            pos.days_held,
+            pos.entry_cost,
+            pos.max_profit,
+            pos.max_loss,
+            pos.current_pnl,
+            pos.underlying_entry_price,
+            np.nan if pos.underlying_exit_price is None else pos.underlying_exit_price,
+        )
+        self.n += 1
+        return i
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return TradeRows(self, np.arange(self.n)[i])
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError("trade index out of range")
+        return self.row(i)
+
+    def row(self, i: int) -> Dict:
+        """Row i as the trade dict the results tabs display"""
+        r = self.records[i]
+        pnl = float(r['pnl'])
+        entry_cost = float(r['entry_cost'])
+        underlying_exit = float(r['underlying_exit'])
+        return {
+            'Symbol': self.symbols[r['symbol']],
+            'Strategy': self.strategies[r['strategy']],
+            'Entry Date': day_string(r['entry_day']),
+            'Exit Date': day_string(r['exit_day']),
+            'Days Held': int(r['days_held']),
+            'Entry Cost': round(entry_cost, 2),
+            'Max Profit': round(float(r['max_profit']), 2),
+            'Max Loss': round(float(r['max_loss']), 2),
+            'PnL': round(pnl, 2),
+            'PnL %': round((pnl / abs(entry_cost)) * 100, 2) if entry_cost != 0 else 0,
+            'Exit Reason': self.exit_reasons[r['exit_reason']],
+            'Win': pnl > 0,
+            'Underlying Entry': round(float(r['underlying_entry']), 2),
+            'Underlying Exit': round(underlying_exit, 2) if np.isfinite(underlying_exit) else None,
+        }
+
+    def rows(self, indices: np.ndarray) -> 'TradeRows':
+        return TradeRows(self, indices)
+
+    def symbol_index(self) -> 'SymbolIndex':
+        return SymbolIndex.from_codes(self.data['symbol'], self.symbols.values)
+
+    def by_symbol(self) -> Dict[str, 'TradeRows']:
+        """Rows of each symbol, in log order"""
+        return self.symbol_index().by_symbol(self)
+
+class SymbolIndex:
+    """
+    Symbol -> row numbers of a trades sequence, built with one stable argsort
+
+    rows holds every row grouped by symbol (log order within a symbol);
+    symbol i owns rows[offsets[i]:offsets[i + 1]]. Lookups slice rows, so
+    selecting a symbol's trades copies nothing.
+    """
+
+    def __init__(self, symbols: List[str], rows: np.ndarray, offsets: np.ndarray):
+        self.symbols = list(symbols)
+        self.rows = rows
+        self.offsets = offsets
+        self._position = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def from_codes(cls, codes: np.ndarray, symbols: List[str]) -> 'SymbolIndex':
+        """From each row's code into symbols"""
+        rows = np.argsort(codes, kind='stable')
+        offsets = np.searchsorted(codes[rows], np.arange(len(symbols) + 1))
+        return cls(symbols, rows, offsets)
+
+    @classmethod
+    def from_trades(cls, trades: Sequence) -> 'SymbolIndex':
+        """From trade dicts (the demo results), symbols in order of first appearance"""
+        codes = Categories()
+        return cls.from_codes(np.array([codes.code(t['Symbol']) for t in trades], dtype=np.int64),
+                              codes.values)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._position
+
+    def rows_of(self, symbol: str) -> np.ndarray:
+        i = self._position.get(symbol)
+        if i is None:
+            return self.rows[:0]
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def trades_of(self, trades: Sequence, symbol: str) -> 'TradeRows':
+        return TradeRows(trades, self.rows_of(symbol))
+
+    def by_symbol(self, trades: Sequence) -> Dict[str, 'TradeRows']:
+        """Every symbol's trades as views into trades"""
+        return {symbol: self.trades_of(trades, symbol) for symbol in self.symbols}
+
+class TradeRows(Sequence):
+    """A subset of a trades sequence (a TradeLog or a list of dicts), by row number"""
+
+    def __init__(self, trades: Sequence, indices: np.ndarray):
+        self.trades = trades
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return TradeRows(self.trades, self.indices[i])
+        return self.trades[int(self.indices[i])]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Trade Statistics
+Running backtest statistics updated in O(1) as each trade closes, and the
+daily mark-to-market portfolio NAV built from per-position marks
+"""
+
+import math
+from typing import Dict, List
+import numpy as np
+
+TRADING_DAYS = 252
+STARTING_CAPITAL = 20000
+
+class StatsAccumulator:
+    """
+    Win/loss counts, P&L sums, Sharpe, drawdown and profit factor of a trade stream
+
+    Trades are added in exit order. Mean and variance of the trade returns
+    use Welford's update; the drawdown is measured against the running peak
+    of cumulative P&L.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.wins = 0
+        self.total_pnl = 0.0
+        self.gross_win = 0.0
+        self.gross_loss = 0.0
+        # Welford state over 'PnL %'
+        self.mean_return = 0.0
+        self.m2_return = 0.0
+        self.peak = -math.inf
+        self.max_drawdown = 0.0
+        self.equity_curve: List[Dict] = []
+
+    def add(self, pnl: float, pnl_pct: float, exit_date: str, win: bool):
+        """Fold one closed trade into the statistics"""
+        self.count += 1
+        self.total_pnl += pnl
+        if win:
+            self.wins += 1
+            self.gross_win += pnl
+        else:
+            self.gross_loss += pnl
+
+        delta = pnl_pct - self.mean_return
+        self.mean_return += delta / self.count
+        self.m2_return += delta * (pnl_pct - self.mean_return)
+
+        self.peak = max(self.peak, self.total_pnl)
+        self.max_drawdown = min(self.max_drawdown, self.total_pnl - self.peak)
+        self.equity_curve.append({
+            'date': exit_date,
+            'cumulative_pnl': round(self.total_pnl, 2),
+            'trade_pnl': round(pnl, 2),
+        })
+
+    def add_trade(self, trade: Dict):
+        """Fold in a trade dict (a results['trades'] row)"""
+        self.add(trade['PnL'], trade['PnL %'], trade['Exit Date'], trade['Win'])
+
+    @property
+    def losses(self) -> int:
+        return self.count - self.wins
+
+    def sharpe_ratio(self) -> float:
+        """Mean over (population) std of trade returns, scaled by sqrt(252 / trades)"""
+        if self.count < 2:
+            return 0.0
+        std = math.sqrt(self.m2_return / self.count)
+        if std == 0:
+            return 0.0
+        return self.mean_return / std * math.sqrt(TRADING_DAYS / self.count)
+
+    def stats(self) -> Dict:
+        """The results['stats'] dict (all zeros before the first trade)"""
+        avg_win = self.gross_win / self.wins if self.wins else 0
+        avg_loss = self.gross_loss / self.losses if self.losses else 0
+        return {
+            'total_trades': self.count,
+            'winning_trades': self.wins,
+            'losing_trades': self.losses,
+            'win_rate': round(self.wins / self.count * 100, 2) if self.count else 0,
+            'total_pnl': round(self.total_pnl, 2),
+            'avg_pnl': round(self.total_pnl / self.count, 2) if self.count else 0,
+            'avg_win': round(avg_win, 2),
+            'avg_loss': round(avg_loss, 2),
+            # Gross profit over gross loss
+            'profit_factor': round(abs(self.gross_win / self.gross_loss), 2) if self.gross_loss else 0,
+            'max_drawdown': round(self.max_drawdown, 2),
+            'sharpe_ratio': round(self.sharpe_ratio(), 2),
+        }
+
+# ----------------------------------------------------------------------
+# Daily portfolio NAV
+# ----------------------------------------------------------------------
+
+def nav_series(n_sessions: int, starting_capital: float, exit_rows: np.ndarray, realized_pnl: np.ndarray,
+               mark_rows: np.ndarray, mark_pnl: np.ndarray) -> np.ndarray:
+    """
+    NAV on each of n sessions: capital + realized P&L to date + open positions' marks
+
+    exit_rows/realized_pnl hold one entry per closed trade (its exit session),
+    mark_rows/mark_pnl one per position per session it was open and marked.
+    """
+    realized = np.cumsum(np.bincount(exit_rows, weights=realized_pnl, minlength=n_sessions))
+    unrealized = np.bincount(mark_rows, weights=mark_pnl, minlength=n_sessions)
+    return starting_capital + realized[:n_sessions] + unrealized[:n_sessions]
+
+def nav_stats(nav: np.ndarray) -> Dict:
+    """Max drawdown ($, from the running NAV peak) and annualized Sharpe of daily NAV returns"""
+    if len(nav) < 2:
+        return {'max_drawdown': 0.0, 'sharpe_ratio': 0.0}
+    drawdown = float((nav - np.maximum.accumulate(nav)).min())
+    returns = np.diff(nav) / nav[:-1]
+    std = returns.std()
+    sharpe = float(returns.mean() / std * math.sqrt(TRADING_DAYS)) if std > 0 else 0.0
+    return {'max_drawdown': round(drawdown, 2), 'sharpe_ratio': round(sharpe, 2)}
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Exchange Trading Calendar
+NYSE sessions (which US equity options follow) with holidays, early closes
+and option expiration Fridays, precomputed into datetime64 arrays
+"""
+
+from datetime import datetime, date as date_type, time, timedelta
+from functools import lru_cache
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+import numpy as np
+
+FIRST_YEAR = 1990
+LAST_YEAR = 2040
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# One-off closures (national days of mourning, weather, 9/11)
+SPECIAL_CLOSURES = [
+    '1994-04-27', '2001-09-11', '2001-09-12', '2001-09-13', '2001-09-14',
+    '2004-06-11', '2007-01-02', '2012-10-29', '2012-10-30', '2018-12-05', '2025-01-09',
+]
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date_type:
+    """n-th (1-based) weekday of a month; n=-1 is the last one"""
+    if n > 0:
+        first = date_type(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    nxt = date_type(year + month // 12, month % 12 + 1, 1)
+    last = nxt - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year: int) -> date_type:
+    """Gregorian Easter Sunday (anonymous algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date_type(year, month, day + 1)
+
+def _observed(day: date_type) -> date_type:
+    """Saturday holidays move to Friday, Sunday ones to Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+def nyse_holidays(year: int) -> List[date_type]:
+    """Full-day closures of one year (excluding SPECIAL_CLOSURES)"""
+    days = []
+    # A Saturday New Year's Day is not made up on the Friday before
+    new_year = date_type(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.append(_observed(new_year))
+    if year >= 1998:
+        days.append(_nth_weekday(year, 1, 0, 3))         # Martin Luther King Jr. Day
+    days.append(_nth_weekday(year, 2, 0, 3))             # Washington's Birthday
+    days.append(_easter(year) - timedelta(days=2))       # Good Friday
+    days.append(_nth_weekday(year, 5, 0, -1))            # Memorial Day
+    if year >= 2022:
+        days.append(_observed(date_type(year, 6, 19)))   # Juneteenth
+    days.append(_observed(date_type(year, 7, 4)))        # Independence Day
+    days.append(_nth_weekday(year, 9, 0, 1))             # Labor Day
+    days.append(_nth_weekday(year, 11, 3, 4))            # Thanksgiving
+    days.append(_observed(date_type(year, 12, 25)))      # Christmas
+    return days
+
+def nyse_early_closes(year: int) -> List[date_type]:
+    """1 p.m. closes: July 3, the day after Thanksgiving and Christmas Eve (when they are sessions)"""
+    days = []
+    july3 = date_type(year, 7, 3)
+    if july3.weekday() < 4:
+        days.append(july3)
+    days.append(_nth_weekday(year, 11, 3, 4) + timedelta(days=1))
+    christmas_eve = date_type(year, 12, 24)
+    if christmas_eve.weekday() < 4:
+        days.append(christmas_eve)
+    return days
+
+class TradingCalendar:
+    """Sessions, holidays and early closes for a range of years as sorted datetime64[D] arrays"""
+
+    def __init__(self, first_year: int = FIRST_YEAR, last_year: int = LAST_YEAR):
+        self.first_year = first_year
+        self.last_year = last_year
+
+        holidays = [d for y in range(first_year, last_year + 1) for d in nyse_holidays(y)]
+        holidays += [date_type.fromisoformat(d) for d in SPECIAL_CLOSURES]
+        self.holidays = np.unique(np.array(holidays, dtype='datetime64[D]'))
+
+        weekdays = np.arange(np.datetime64(f'{first_year}-01-01'), np.datetime64(f'{last_year + 1}-01-01'),
+                             dtype='datetime64[D]')
+        weekdays = weekdays[np.is_busday(weekdays)]
+        self.sessions = weekdays[~np.isin(weekdays, self.holidays)]
+
+        early = np.array([d for y in range(first_year, last_year + 1) for d in nyse_early_closes(y)],
+                         dtype='datetime64[D]')
+        self.early_closes = np.intersect1d(early, self.sessions)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    @staticmethod
+    def _day(value) -> np.datetime64:
+        if isinstance(value, np.datetime64):
+            return value.astype('datetime64[D]')
+        if isinstance(value, datetime):
+            value = value.date()
+        return np.datetime64(str(value)[:10], 'D')
+
+    def is_session(self, day) -> bool:
+        day = self._day(day)
+        i = np.searchsorted(self.sessions, day)
+        return bool(i < len(self.sessions) and self.sessions[i] == day)
+
+    def is_early_close(self, day) -> bool:
+        day = self._day(day)
+        i = np.searchsorted(self.early_closes, day)
+        return bool(i < len(self.early_closes) and self.early_closes[i] == day)
+
+    def close_time(self, day) -> time:
+        return EARLY_CLOSE if self.is_early_close(day) else REGULAR_CLOSE
+
+    def next_session(self, day, inclusive: bool = True) -> np.datetime64:
+        """First session on or after day (strictly after when inclusive=False)"""
+        i = np.searchsorted(self.sessions, self._day(day), side='left' if inclusive else 'right')
+        return self.sessions[i]
+
+    def previous_session(self, day, inclusive: bool = True) -> np.datetime64:
+        """Last session on or before day (strictly before when inclusive=False)"""
+        i = np.searchsorted(self.sessions, self._day(day), side='right' if inclusive else 'left')
+        return self.sessions[i - 1]
+
+    def last_completed_session(self, now: Optional[datetime] = None) -> np.datetime64:
+        """
+        Latest session whose daily bars are final: the last one before today (ET)
+
+        Today's bars can still change after the close (late prints, corrections),
+        so a session only counts the day after.
+        """
+        today = (now or datetime.now(EXCHANGE_TZ)).astimezone(EXCHANGE_TZ).date()
+        return self.previous_session(today, inclusive=False)
+
+    def sessions_between(self, start, end) -> np.ndarray:
+        """Sessions in start..end inclusive (a view of the session array)"""
+        lo = np.searchsorted(self.sessions, self._day(start), side='left')
+        hi = np.searchsorted(self.sessions, self._day(end), side='right')
+        return self.sessions[lo:hi]
+
+    def sessions_in_range(self, start, end) -> int:
+        return len(self.sessions_between(start, end))
+
+    def first_sessions_of_weeks(self, start, end) -> np.ndarray:
+        """First session of every Monday-starting week in start..end"""
+        sessions = self.sessions_between(start, end)
+        if len(sessions) == 0:
+            return sessions
+        # datetime64 day 0 (1970-01-01) is a Thursday; shift so weeks start on Monday
+        weeks = (sessions.astype(np.int64) + 3) // 7
+        keep = np.concatenate(([True], weeks[1:] != weeks[:-1]))
+        return sessions[keep]
+
+    def first_sessions_of_months(self, start, end) -> np.ndarray:
+        """First session of every month in start..end"""
+        sessions = self.sessions_between(start, end)
+        if len(sessions) == 0:
+            return sessions
+        months = sessions.astype('datetime64[M]')
+        keep = np.concatenate(([True], months[1:] != months[:-1]))
+        return sessions[keep]
+
+    def weekly_expirations(self, start, end) -> np.ndarray:
+        """Last session of every week, in start..end (Friday, or Thursday before a Friday holiday)"""
+        # Look a week past the end so a week cut off by it isn't cut short
+        sessions = self.sessions_between(start, self._day(end) + 7)
+        if len(sessions) == 0:
+            return sessions
+        weeks = (sessions.astype(np.int64) + 3) // 7
+        keep = np.concatenate((weeks[1:] != weeks[:-1], [True]))
+        expirations = sessions[keep]
+        return expirations[expirations <= self._day(end)]
+
+    def monthly_expirations(self, start, end) -> np.ndarray:
+        """Standard monthly expirations: the third Friday, or the session before it when it is a holiday"""
+        first, last = self._day(start), self._day(end)
+        months = np.arange(first.astype('datetime64[M]'), last.astype('datetime64[M]') + 1)
+        firsts = months.astype('datetime64[D]')
+        third_fridays = firsts + (4 - _weekday(firsts)) % 7 + 14
+        expirations = np.array([self.previous_session(d) for d in third_fridays], dtype='datetime64[D]')
+        return expirations[(expirations >= first) & (expirations <= last)]
+
+def _weekday(days):
+    """Monday=0 weekday of datetime64[D] values"""
+    return (np.asarray(days).astype('datetime64[D]').astype(np.int64) + 3) % 7
+
+@lru_cache(maxsize=None)
+def get_calendar() -> TradingCalendar:
+    """Process-wide calendar, built once on first use"""
+    return TradingCalendar()
+
+def session_datetimes(sessions: np.ndarray, tzinfo=None) -> List[datetime]:
+    """Convert session dates to (midnight) datetimes for the engines' date loops"""
+    return [datetime.combine(d.astype(object), time(0), tzinfo=tzinfo) for d in sessions]